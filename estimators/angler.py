@@ -1,10 +1,18 @@
+import functools
 import math
+import os
 import time
 import matplotlib.pyplot
 import numpy
 import pandas
 from helpers import cloud_free_day_finder
+from helpers import checkpoints
 from helpers import config
+from helpers import day_block
+from helpers import result_store
+from helpers import shared_arrays
+from helpers import worker_pool
+from helpers import solar_power_data_loader2
 import pv_model.pvlib_poa as pvlib_poa
 
 ############################
@@ -40,7 +48,8 @@ def print_full(x):
     pandas.reset_option('display.max_colwidth')
 
 
-def test_single_pair_of_angles_improved(day_df, latitude, longitude, tilt, azimuth, plot=False):
+def test_single_pair_of_angles_improved(day_df, latitude, longitude, tilt, azimuth, plot=False, minute_step=1,
+                                        site=None):
     """
     Tests a single day with known latitude and longitude, using a guessed tilt and azimuth.
     :param day_df:
@@ -48,16 +57,26 @@ def test_single_pair_of_angles_improved(day_df, latitude, longitude, tilt, azimu
     :param longitude:
     :param tilt:
     :param azimuth:
+    :param minute_step: simulation and measurement resolution in minutes, every minute_step:th minute is used
+    :param site: optional config.Site, passed to pvlib_poa.pvlib_complex
     :return: Average per minute error between day_df and simulated power output
     """
 
     # simulation year and day
     day_n = day_df["day"].values[0]
     year_n = day_df["year"].values[0]
+    # data loaded without time column is merged on restored timestamps
+    if "time" not in day_df.columns:
+        day_df = solar_power_data_loader2.add_time_column(day_df)
     day_df = day_df[["time", "year", "day", "minute", "output"]]
 
+    # matching subsample of measurements for decimated simulations
+    if minute_step > 1:
+        day_df = day_df[day_df["minute"] % minute_step == 0]
+
     # simulation
-    simulated_1kw_data = pvlib_poa.pvlib_complex(year_n, day_n, latitude, longitude, tilt, azimuth)
+    simulated_1kw_data = pvlib_poa.pvlib_complex(year_n, day_n, latitude, longitude, tilt, azimuth,
+                                                 minute_step=minute_step, site=site)
 
     # matching multipliers ###########################
     # columns in simulated 1kw data:['time', 'ghi', 'dni', 'dhi', 'dni_poa', 'dhi_poa', 'ghi_poa', 'poa', 'dni_rc',
@@ -89,7 +108,7 @@ def test_single_pair_of_angles_improved(day_df, latitude, longitude, tilt, azimu
     # equation = sum(abs(measured-simulated))/1440
     merged["output_delta"] = (merged["output_x"] - merged["output_y"]).abs()
     delta_values = merged["output_delta"].values
-    delta_avg = sum(delta_values) / 1440
+    delta_avg = sum(delta_values) / (1440 / minute_step)
     delta_norm = delta_avg
 
     if plot:
@@ -104,13 +123,15 @@ def test_single_pair_of_angles_improved(day_df, latitude, longitude, tilt, azimu
     return delta_norm
 
 
-def get_best_from_tilt_azimuth_list(df, latitude, longitude, tilts, azimuths):
+def get_best_from_tilt_azimuth_list(df, latitude, longitude, tilts, azimuths, region=None, site=None):
     """
     :param df:
     :param latitude:
     :param longitude:
     :param tilts:
     :param azimuths:
+    :param region: optional feasible region from estimate_feasible_angle_region, points outside are skipped
+    :param site: optional config.Site, passed to the simulation
     :return: tilt deg, azimuth deg, fit watts
     """
 
@@ -122,7 +143,9 @@ def get_best_from_tilt_azimuth_list(df, latitude, longitude, tilts, azimuths):
     for i in range(len(tilts)):
         tilt = tilts[i]
         azimuth = azimuths[i]
-        fitness = test_single_pair_of_angles_improved(df, latitude, longitude, tilt, azimuth)
+        if region is not None and not angle_in_feasible_region(tilt, azimuth, region):
+            continue
+        fitness = test_single_pair_of_angles_improved(df, latitude, longitude, tilt, azimuth, site=site)
         # print("got fitness " +str(round(fitness, 4)))
 
         if fitness < best_fit:
@@ -214,7 +237,9 @@ def unit_circle_point_to_tilt_azimuth(x, y):
     return tilt, azimuth
 
 
-def angle_clear_days_from_df_with_n_point_fibo(df, latitude, longitude, clear_day_threshold, points):
+def angle_clear_days_from_df_with_n_point_fibo(df, latitude, longitude, clear_day_threshold, points,
+                                               prune_region=False, day_budget=None, max_error_increase=None,
+                                               site=None, checkpoint_path=None, result_store_path=None):
     """
     Finds the best angle fits for multiple days in given dataframe with known geolocation.
     :param df: Multi-day one year df
@@ -223,53 +248,119 @@ def angle_clear_days_from_df_with_n_point_fibo(df, latitude, longitude, clear_da
     :param clear_day_threshold:  smoothness coefficient, 1.0 is OK for good installations. Lower values mean higher
     smoothness required
     :param points: Fibonacci lattice point count used for exhaustive search.
+    :param prune_region: if True, lattice is limited to estimate_feasible_angle_region of each day
+    :param day_budget: optional maximum number of clear days to angle, see cloud_free_day_finder.select_informative_days
+    :param max_error_increase: optional allowed relative increase of standard error compared to using all clear days
+    :param site: optional config.Site, its name is used in plot title and file name and its known tilt and azimuth
+    are compared to the results
+    :param checkpoint_path: optional helpers.checkpoints file, see evaluate_1_day_against_n_fibo_points. Days which
+    were completed before an interruption are not evaluated again
+    :param result_store_path: optional helpers.result_store database, day results stored with the same parameters and
+    data are read from it instead of evaluated, new day results and the year summary are saved to it
     :return:
     """
 
     # reading year from df
     year_n = df["year"].values[0]
+    installation_name = "installation" if site is None else site.name
+
+    # parameters which change the result of a single day, results of other parameters are stored separately
+    day_parameter_values = __lattice_search_parameters(latitude, longitude, points, prune_region, site)
+    day_parameters = result_store.parameter_hash(day_parameter_values)
+    store = None
+    if result_store_path is not None:
+        store = result_store.open_result_store(result_store_path)
 
     # extracting clear days from dataframe which pass the required threshold
     clear_days = cloud_free_day_finder.find_smooth_days_df(df, 120, 200, clear_day_threshold)
 
+    # optionally angling only an informative subset of the clear days
+    if day_budget is not None or max_error_increase is not None:
+        clear_days, _ = cloud_free_day_finder.select_informative_days(clear_days, day_budget, max_error_increase)
+
     print("Angling using " + str(len(clear_days)) + " days from year " + str(year_n))
 
     # solving best fit for each of the clear days
     best_tilts = []
     best_azimuths = []
     best_fitnesses = []
-
-    for clear_day in clear_days:
-        tilt, azimuth, fitness = evaluate_1_day_against_n_fibo_points(clear_day, latitude, longitude, points)
-        if tilt is not None:
-            best_tilts.append(tilt)
-            best_azimuths.append(azimuth)
-            best_fitnesses.append(fitness)
-
-    # calculating tilt, azimuth and fit ranges
-    min_tilt = min(best_tilts)
-    max_tilt = max(best_tilts)
-    min_azimuth = min(best_azimuths)
-    max_azimuth = max(best_azimuths)
-    min_fit = min(best_fitnesses)
-    max_fit = max(best_fitnesses)
-
-    # calculating tilt, azimuth and fit averages
-    average_tilt = sum(best_tilts) / len(best_tilts)
-    average_azimuth = sum(best_azimuths) / len(best_azimuths)
-    average_fit = sum(best_fitnesses) / len(best_fitnesses)
-
-    # calculating delta, note that this can only be done if the installation location is known
-    delta = angular_distance_between_points(average_tilt, average_azimuth, config.tilt_kuopio, config.azimuth_kuopio)
-    print("average delta angle: " + str(round(delta, 3)))
-
-    # printing averages and ranges for results
-    print(
-        "Average tilt:" + str(round(average_tilt, 2)) + " azimuth:" + str(round(average_azimuth, 2)) + " fitness" + str(
-            round(average_fit)))
-    print("Tilt range: " + str(round(min_tilt, 2)) + " to " + str(round(max_tilt, 2)))
-    print("Azimuth range: " + str(round(min_azimuth, 2)) + " to " + str(round(max_azimuth, 2)))
-    print("Normalized delta range: " + str(round(min_fit)) + " to " + str(round(max_fit)))
+    evaluations = 0
+    seconds = 0
+
+    try:
+        for clear_day in clear_days:
+            day_n = clear_day["day"].values[0]
+            stored = None
+            if store is not None:
+                day_data = result_store.data_hash(clear_day)
+                stored = result_store.load_day_result(store, installation_name, year_n, day_n, day_parameters, day_data)
+
+            if stored is not None:
+                tilt, azimuth, fitness = stored["tilt"], stored["azimuth"], stored["fitness"]
+                day_evaluations, day_seconds = stored["evaluations"], stored["seconds"]
+                print("Read day " + str(day_n) + " from result store")
+            else:
+                start_time = time.time()
+                region = None
+                if prune_region:
+                    region = estimate_feasible_angle_region(clear_day, latitude, longitude, site=site)
+                tilt, azimuth, fitness = evaluate_1_day_against_n_fibo_points(clear_day, latitude, longitude, points,
+                                                                              region=region, site=site,
+                                                                              checkpoint_path=checkpoint_path)
+                day_evaluations = __lattice_point_count(points, region)
+                day_seconds = time.time() - start_time
+                if store is not None:
+                    result_store.save_day_result(store, installation_name, year_n, day_n, day_parameters, day_data,
+                                                 {"tilt": tilt, "azimuth": azimuth, "fitness": fitness,
+                                                  "evaluations": day_evaluations, "seconds": day_seconds},
+                                                 day_parameter_values)
+
+            evaluations += day_evaluations
+            seconds += day_seconds
+            if tilt is not None:
+                best_tilts.append(tilt)
+                best_azimuths.append(azimuth)
+                best_fitnesses.append(fitness)
+
+        # calculating tilt, azimuth and fit ranges
+        min_tilt = min(best_tilts)
+        max_tilt = max(best_tilts)
+        min_azimuth = min(best_azimuths)
+        max_azimuth = max(best_azimuths)
+        min_fit = min(best_fitnesses)
+        max_fit = max(best_fitnesses)
+
+        # calculating tilt, azimuth and fit averages, angles are averaged as panel normal vectors to avoid 0/360 wrap
+        # errors
+        average_tilt, average_azimuth = average_tilt_azimuth(best_tilts, best_azimuths)
+        average_fit = sum(best_fitnesses) / len(best_fitnesses)
+
+        # calculating delta, note that this can only be done if the installation angles are known
+        known_angles = site is not None and site.tilt is not None and site.azimuth is not None
+        if known_angles:
+            delta = angular_distance_between_points(average_tilt, average_azimuth, site.tilt, site.azimuth)
+            print("average delta angle: " + str(round(delta, 3)))
+
+        # printing averages and ranges for results
+        print("Average tilt:" + str(round(average_tilt, 2)) + " azimuth:" + str(round(average_azimuth, 2)) +
+              " fitness" + str(round(average_fit)))
+        print("Tilt range: " + str(round(min_tilt, 2)) + " to " + str(round(max_tilt, 2)))
+        print("Azimuth range: " + str(round(min_azimuth, 2)) + " to " + str(round(max_azimuth, 2)))
+        print("Normalized delta range: " + str(round(min_fit)) + " to " + str(round(max_fit)))
+
+        # saving year summary, clear day selection parameters are part of the year parameters
+        if store is not None:
+            year_parameter_values = dict(day_parameter_values, clear_day_threshold=clear_day_threshold,
+                                         day_budget=day_budget, max_error_increase=max_error_increase)
+            result_store.save_year_result(store, installation_name, year_n,
+                                          result_store.parameter_hash(year_parameter_values),
+                                          result_store.data_hash(df),
+                                          {"latitude": latitude, "longitude": longitude, "tilt": average_tilt,
+                                           "azimuth": average_azimuth, "fitness": average_fit, "days": len(best_tilts),
+                                           "evaluations": evaluations, "seconds": seconds}, year_parameter_values)
+    finally:
+        if store is not None:
+            store.close()
 
     # creating polar plot base plot
     f = matplotlib.pyplot.figure(figsize=(13, 8))
@@ -285,48 +376,73 @@ def angle_clear_days_from_df_with_n_point_fibo(df, latitude, longitude, clear_da
     tilts, azimuths = get_fibonacci_distribution_tilts_azimuths(points)
     scatter = polar_ax.scatter(azimuths, numpy.degrees(tilts), c="grey", alpha=0.2, marker="o", label="Lattice points")
 
-    # plotting known installation angles, comment this out if unknown
-    scatter = polar_ax.scatter(numpy.radians(config.azimuth), config.tilt, c=config.ORANGE, marker="o",
-                               label="Known angles")
+    # plotting known installation angles
+    if known_angles:
+        scatter = polar_ax.scatter(numpy.radians(site.azimuth), site.tilt, c=config.ORANGE, marker="o",
+                                   label="Known angles")
 
     # plotting found best fits for each cloud free day
     scatter = polar_ax.scatter(numpy.radians(best_azimuths), best_tilts, c=config.PURPLE, alpha=0.5, marker="o",
                                label=str(len(best_tilts)) + " best fits")
 
     # adding title, modify accordingly
-    title_string = config.installation_name + " year: " + str(year_n) + " angle estimation using " + str(
+    title_string = installation_name + " year: " + str(year_n) + " angle estimation using " + str(
         len(best_tilts)) + " days"
     matplotlib.pyplot.title(title_string)
 
     matplotlib.pyplot.legend(loc="upper left")
 
     # saving/showing plot
-    filename = config.installation_name + str(year_n) + ".png"
+    filename = installation_name + str(year_n) + ".png"
     matplotlib.pyplot.savefig(filename, bbox_inches='tight')
     matplotlib.pyplot.cla()  # clearing all data from plot
     # matplotlib.pyplot.show()
 
 
-def evaluate_1_day_against_n_fibo_points(clear_day, latitude, longitude, points):
+def evaluate_1_day_against_n_fibo_points(clear_day, latitude, longitude, points, region=None, site=None,
+                                         checkpoint_path=None, checkpoint_every=200):
     """
     Evaluating one clear day with a Fibonacci lattice of n points.
     :param clear_day : One clear day from df
     :param latitude : installation latitude in degrees
     :param longitude : installation longitude in degrees
     :param points : point count of lattice to be generated
+    :param region : optional feasible region from estimate_feasible_angle_region, lattice is restricted to it
+    :param site : optional config.Site, passed to the simulation
+    :param checkpoint_path : optional helpers.checkpoints file, search state is saved every checkpoint_every points
+    and an interrupted search of the same day data and parameters continues from the saved state
+    :param checkpoint_every : points evaluated between checkpoint saves
     :return tilt, azimuth, fitness of best fit. None, None, None if errors encountered
     """
 
     # lattice points in radians
     tilt_angles_radian, azimuth_angles_radian = get_fibonacci_distribution_tilts_azimuths(points)
+    if region is not None:
+        tilt_angles_radian, azimuth_angles_radian = filter_tilts_azimuths_to_region(tilt_angles_radian,
+                                                                                    azimuth_angles_radian, region)
 
     # storing best found fit in these variables
     best_fit = math.inf
     best_fit_tilt = None
     best_fit_azimuth = None
+    next_point = 0
+
+    # continuing from a saved search state of the same day data and search parameters
+    checkpoint = None
+    if checkpoint_path is not None:
+        checkpoint = checkpoints.load_checkpoint(checkpoint_path)
+        checkpoint_key = ("lattice", int(clear_day["year"].values[0]), int(clear_day["day"].values[0]),
+                          result_store.data_hash(clear_day), float(latitude), float(longitude), points, region, site)
+        if checkpoint_key in checkpoint:
+            next_point, best_fit_tilt, best_fit_azimuth, best_fit = checkpoint[checkpoint_key]
+            print("Continuing lattice search from point " + str(next_point) + "/" + str(len(tilt_angles_radian)))
 
     # evaluating all points
-    for i in range(len(tilt_angles_radian)):
+    for i in range(next_point, len(tilt_angles_radian)):
+        if checkpoint is not None and i > next_point and i % checkpoint_every == 0:
+            checkpoint[checkpoint_key] = (i, best_fit_tilt, best_fit_azimuth, best_fit)
+            checkpoints.save_checkpoint(checkpoint, checkpoint_path)
+
         # Progress printing
         if (i + 1) % 50 == 0:
             print("Evaluated " + str(i + 1) + "/" + str(len(tilt_angles_radian)) + " angle pairs.")
@@ -338,17 +454,310 @@ def evaluate_1_day_against_n_fibo_points(clear_day, latitude, longitude, points)
         azimuth_deg = numpy.degrees(azimuth_radian)
 
         # calculating fitness
-        fitness = test_single_pair_of_angles_improved(clear_day, latitude, longitude, tilt_deg, azimuth_deg)
+        fitness = test_single_pair_of_angles_improved(clear_day, latitude, longitude, tilt_deg, azimuth_deg, site=site)
 
         if fitness < best_fit:
             best_fit_tilt = tilt_deg
             best_fit_azimuth = azimuth_deg
             best_fit = fitness
 
+    if checkpoint is not None and next_point < len(tilt_angles_radian):
+        checkpoint[checkpoint_key] = (len(tilt_angles_radian), best_fit_tilt, best_fit_azimuth, best_fit)
+        checkpoints.save_checkpoint(checkpoint, checkpoint_path)
+
     return best_fit_tilt, best_fit_azimuth, best_fit
 
 
-def solve_panel_angles_single_day_iterative(clear_day, latitude, longitude, search_distance):
+def angle_clear_days_jointly_with_n_point_fibo(clear_days, latitude, longitude, points, region=None, chunk_size=500,
+                                               use_clear_mask=False, site=None):
+    """
+    Finds a single best angle fit for multiple clear days. Each lattice orientation is scored against all days and the
+    orientation with the lowest average fitness is returned. Solar geometry is computed once per day and shared by all
+    orientations, orientations are simulated in chunks of chunk_size with pvlib_poa.pvlib_complex_batch. Day geometry
+    comes from pvlib_poa.get_shared_day_geometry, repeated searches over the same days do not simulate it again.
+    :param clear_days: list of clear day dataframes, for example from cloud_free_day_finder.find_smooth_days_df, or
+    a day_block.DayBlock of clear days
+    :param latitude: known geolocation latitude
+    :param longitude: known geolocation longitude
+    :param points: Fibonacci lattice point count
+    :param region: optional feasible region from estimate_feasible_angle_region
+    :param chunk_size: orientations simulated at once, limits memory use to roughly chunk_size*1441*100 bytes
+    :param use_clear_mask: True compares only minutes marked clear in column "clear" of each day, for example days
+    from cloud_free_day_finder.find_partially_clear_days_df
+    :param site: optional config.Site, passed to pvlib_poa.pvlib_complex_batch
+    :return: tilt, azimuth, average fitness over days
+    """
+
+    tilt_angles_radian, azimuth_angles_radian = get_fibonacci_distribution_tilts_azimuths(points)
+    if region is not None:
+        tilt_angles_radian, azimuth_angles_radian = filter_tilts_azimuths_to_region(tilt_angles_radian,
+                                                                                    azimuth_angles_radian, region)
+    tilts = numpy.degrees(tilt_angles_radian)
+    azimuths = numpy.degrees(azimuth_angles_radian)
+
+    if len(tilts) == 0 or len(clear_days) == 0:
+        return None, None, None
+
+    fitness_sums = numpy.zeros(len(tilts))
+
+    is_block = isinstance(clear_days, day_block.DayBlock)
+
+    for i in range(len(clear_days)):
+        if is_block:
+            year_n = int(clear_days.years[i])
+            day_n = int(clear_days.days[i])
+        else:
+            year_n = clear_days[i]["year"].values[0]
+            day_n = clear_days[i]["day"].values[0]
+        print("Scoring " + str(len(tilts)) + " angle pairs against year:" + str(year_n) + " day: " + str(day_n))
+
+        day_geometry = pvlib_poa.get_shared_day_geometry(year_n, day_n, latitude, longitude)
+        if is_block:
+            measured_grid, measured_sum, clear_grid = __minute_grids_from_day_block(clear_days, i, len(day_geometry))
+        else:
+            measured_grid, measured_sum = __measured_minute_grid(clear_days[i], len(day_geometry))
+            clear_grid = __clear_minute_grid(clear_days[i], len(day_geometry)) if use_clear_mask else None
+        if use_clear_mask:
+            measured_sum = numpy.sum(measured_grid[clear_grid])
+        else:
+            clear_grid = None
+
+        for start in range(0, len(tilts), chunk_size):
+            outputs = pvlib_poa.pvlib_complex_batch(day_geometry, tilts[start:start + chunk_size],
+                                                    azimuths[start:start + chunk_size], site=site)
+            fitness_sums[start:start + chunk_size] += __fitnesses_for_simulated_outputs(measured_grid, measured_sum,
+                                                                                        outputs,
+                                                                                        clear_grid=clear_grid)
+
+    fitnesses = fitness_sums / len(clear_days)
+    best = int(numpy.argmin(fitnesses))
+
+    print("Joint best fit over " + str(len(clear_days)) + " days at tilt: " + str(round(tilts[best], 3)) +
+          " azimuth: " + str(round(azimuths[best], 3)))
+
+    return tilts[best], azimuths[best], fitnesses[best]
+
+
+def angle_clear_days_jointly_in_processes(clear_days, latitude, longitude, points, processes=None, region=None,
+                                          chunk_size=500, use_clear_mask=False, site=None):
+    """
+    Process parallel version of angle_clear_days_jointly_with_n_point_fibo. Lattice is split into one shard per
+    requested process. Measurements and day geometry of all days are published once with helpers.shared_arrays and
+    workers attach to them by name, only lattice shards and segment names are pickled. Shards run in the session pool of
+    helpers.worker_pool, successive calls reuse its warm workers.
+    :param clear_days: list of clear day dataframes or a day_block.DayBlock, see
+    angle_clear_days_jointly_with_n_point_fibo
+    :param processes: lattice shard count, os.cpu_count() if None. Also the worker count of the session pool if this
+    call starts it, see helpers.worker_pool.get_worker_pool
+    :return: tilt, azimuth, average fitness over days
+    """
+
+    tilt_angles_radian, azimuth_angles_radian = get_fibonacci_distribution_tilts_azimuths(points)
+    if region is not None:
+        tilt_angles_radian, azimuth_angles_radian = filter_tilts_azimuths_to_region(tilt_angles_radian,
+                                                                                    azimuth_angles_radian, region)
+    tilts = numpy.degrees(tilt_angles_radian)
+    azimuths = numpy.degrees(azimuth_angles_radian)
+
+    if not isinstance(clear_days, day_block.DayBlock):
+        clear_days = day_block.DayBlock.from_day_dfs(clear_days)
+
+    if len(tilts) == 0 or len(clear_days) == 0:
+        return None, None, None
+
+    if processes is None:
+        processes = os.cpu_count()
+    shard_count = max(1, min(processes, len(tilts)))
+
+    # day geometry is computed once in this process and shared with the measurements
+    geometry_arrays = pvlib_poa.get_day_geometry_arrays(clear_days.years, clear_days.days, latitude, longitude)
+
+    block_handle, block_segments = shared_arrays.publish_day_block(clear_days)
+    try:
+        geometry_handle, geometry_segments = shared_arrays.publish_arrays(geometry_arrays)
+        try:
+            shards = numpy.array_split(numpy.arange(len(tilts)), shard_count)
+            print("Scoring " + str(len(tilts)) + " angle pairs against " + str(len(clear_days)) + " days in " +
+                  str(shard_count) + " shards")
+            shard_sums = worker_pool.map_in_workers(__score_orientation_shard, [block_handle] * shard_count,
+                                                    [geometry_handle] * shard_count,
+                                                    [tilts[shard] for shard in shards],
+                                                    [azimuths[shard] for shard in shards], [chunk_size] * shard_count,
+                                                    [use_clear_mask] * shard_count, [site] * shard_count,
+                                                    processes=processes)
+        finally:
+            shared_arrays.release_arrays(geometry_segments)
+    finally:
+        shared_arrays.release_arrays(block_segments)
+
+    fitnesses = numpy.concatenate(shard_sums) / len(clear_days)
+    best = int(numpy.argmin(fitnesses))
+
+    print("Joint best fit over " + str(len(clear_days)) + " days at tilt: " + str(round(tilts[best], 3)) +
+          " azimuth: " + str(round(azimuths[best], 3)))
+
+    return tilts[best], azimuths[best], fitnesses[best]
+
+
+def __score_orientation_shard(block_handle, geometry_handle, tilts, azimuths, chunk_size, use_clear_mask, site):
+    """
+    Worker of angle_clear_days_jointly_in_processes.
+    :return: numpy array of fitness sums over all days, one per orientation
+    """
+    clear_days, block_segments = shared_arrays.attach_day_block(block_handle)
+    geometry_arrays, geometry_segments = shared_arrays.attach_arrays(geometry_handle)
+    try:
+        fitness_sums = numpy.zeros(len(tilts))
+        for i in range(len(clear_days)):
+            day_geometry = pvlib_poa.day_geometry_from_arrays(geometry_arrays, i)
+            measured_grid, measured_sum, clear_grid = __minute_grids_from_day_block(clear_days, i, len(day_geometry))
+            if use_clear_mask:
+                measured_sum = numpy.sum(measured_grid[clear_grid])
+            else:
+                clear_grid = None
+
+            for start in range(0, len(tilts), chunk_size):
+                outputs = pvlib_poa.pvlib_complex_batch(day_geometry, tilts[start:start + chunk_size],
+                                                        azimuths[start:start + chunk_size], site=site)
+                fitness_sums[start:start + chunk_size] += __fitnesses_for_simulated_outputs(measured_grid,
+                                                                                            measured_sum, outputs,
+                                                                                            clear_grid=clear_grid)
+        return fitness_sums
+    finally:
+        # views to the segments are dropped before detaching
+        del clear_days, geometry_arrays
+        shared_arrays.close_arrays(block_segments)
+        shared_arrays.close_arrays(geometry_segments)
+
+
+def evaluate_1_day_two_tier(clear_day, latitude, longitude, points, finalist_count=200, region=None,
+                            diagnostics=True, site=None):
+    """
+    Two tier lattice search. Every lattice point is scored with plain POA, which is cheap, and only the finalist_count
+    best points are scored again with the complex model which adds reflection, temperature and output estimation.
+    Both models rank orientations similarly and most of the lattice is far away from the optimum.
+    :param clear_day: One clear day from df
+    :param latitude: installation latitude in degrees
+    :param longitude: installation longitude in degrees
+    :param points: point count of lattice to be generated
+    :param finalist_count: how many of the best POA scored points are scored with the complex model
+    :param region: optional feasible region from estimate_feasible_angle_region
+    :param diagnostics: if True, prints how well the POA ranking agrees with the complex model ranking
+    :param site: optional config.Site, passed to the complex model
+    :return: tilt, azimuth, fitness of best complex model fit. None, None, None if no lattice points
+    """
+
+    tilt_angles_radian, azimuth_angles_radian = get_fibonacci_distribution_tilts_azimuths(points)
+    if region is not None:
+        tilt_angles_radian, azimuth_angles_radian = filter_tilts_azimuths_to_region(tilt_angles_radian,
+                                                                                    azimuth_angles_radian, region)
+    tilts = numpy.degrees(tilt_angles_radian)
+    azimuths = numpy.degrees(azimuth_angles_radian)
+
+    if len(tilts) == 0:
+        return None, None, None
+
+    year_n = clear_day["year"].values[0]
+    day_n = clear_day["day"].values[0]
+    day_geometry = pvlib_poa.get_day_geometry(year_n, day_n, latitude, longitude)
+    measured_grid, measured_sum = __measured_minute_grid(clear_day, len(day_geometry))
+
+    # tier 1, plain POA for whole lattice
+    poa_fitnesses = __fitnesses_for_simulated_outputs(measured_grid, measured_sum,
+                                                      pvlib_poa.get_irradiance_batch(day_geometry, tilts, azimuths))
+    finalists = numpy.argsort(poa_fitnesses)[:finalist_count]
+
+    # tier 2, complex model for finalists
+    outputs = pvlib_poa.pvlib_complex_batch(day_geometry, tilts[finalists], azimuths[finalists], site=site)
+    complex_fitnesses = __fitnesses_for_simulated_outputs(measured_grid, measured_sum, outputs)
+    best = int(numpy.argmin(complex_fitnesses))
+
+    if diagnostics:
+        # spearman rank correlation between the two models within finalists, 1.0 means identical ordering
+        poa_ranks = numpy.argsort(numpy.argsort(poa_fitnesses[finalists]))
+        complex_ranks = numpy.argsort(numpy.argsort(complex_fitnesses))
+        if len(finalists) > 1:
+            rank_correlation = numpy.corrcoef(poa_ranks, complex_ranks)[0, 1]
+        else:
+            rank_correlation = 1.0
+        poa_best_delta = angular_distance_between_points(tilts[finalists[0]], azimuths[finalists[0]],
+                                                         tilts[finalists[best]], azimuths[finalists[best]])
+
+        print("Two tier search, " + str(len(tilts)) + " POA and " + str(len(finalists)) + " complex evaluations")
+        print("Complex best was POA rank " + str(best + 1) + "/" + str(len(finalists)) + ", rank correlation: " + str(
+            round(rank_correlation, 3)) + ", POA best to complex best: " + str(round(poa_best_delta, 3)) + " degrees")
+        if best == len(finalists) - 1:
+            print("Complex best was the last finalist, consider increasing finalist_count")
+
+    return tilts[finalists[best]], azimuths[finalists[best]], complex_fitnesses[best]
+
+
+def evaluate_1_day_multiresolution(clear_day, latitude, longitude, points, minute_step=10, finalist_count=50,
+                                   region=None, verify=False, site=None):
+    """
+    Multi-resolution lattice search. Every lattice point is scored with simulations and measurements decimated to every
+    minute_step:th minute and only the finalist_count best points are scored again at full 1 minute resolution.
+    Simulation cost scales linearly with simulated minutes.
+    :param clear_day: One clear day from df
+    :param latitude: installation latitude in degrees
+    :param longitude: installation longitude in degrees
+    :param points: point count of lattice to be generated
+    :param minute_step: resolution of the first round in minutes
+    :param finalist_count: how many of the best decimated points are scored at full resolution
+    :param region: optional feasible region from estimate_feasible_angle_region
+    :param verify: if True, whole lattice is also scored at full resolution and the two optima are compared. Slow,
+    intended for checking that minute_step and finalist_count are suitable for a dataset
+    :param site: optional config.Site, passed to the simulation
+    :return: tilt, azimuth, fitness of best full resolution fit. None, None, None if no lattice points
+    """
+
+    tilt_angles_radian, azimuth_angles_radian = get_fibonacci_distribution_tilts_azimuths(points)
+    if region is not None:
+        tilt_angles_radian, azimuth_angles_radian = filter_tilts_azimuths_to_region(tilt_angles_radian,
+                                                                                    azimuth_angles_radian, region)
+    tilts = numpy.degrees(tilt_angles_radian)
+    azimuths = numpy.degrees(azimuth_angles_radian)
+
+    if len(tilts) == 0:
+        return None, None, None
+
+    year_n = clear_day["year"].values[0]
+    day_n = clear_day["day"].values[0]
+
+    # decimated round for whole lattice
+    coarse_geometry = pvlib_poa.get_day_geometry(year_n, day_n, latitude, longitude, minute_step=minute_step)
+    coarse_grid, coarse_sum = __measured_minute_grid(clear_day, len(coarse_geometry), minute_step=minute_step)
+    coarse_fitnesses = __fitnesses_for_simulated_outputs(coarse_grid, coarse_sum,
+                                                         pvlib_poa.pvlib_complex_batch(coarse_geometry, tilts,
+                                                                                       azimuths, site=site),
+                                                         minute_step=minute_step)
+    finalists = numpy.argsort(coarse_fitnesses)[:finalist_count]
+
+    # full resolution round for finalists
+    full_geometry = pvlib_poa.get_day_geometry(year_n, day_n, latitude, longitude)
+    full_grid, full_sum = __measured_minute_grid(clear_day, len(full_geometry))
+    full_fitnesses = __fitnesses_for_simulated_outputs(full_grid, full_sum,
+                                                       pvlib_poa.pvlib_complex_batch(full_geometry, tilts[finalists],
+                                                                                     azimuths[finalists], site=site))
+    best = int(numpy.argmin(full_fitnesses))
+    best_tilt, best_azimuth, best_fit = tilts[finalists[best]], azimuths[finalists[best]], full_fitnesses[best]
+
+    if verify:
+        all_fitnesses = numpy.concatenate(
+            [__fitnesses_for_simulated_outputs(full_grid, full_sum,
+                                               pvlib_poa.pvlib_complex_batch(full_geometry, tilts[i:i + 500],
+                                                                             azimuths[i:i + 500], site=site))
+             for i in range(0, len(tilts), 500)])
+        reference = int(numpy.argmin(all_fitnesses))
+        delta = angular_distance_between_points(best_tilt, best_azimuth, tilts[reference], azimuths[reference])
+        print("Multi-resolution optimum matches full resolution search: " + str(reference == finalists[best]) +
+              ", angle delta: " + str(round(delta, 3)) + " fitness delta: " + str(
+            round(best_fit - all_fitnesses[reference], 3)))
+
+    return best_tilt, best_azimuth, best_fit
+
+
+def solve_panel_angles_single_day_iterative(clear_day, latitude, longitude, search_distance, region=None, site=None):
     year_n = clear_day["year"].values[0]
     day_n = clear_day["day"].values[0]
 
@@ -358,8 +767,13 @@ def solve_panel_angles_single_day_iterative(clear_day, latitude, longitude, sear
     center_tilt = 60
     center_azimuth = 270
 
-    center_fit = test_single_pair_of_angles_improved(clear_day, config.latitude, config.longitude, center_tilt,
-                                                     center_azimuth)
+    # starting from the middle of the feasible region if one is given
+    if region is not None:
+        center_tilt = region[2] / 2
+        center_azimuth = (region[0] + ((region[1] - region[0]) % 360) / 2) % 360
+
+    center_fit = test_single_pair_of_angles_improved(clear_day, latitude, longitude, center_tilt, center_azimuth,
+                                                     site=site)
     distance = search_distance
 
     for i in range(30):
@@ -368,7 +782,7 @@ def solve_panel_angles_single_day_iterative(clear_day, latitude, longitude, sear
         tilts, azimuths = points_around_center_x_y_in_tilt_azimuth(center_x, center_y, distance)
 
         new_tilt, new_azimuth, new_fit = get_best_from_tilt_azimuth_list(clear_day, latitude, longitude, tilts,
-                                                                         azimuths)
+                                                                         azimuths, region=region, site=site)
 
         if new_fit < center_fit:
             center_tilt = new_tilt
@@ -381,10 +795,205 @@ def solve_panel_angles_single_day_iterative(clear_day, latitude, longitude, sear
     return center_tilt, center_azimuth, center_fit
 
 
+def solve_panel_angles_single_day_surrogate(clear_day, latitude, longitude, initial_points=20, max_evaluations=80,
+                                            tolerance=0.0005, region=None, site=None):
+    """
+    Surrogate model guided angle search. Fitness landscape over the unit circle is smooth and unimodal on clear days,
+    this is why a quadratic model fitted to the already evaluated points is a good guess of where the minimum is.
+    Each round fits the surrogate around the best point, evaluates the full simulation at the surrogate minimum and
+    shrinks the search radius if the guess was not an improvement.
+    :param clear_day: One clear day from df
+    :param latitude: installation latitude in degrees
+    :param longitude: installation longitude in degrees
+    :param initial_points: Fibonacci lattice point count used for seeding the surrogate
+    :param max_evaluations: upper limit for test_single_pair_of_angles_improved calls
+    :param tolerance: convergence radius in unit circle coordinates, 0.0005 equals 0.045 degrees of tilt
+    :param region: optional feasible region from estimate_feasible_angle_region, search is restricted to it
+    :param site: optional config.Site, passed to the simulation
+    :return: tilt, azimuth, fitness of best evaluated point
+    """
+
+    year_n = clear_day["year"].values[0]
+    day_n = clear_day["day"].values[0]
+    print("Surrogate search for day year:" + str(year_n) + " day: " + str(day_n))
+
+    # evaluated points in unit circle coordinates and their fitness values
+    xs, ys, fitnesses = [], [], []
+
+    def evaluate(x, y):
+        tilt, azimuth = unit_circle_point_to_tilt_azimuth(x, y)
+        fitness = test_single_pair_of_angles_improved(clear_day, latitude, longitude, tilt, azimuth, site=site)
+        xs.append(x)
+        ys.append(y)
+        fitnesses.append(fitness)
+
+    # seeding the surrogate with a sparse lattice
+    tilts_rad, azimuths_rad = get_fibonacci_distribution_tilts_azimuths(initial_points)
+    if region is not None:
+        # keeping the seed density the same within the smaller region
+        area_fraction = max(len(filter_tilts_azimuths_to_region(tilts_rad, azimuths_rad, region)[0]), 1) / len(tilts_rad)
+        tilts_rad, azimuths_rad = get_fibonacci_distribution_tilts_azimuths(int(initial_points / area_fraction))
+        tilts_rad, azimuths_rad = filter_tilts_azimuths_to_region(tilts_rad, azimuths_rad, region)
+        if len(tilts_rad) == 0:
+            # region too small for the lattice, seeding from the whole angle space instead
+            print("No seed points within region " + str(region) + ", using unpruned seeds")
+            tilts_rad, azimuths_rad = get_fibonacci_distribution_tilts_azimuths(initial_points)
+    for i in range(len(tilts_rad)):
+        x, y = tilt_azimuth_to_unit_circle_point(numpy.degrees(tilts_rad[i]), numpy.degrees(azimuths_rad[i]))
+        evaluate(x, y)
+
+    # initial trust radius is roughly the distance between seed lattice points
+    radius = 2 / math.sqrt(len(xs))
+
+    while len(fitnesses) < max_evaluations and radius >= tolerance:
+        best = int(numpy.argmin(fitnesses))
+        best_x, best_y = xs[best], ys[best]
+
+        # fitting the surrogate to the points nearest to the current best
+        points_x = numpy.array(xs)
+        points_y = numpy.array(ys)
+        distances = numpy.hypot(points_x - best_x, points_y - best_y)
+        nearest = numpy.argsort(distances)[:10]
+        # absolute error fitness forms a cone around the optimum, squared fitness is closer to a quadratic bowl
+        squared_fitnesses = numpy.array(fitnesses)[nearest] ** 2
+        coefficients = __fit_quadratic_surrogate(points_x[nearest], points_y[nearest], squared_fitnesses)
+
+        new_x, new_y = __minimize_quadratic_surrogate(coefficients, best_x, best_y, radius, region)
+
+        # surrogate minimum at the best point means that the surrogate has nothing new to offer at this radius
+        if math.hypot(new_x - best_x, new_y - best_y) < tolerance:
+            radius = radius / 2
+            continue
+
+        evaluate(new_x, new_y)
+
+        if fitnesses[-1] < fitnesses[best]:
+            radius = min(radius * 2, 1.0)
+        else:
+            radius = radius / 2
+
+    best = int(numpy.argmin(fitnesses))
+    best_tilt, best_azimuth = unit_circle_point_to_tilt_azimuth(xs[best], ys[best])
+    print("Surrogate search used " + str(len(fitnesses)) + " evaluations, final radius: " + str(round(radius, 5)))
+
+    return best_tilt, best_azimuth, fitnesses[best]
+
+
+def estimate_feasible_angle_region(clear_day, latitude, longitude, tilt_margin=5, centroid_minutes=10,
+                                   spread_fraction=0.05, site=None):
+    """
+    Pre-search stage which limits the angle space by using cheap features of the measured power curve. Power weighted
+    mean minute and standard deviation of the measured curve are compared against the same features of a coarse
+    tilt-azimuth grid simulated with pvlib_complex_batch. Grid cells whose corner features bracket the measured
+    features are feasible and the region covers all of them. Early centroid means east and late centroid west facing
+    panels on either side of the east-west line, narrow curves mean steep south facing and wide curves steep north
+    facing panels. Flat panels look the same from every azimuth, their cells make the whole azimuth circle feasible.
+    :param clear_day: One clear day from df
+    :param latitude: installation latitude in degrees
+    :param longitude: installation longitude in degrees
+    :param tilt_margin: degrees added to the highest feasible grid tilt, tilt upper bound
+    :param centroid_minutes: allowed difference between measured and simulated power centroid minutes
+    :param spread_fraction: allowed relative difference between measured and simulated power curve spreads
+    :param site: optional config.Site, passed to the simulation
+    :return: region tuple (azimuth_start, azimuth_end, tilt_max), sector is clockwise from start to end, degrees
+    """
+
+    year_n = clear_day["year"].values[0]
+    day_n = clear_day["day"].values[0]
+
+    measured_centroid, measured_spread = __power_curve_centroids_and_spreads(clear_day["minute"].values,
+                                                                             clear_day["output"].values)
+
+    centroids, spreads = __region_grid_features(int(year_n), int(day_n), float(latitude), float(longitude), site)
+
+    # features of the four corners of each grid cell, azimuth wraps over 360
+    cell_centroids = __grid_cell_corners(centroids)
+    cell_spreads = __grid_cell_corners(spreads)
+    feasible = ((cell_centroids.min(axis=0) - centroid_minutes <= measured_centroid) &
+                (measured_centroid <= cell_centroids.max(axis=0) + centroid_minutes) &
+                (cell_spreads.min(axis=0) * (1 - spread_fraction) <= measured_spread) &
+                (measured_spread <= cell_spreads.max(axis=0) * (1 + spread_fraction)))
+
+    if not numpy.any(feasible):
+        print("Power curve does not match any simulated orientation, angle space not limited")
+        return 0.0, 360.0, 90.0
+
+    # upper tilt edge of the highest feasible cell
+    tilt_max = min(90.0, __region_grid_tilts[1:][numpy.any(feasible, axis=1)].max() + tilt_margin)
+
+    # smallest sector which covers all feasible azimuth columns, found as the complement of the longest gap
+    feasible_columns = numpy.any(feasible, axis=0)
+    if numpy.all(feasible_columns):
+        print("Azimuth not limited, tilt limited to " + str(round(tilt_max, 1)))
+        return 0.0, 360.0, float(tilt_max)
+
+    azimuth_step = __region_grid_azimuths[1] - __region_grid_azimuths[0]
+    gap_lengths = numpy.zeros(len(feasible_columns), dtype=int)
+    gap_length = 0
+    # two rounds so that gaps which wrap over 360 are counted in full
+    for j in list(range(len(feasible_columns))) * 2:
+        gap_length = 0 if feasible_columns[j] else gap_length + 1
+        gap_lengths[j] = max(gap_lengths[j], gap_length)
+    gap_end = int(numpy.argmax(gap_lengths))
+    azimuth_start = __region_grid_azimuths[(gap_end + 1) % len(__region_grid_azimuths)]
+    azimuth_end = azimuth_start + (len(feasible_columns) - gap_lengths[gap_end]) * azimuth_step
+
+    print("Azimuth limited to " + str(round(azimuth_start % 360, 1)) + "-" + str(round(azimuth_end % 360, 1)) +
+          " and tilt to " + str(round(tilt_max, 1)))
+
+    return float(azimuth_start), float(azimuth_end), float(tilt_max)
+
+
 ############################
 #   GLOBAL HELPERS
 ############################
 
+def average_tilt_azimuth(tilts, azimuths):
+    """
+    Averages panel angles as panel normal vectors. Arithmetic mean of azimuths is wrong near the 0/360 wrap, for
+    example 350 and 10 would average to 180 instead of 0.
+    :param tilts: list of tilts in degrees
+    :param azimuths: list of azimuths in degrees
+    :return: average tilt, average azimuth in degrees
+    """
+    tilts_rad = numpy.radians(tilts)
+    azimuths_rad = numpy.radians(azimuths)
+
+    x = numpy.mean(numpy.sin(tilts_rad) * numpy.cos(azimuths_rad))
+    y = numpy.mean(numpy.sin(tilts_rad) * numpy.sin(azimuths_rad))
+    z = numpy.mean(numpy.cos(tilts_rad))
+
+    average_tilt = numpy.degrees(math.atan2(math.hypot(x, y), z))
+    # modulo of a tiny negative angle rounds to 360.0
+    average_azimuth = numpy.degrees(math.atan2(y, x)) % 360
+    if average_azimuth >= 360:
+        average_azimuth = 0.0
+
+    return average_tilt, average_azimuth
+
+
+def angle_in_feasible_region(tilt, azimuth, region):
+    """
+    :param tilt: tilt in degrees
+    :param azimuth: azimuth in degrees
+    :param region: (azimuth_start, azimuth_end, tilt_max) from estimate_feasible_angle_region
+    :return: True if angle pair is within region
+    """
+    return bool(__in_region_mask(numpy.array([tilt]), numpy.array([azimuth]), region)[0])
+
+
+def filter_tilts_azimuths_to_region(tilt_rads, azimuth_rads, region):
+    """
+    Removes angle pairs which are outside the feasible region. Intended for Fibonacci lattice output.
+    :param tilt_rads: tilts in radians
+    :param azimuth_rads: azimuths in radians
+    :param region: (azimuth_start, azimuth_end, tilt_max) from estimate_feasible_angle_region
+    :return: [tilts(rad)], [azimuths(rad)] within region
+    """
+    inside = __in_region_mask(numpy.degrees(tilt_rads), numpy.degrees(azimuth_rads), region)
+    return list(numpy.array(tilt_rads)[inside]), list(numpy.array(azimuth_rads)[inside])
+
+
 def tilt_azimuth_to_unit_circle_point(tilt, azimuth):
     """
     This functions transforms a tilt azimuth pair to x-y pair
@@ -476,6 +1085,28 @@ def get_fibonacci_distribution_tilts_azimuths(samples):
 ############################
 
 
+def __lattice_search_parameters(latitude, longitude, points, prune_region, site):
+    """
+    :return: dictionary of the parameters which change lattice search results of a day, used as result store key
+    """
+    albedo = config.albedo if site is None else site.albedo
+    module_elevation = config.module_elevation if site is None else site.module_elevation
+    return {"method": "fibonacci_lattice", "latitude": float(latitude), "longitude": float(longitude),
+            "points": int(points), "prune_region": bool(prune_region), "albedo": float(albedo),
+            "module_elevation": float(module_elevation)}
+
+
+def __lattice_point_count(points, region):
+    """
+    :return: count of lattice points evaluated by evaluate_1_day_against_n_fibo_points
+    """
+    if region is None:
+        return points
+    tilts, azimuths = get_fibonacci_distribution_tilts_azimuths(points)
+    tilts, azimuths = filter_tilts_azimuths_to_region(tilts, azimuths, region)
+    return len(tilts)
+
+
 def __get_fibonacci_sample(sample, sample_max):
     """
     :param sample: sample number when there are sample_max samples
@@ -500,6 +1131,223 @@ def __get_fibonacci_sample(sample, sample_max):
     return x, y, z, phi, theta
 
 
+def __measured_minute_grid(day_df, length, minute_step=1):
+    """
+    Places measured powers of a single day to a minute indexed array. Same as the outer merge on time in
+    test_single_pair_of_angles_improved, minutes without measurements are zeros.
+    :param day_df: one day of measurements
+    :param length: grid length, 1441 for pvlib_complex days
+    :param minute_step: grid resolution in minutes, only minutes divisible by minute_step are used
+    :return: grid of measured powers, sum of measured powers
+    """
+    outputs = day_df["output"].values
+    minutes = day_df["minute"].values
+    valid = ~numpy.isnan(outputs) & (minutes % minute_step == 0)
+
+    grid = numpy.zeros(length)
+    grid[minutes[valid] // minute_step] = outputs[valid]
+
+    return grid, numpy.sum(outputs[valid])
+
+
+def __minute_grids_from_day_block(block, index, length):
+    """
+    Same grids as __measured_minute_grid and __clear_minute_grid, for one day of a day_block.DayBlock.
+    :param block: day_block.DayBlock
+    :param index: row index of the day in block
+    :param length: grid length, at least 1440
+    :return: grid of measured powers, sum of measured powers, boolean grid of clear minutes (measured minutes if block
+    has no clear mask)
+    """
+    valid = block.valid[index]
+    powers = numpy.where(valid, block.powers[index], 0).astype(numpy.float64)
+
+    measured_grid = numpy.zeros(length)
+    measured_grid[:len(powers)] = powers
+
+    clear_grid = numpy.zeros(length, dtype=bool)
+    clear_grid[:len(powers)] = valid if block.clear is None else (valid & block.clear[index])
+
+    return measured_grid, numpy.sum(powers), clear_grid
+
+
+def __clear_minute_grid(day_df, length, minute_step=1):
+    """
+    Places the "clear" column of a single day to a minute indexed boolean array, see
+    cloud_free_day_finder.clear_minute_mask.
+    :param day_df: one day of measurements with column "clear"
+    :param length: grid length, same as in __measured_minute_grid
+    :param minute_step: grid resolution in minutes
+    :return: boolean grid, True for clear measured minutes
+    """
+    outputs = day_df["output"].values
+    minutes = day_df["minute"].values
+    valid = ~numpy.isnan(outputs) & (minutes % minute_step == 0) & day_df["clear"].values.astype(bool)
+
+    grid = numpy.zeros(length, dtype=bool)
+    grid[minutes[valid] // minute_step] = True
+
+    return grid
+
+
+def __fitnesses_for_simulated_outputs(measured_grid, measured_sum, outputs, minute_step=1, clear_grid=None):
+    """
+    Vectorized fitness function of test_single_pair_of_angles_improved for many simulated curves.
+    :param measured_grid: measured powers from __measured_minute_grid
+    :param measured_sum: sum of measured powers, over clear minutes only if clear_grid is given
+    :param outputs: simulated outputs, shape (n, len(measured_grid))
+    :param minute_step: grid resolution in minutes
+    :param clear_grid: optional boolean grid from __clear_minute_grid, scaling and errors then use only clear minutes and
+    fitness is the average error per clear minute
+    :return: numpy array of n average per minute errors
+    """
+    if clear_grid is not None:
+        measured_grid = measured_grid[clear_grid]
+        outputs = outputs[:, clear_grid]
+
+    simulated_sums = numpy.sum(outputs, axis=1)
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        ratios = measured_sum / simulated_sums
+    scaled = outputs * ratios[:, None]
+
+    # removing near zero simulated powers like test_single_pair_of_angles_improved does
+    scaled = numpy.where(scaled >= 0.001, scaled, 0)
+
+    errors = numpy.sum(numpy.abs(measured_grid[None, :] - scaled), axis=1)
+    if clear_grid is not None:
+        fitnesses = errors / max(len(measured_grid), 1)
+    else:
+        fitnesses = errors / (1440 / minute_step)
+    fitnesses[~(simulated_sums > 0)] = math.inf
+
+    return fitnesses
+
+
+def __in_region_mask(tilts, azimuths, region):
+    """
+    :param tilts: numpy array of tilts in degrees
+    :param azimuths: numpy array of azimuths in degrees
+    :param region: (azimuth_start, azimuth_end, tilt_max), azimuth sector is clockwise and may wrap over 360
+    :return: boolean numpy array
+    """
+    azimuth_start, azimuth_end, tilt_max = region
+    sector_width = azimuth_end - azimuth_start
+    if sector_width >= 360:
+        in_sector = numpy.ones(len(azimuths), dtype=bool)
+    else:
+        in_sector = (azimuths - azimuth_start) % 360 <= sector_width % 360
+
+    return in_sector & (tilts <= tilt_max)
+
+
+# tilt rows and azimuth columns of the estimate_feasible_angle_region grid, pvlib_complex_batch does not support tilt 0
+# and flat panels are represented by tilt 1
+__region_grid_tilts = numpy.concatenate([[1.0], numpy.arange(5, 91, 5.0)])
+__region_grid_azimuths = numpy.arange(0, 360, 10.0)
+
+
+@functools.lru_cache(maxsize=64)
+def __region_grid_features(year, day, latitude, longitude, site):
+    """
+    Power curve features of the estimate_feasible_angle_region grid, cached as repeated region estimates of the same
+    day share them.
+    :return: centroids and spreads, 2d arrays with tilt rows and azimuth columns
+    """
+    tilts, azimuths = numpy.meshgrid(__region_grid_tilts, __region_grid_azimuths, indexing="ij")
+
+    day_geometry = pvlib_poa.get_shared_day_geometry(year, day, latitude, longitude)
+    outputs = pvlib_poa.pvlib_complex_batch(day_geometry, tilts.ravel(), azimuths.ravel(), site=site)
+    centroids, spreads = __power_curve_centroids_and_spreads(numpy.arange(len(day_geometry)), outputs)
+    return centroids.reshape(tilts.shape), spreads.reshape(tilts.shape)
+
+
+def __power_curve_centroids_and_spreads(minutes, powers):
+    """
+    :param minutes: minutes of the day
+    :param powers: power or irradiance values at minutes, one curve or a 2d array with one curve per row
+    :return: power weighted mean minutes and power weighted standard deviations of minutes
+    """
+    powers = numpy.clip(numpy.nan_to_num(numpy.asarray(powers, dtype=float)), 0, None)
+    minutes = numpy.asarray(minutes, dtype=float)
+    total = numpy.sum(powers, axis=-1)
+    centroids = numpy.sum(powers * minutes, axis=-1) / total
+    spreads = numpy.sqrt(numpy.sum(powers * (minutes - centroids[..., None]) ** 2, axis=-1) / total)
+    return centroids, spreads
+
+
+def __grid_cell_corners(values):
+    """
+    :param values: 2d array of values at tilt rows and azimuth columns of a grid
+    :return: 3d array with the four corner values of each grid cell, last azimuth column wraps to the first one
+    """
+    next_azimuth = numpy.roll(values, -1, axis=1)
+    return numpy.stack([values[:-1], values[1:], next_azimuth[:-1], next_azimuth[1:]])
+
+
+def __quadratic_surrogate_terms(x, y):
+    """
+    :param x: unit circle x values, numpy array
+    :param y: unit circle y values, numpy array
+    :return: matrix with columns 1, x, y, x², xy, y²
+    """
+    return numpy.column_stack([numpy.ones(len(x)), x, y, x * x, x * y, y * y])
+
+
+def __fit_quadratic_surrogate(x, y, fitnesses):
+    """
+    Least squares fit of a 2d quadratic polynomial to evaluated fitness values.
+    :param x: unit circle x values, numpy array
+    :param y: unit circle y values, numpy array
+    :param fitnesses: fitness values at x, y
+    :return: 6 polynomial coefficients in the order of __quadratic_surrogate_terms
+    """
+    coefficients, _, _, _ = numpy.linalg.lstsq(__quadratic_surrogate_terms(x, y), fitnesses, rcond=None)
+    return coefficients
+
+
+def __minimize_quadratic_surrogate(coefficients, center_x, center_y, radius, region=None):
+    """
+    Finds the surrogate minimum within radius from center point and within the unit circle. Stationary point of the
+    quadratic is used if the surrogate is convex and the point is within the allowed area, otherwise the minimum is
+    searched from a dense sunflower pattern of candidate points.
+    :param region: optional feasible region, candidates outside it are removed. Center point is always kept.
+    :return: x, y of surrogate minimum
+    """
+
+    # sunflower pattern, evenly spread points within a disk
+    candidate_count = 400
+    k = numpy.arange(candidate_count) + 0.5
+    r = radius * numpy.sqrt(k / candidate_count)
+    theta = math.pi * (3 - math.sqrt(5)) * k
+    candidates_x = numpy.append(center_x + r * numpy.cos(theta), center_x)
+    candidates_y = numpy.append(center_y + r * numpy.sin(theta), center_y)
+
+    # stationary point of c0 + c1x + c2y + c3x² + c4xy + c5y²
+    hessian = numpy.array([[2 * coefficients[3], coefficients[4]], [coefficients[4], 2 * coefficients[5]]])
+    if numpy.all(numpy.linalg.eigvalsh(hessian) > 0):
+        stationary_x, stationary_y = numpy.linalg.solve(hessian, -coefficients[1:3])
+        if math.hypot(stationary_x - center_x, stationary_y - center_y) <= radius:
+            candidates_x = numpy.append(candidates_x, stationary_x)
+            candidates_y = numpy.append(candidates_y, stationary_y)
+
+    # points outside unit circle would be clipped to 90 degree tilt, removing them
+    inside = numpy.hypot(candidates_x, candidates_y) <= 1.0
+    if region is not None:
+        candidate_tilts = numpy.minimum(numpy.hypot(candidates_x, candidates_y), 1.0) * 90
+        candidate_azimuths = numpy.degrees(numpy.arctan2(candidates_y, candidates_x)) % 360
+        inside = inside & __in_region_mask(candidate_tilts, candidate_azimuths, region)
+    # center point is an already evaluated point, it is always a valid answer
+    inside[candidate_count] = True
+    candidates_x = candidates_x[inside]
+    candidates_y = candidates_y[inside]
+
+    predicted = __quadratic_surrogate_terms(candidates_x, candidates_y) @ coefficients
+    best = numpy.argmin(predicted)
+
+    return candidates_x[best], candidates_y[best]
+
+
 def angular_distance_between_points(tilt1, azimuth1, tilt2, azimuth2):
     """
     Calculates the angular distance in degrees between two points in angle space
@@ -0,0 +1,147 @@
+"""
+FLEET BATCH RUNNER
+
+Runs load -> clear day detection -> geolocation -> angle estimation for every site of a site manifest and writes one
+summary table. Sites are sharded over the session process pool of helpers.worker_pool, each worker estimates whole
+sites with site_estimator.estimate_site.
+
+Site manifest is a csv file with one row per installation and columns:
+name: unique site name
+path: path to the FMI format csv file of the site, relative paths are relative to the manifest
+latitude, longitude, tilt, azimuth: known parameters, leave empty if unknown
+rated_power, module_elevation, albedo: optional, config defaults are used if the column or value is missing
+
+Known latitude and longitude skip geolocation of that site. Known tilt and azimuth are not used by the estimation, they
+are compared to the estimated angles in the summary table.
+"""
+
+import os
+import time
+
+import pandas
+
+from estimators import angler
+from estimators import site_estimator
+from helpers import config
+from helpers import day_features
+from helpers import solar_power_data_loader2
+from helpers import worker_pool
+
+
+summary_columns = ["name", "path", "status", "latitude", "longitude", "tilt", "azimuth", "fitness", "clear_days",
+                   "known_latitude", "known_longitude", "angle_error", "seconds"]
+
+
+def read_site_manifest(path):
+    """
+    :param path: path to site manifest csv
+    :return: list of (config.Site, csv path) tuples in manifest order
+    """
+    manifest = pandas.read_csv(path)
+
+    missing = [column for column in ["name", "path"] if column not in manifest.columns]
+    if len(missing) > 0:
+        raise ValueError("Site manifest " + path + " is missing columns " + str(missing))
+
+    manifest_directory = os.path.dirname(os.path.abspath(path))
+
+    sites = []
+    for row in manifest.to_dict("records"):
+        site = config.Site(
+            name=str(row["name"]),
+            latitude=__optional_float(row, "latitude"),
+            longitude=__optional_float(row, "longitude"),
+            tilt=__optional_float(row, "tilt"),
+            azimuth=__optional_float(row, "azimuth"),
+            rated_power=__optional_float(row, "rated_power", 1),
+            module_elevation=__optional_float(row, "module_elevation", config.module_elevation),
+            albedo=__optional_float(row, "albedo", config.albedo)
+        )
+        sites.append((site, os.path.join(manifest_directory, str(row["path"]))))
+
+    return sites
+
+
+def estimate_fleet(manifest_path, summary_path=None, processes=None, **estimate_kwargs):
+    """
+    Estimates every site of a site manifest in a process pool.
+    :param manifest_path: path to site manifest csv
+    :param summary_path: optional path of summary csv, written once all sites are done
+    :param processes: worker process count, os.cpu_count() if None. Pool is not resized if it is already running,
+    see helpers.worker_pool.get_worker_pool
+    :param estimate_kwargs: passed to site_estimator.estimate_site, for example points or angle_days
+    :return: summary dataframe with summary_columns, one row per site in manifest order
+    """
+    sites = read_site_manifest(manifest_path)
+
+    if processes is None:
+        processes = os.cpu_count()
+    site_processes = max(1, min(processes, len(sites)))
+
+    print("Estimating " + str(len(sites)) + " sites with " + str(site_processes) + " processes")
+
+    if site_processes == 1:
+        rows = [estimate_site_row(site, path, estimate_kwargs) for site, path in sites]
+    else:
+        rows = worker_pool.map_in_workers(estimate_site_row, [site for site, _ in sites], [path for _, path in sites],
+                                          [estimate_kwargs] * len(sites), processes=processes)
+
+    summary = pandas.DataFrame(rows, columns=summary_columns)
+
+    if summary_path is not None:
+        summary.to_csv(summary_path, index=False)
+        print("Wrote summary of " + str(len(summary)) + " sites to " + summary_path)
+
+    return summary
+
+
+def estimate_site_row(site, path, estimate_kwargs):
+    """
+    Estimates one site. Errors are reported in the status column so that one broken site does not stop the fleet.
+    :param site: config.Site
+    :param path: path to csv file of the site
+    :param estimate_kwargs: passed to site_estimator.estimate_site
+    :return: dictionary with summary_columns keys
+    """
+    start_time = time.time()
+    row = {column: None for column in summary_columns}
+    row["name"] = site.name
+    row["path"] = path
+    row["known_latitude"] = site.latitude
+    row["known_longitude"] = site.longitude
+
+    try:
+        df = solar_power_data_loader2.load_csv(path)
+        features = day_features.load_day_features(path)
+        result = site_estimator.estimate_site(df, features, site=site, **estimate_kwargs)
+    except Exception as error:
+        # any error of one site is recorded in its row, the other sites of the fleet are still estimated
+        row["status"] = "error: " + type(error).__name__ + ": " + str(error)
+        row["seconds"] = time.time() - start_time
+        print("Site " + site.name + " failed, " + row["status"])
+        return row
+
+    for key in ["latitude", "longitude", "tilt", "azimuth", "fitness", "clear_days"]:
+        row[key] = result[key]
+
+    if result["tilt"] is None:
+        row["status"] = "no clear days"
+    else:
+        row["status"] = "ok"
+        if site.tilt is not None and site.azimuth is not None:
+            row["angle_error"] = angler.angular_distance_between_points(result["tilt"], result["azimuth"], site.tilt,
+                                                                        site.azimuth)
+
+    row["seconds"] = time.time() - start_time
+    print("Site " + site.name + " done in " + str(round(row["seconds"], 1)) + " seconds")
+    return row
+
+
+def __optional_float(row, column, default=None):
+    """
+    :return: float value of column in manifest row, default if the column is missing or empty
+    """
+    value = row.get(column)
+    if value is None or pandas.isna(value):
+        return default
+    return float(value)
@@ -1,13 +1,13 @@
 import numpy
+import pandas
 
+from helpers import day_features
 from helpers import splitters2
+from pv_model import astronomical_calculations
 from pv_model import pvlib_poa
 
 
-def slopematch_estimate_latitude_single_year(df_year, year_n, first_day, last_day):
-    # creating slope to latitude models with PVlib
-    model_first_mins, model_last_mins = __get_poa_slope_models_for_day_ranges(year_n, first_day, last_day, 55, 70)
-
+def slopematch_estimate_latitude_single_year(df_year, year_n, first_day, last_day, analytic_model=False):
     ##########################################
     ## using measurements to extract slopes ##
     ##########################################
@@ -21,28 +21,165 @@ def slopematch_estimate_latitude_single_year(df_year, year_n, first_day, last_da
     #print("first and last minute lists ID1")
     #print(first_minute_list)
     #print(last_minute_list)
-    first_minutes_model = numpy.polynomial.polynomial.polyfit(day_n_list, first_minute_list, 1)
-    last_minutes_model = numpy.polynomial.polynomial.polyfit(day_n_list, last_minute_list, 1)
+    return __latitudes_from_first_last_minutes(year_n, first_day, last_day, first_minute_list, last_minute_list,
+                                               day_n_list, analytic_model)
 
-    ###############################################################
-    ## Using slopes from real measurements to estimate latitudes ##
-    ###############################################################
 
-    # input of 3rd degree poly function is the 3rd degree poly model and slope from line fit
-    latitude_firsts = __3rd_degree_poly_at_x(model_first_mins, first_minutes_model[1])
-    latitude_lasts = __3rd_degree_poly_at_x(model_last_mins, last_minutes_model[1])
+def slopematch_estimate_latitude_multi_year(df_data, first_day, last_day, analytic_model=False):
+    per_year, pooled_first, pooled_last = slopematch_estimate_latitude_archive(df_data, first_day, last_day,
+                                                                               analytic_model=analytic_model)
 
-    return latitude_firsts, latitude_lasts
+    latitudes1 = [round(lat1, 4) for lat1 in per_year["latitude_first"].values]
+    latitudes2 = [round(lat2, 4) for lat2 in per_year["latitude_last"].values]
+    years = list(per_year["year"].values)
+
+    return latitudes1, latitudes2, years
+
+
+def slopematch_estimate_latitude_archive(df_data, first_day, last_day, latitude_low=55, latitude_high=70,
+                                         analytic_model=False):
+    """
+    Estimates latitudes of every year in df_data in one pass. First and last minutes of all days are computed with one
+    grouped reduction and the line fits of all years are one batched least squares fit.
+    :param df_data: pv dataframe with any number of years
+    :param first_day: first day in day range
+    :param last_day: last day in day range
+    :param latitude_low: lowest latitude of the slope to latitude models
+    :param latitude_high: highest latitude of the slope to latitude models
+    :param analytic_model: if True, slope to latitude models are built from the analytic sunrise and sunset grid
+    instead of simulated POA, see __get_analytic_slope_models_for_day_ranges
+    :return: (per year dataframe with columns year, latitude_first and latitude_last, pooled latitude from first
+    minutes, pooled latitude from last minutes)
+    """
+    df_data = splitters2.split_df_day_range(df_data, first_day, last_day)
+    first_last = day_features.first_last_productive_minutes(df_data)
+
+    return __latitudes_of_archive(first_last, first_day, last_day, latitude_low, latitude_high, analytic_model)
+
+
+def slopematch_estimate_latitude_archive_from_day_features(day_features_df, first_day, last_day, latitude_low=55,
+                                                           latitude_high=70, analytic_model=False):
+    """
+    Same as slopematch_estimate_latitude_archive, but reads first and last minutes from a day feature table, see
+    helpers.day_features.
+    """
+    day_features_df = day_features_df[(day_features_df["day"] >= first_day) & (day_features_df["day"] <= last_day)]
+    day_features_df = day_features_df.dropna(subset=["first_minute", "last_minute"])
+
+    return __latitudes_of_archive(day_features_df, first_day, last_day, latitude_low, latitude_high, analytic_model)
+
+
+def __latitudes_of_archive(first_last, first_day, last_day, latitude_low, latitude_high, analytic_model):
+    """
+    :param first_last: dataframe with columns year, day, first_minute and last_minute
+    :return: see slopematch_estimate_latitude_archive
+    """
+    years, year_index = numpy.unique(first_last["year"].values, return_inverse=True)
+    days = first_last["day"].values.astype(numpy.float64)
+
+    slopes_first, pooled_slope_first = __batched_slopes(year_index, len(years), days,
+                                                        first_last["first_minute"].values.astype(numpy.float64))
+    slopes_last, pooled_slope_last = __batched_slopes(year_index, len(years), days,
+                                                      first_last["last_minute"].values.astype(numpy.float64))
+
+    # sunrise and sunset slopes of a day range change very little from year to year, one slope to latitude model of
+    # the middle year maps the slopes of every year and the pooled slope
+    model_first_mins, model_last_mins = __slope_models_for_day_ranges(int(years[len(years) // 2]), first_day,
+                                                                      last_day, latitude_low, latitude_high,
+                                                                      analytic_model)
+
+    per_year = pandas.DataFrame({
+        "year": years,
+        "latitude_first": __3rd_degree_poly_at_x(model_first_mins, slopes_first),
+        "latitude_last": __3rd_degree_poly_at_x(model_last_mins, slopes_last)
+    })
+
+    return (per_year, __3rd_degree_poly_at_x(model_first_mins, pooled_slope_first),
+            __3rd_degree_poly_at_x(model_last_mins, pooled_slope_last))
+
+
+def __batched_slopes(group_index, group_count, x, y):
+    """
+    Least squares line slopes of every group with one set of grouped sums.
+    :param group_index: numpy array of group numbers 0..group_count-1, one per point
+    :param group_count: number of groups
+    :param x: numpy array of x values
+    :param y: numpy array of y values
+    :return: (numpy array of slopes per group, pooled slope of a common line slope with a separate intercept per group)
+    """
+    counts = numpy.bincount(group_index, minlength=group_count).astype(numpy.float64)
+    mean_x = numpy.bincount(group_index, weights=x, minlength=group_count) / counts
+    mean_y = numpy.bincount(group_index, weights=y, minlength=group_count) / counts
+
+    dx = x - mean_x[group_index]
+    dy = y - mean_y[group_index]
+    sxx = numpy.bincount(group_index, weights=dx * dx, minlength=group_count)
+    sxy = numpy.bincount(group_index, weights=dx * dy, minlength=group_count)
+
+    return sxy / sxx, sxy.sum() / sxx.sum()
+
+
+def slopematch_estimate_latitude_from_day_dfs(day_dfs, first_day, last_day, analytic_model=False):
+    """
+    Same as slopematch_estimate_latitude_multi_year, but reads days from an iterable of single day dataframes such as
+    solar_power_data_loader2.iterate_csv_days. Only the first and last minutes of each day are kept in memory.
+    :param day_dfs: iterable of single day pv dataframes
+    :param first_day: first day in day range
+    :param last_day: last day in day range
+    :param analytic_model: see slopematch_estimate_latitude_archive
+    :return: (latitudes from first minutes, latitudes from last minutes, years)
+    """
+
+    # year -> (first_minute_list, last_minute_list, day_n_list)
+    minutes_by_year = {}
+    for day_df in day_dfs:
+        year_n = day_df["year"].values[0]
+        day_n = day_df["day"].values[0]
+        if day_n < first_day or day_n > last_day:
+            continue
+
+        fmin, lmin = __df_get_first_last_minutes_day(day_df)
+        if lmin is not None:
+            first_minute_list, last_minute_list, day_n_list = minutes_by_year.setdefault(year_n, ([], [], []))
+            first_minute_list.append(fmin)
+            last_minute_list.append(lmin)
+            day_n_list.append(day_n)
+
+    latitudes1 = []
+    latitudes2 = []
+    years = []
+    for year_n in sorted(minutes_by_year):
+        first_minute_list, last_minute_list, day_n_list = minutes_by_year[year_n]
+        lat1, lat2 = __latitudes_from_first_last_minutes(year_n, first_day, last_day, first_minute_list,
+                                                         last_minute_list, day_n_list, analytic_model)
+        latitudes1.append(round(lat1, 4))
+        latitudes2.append(round(lat2, 4))
+        years.append(year_n)
 
+    return latitudes1, latitudes2, years
 
-def slopematch_estimate_latitude_multi_year(df_data, first_day, last_day):
-    grouped = df_data.groupby('year')
+
+def slopematch_estimate_latitude_from_day_features(day_features, first_day, last_day, analytic_model=False):
+    """
+    Same as slopematch_estimate_latitude_multi_year, but reads first and last minutes from a day feature table, see
+    helpers.day_features. No minute data is needed.
+    :param day_features: day feature table
+    :param first_day: first day in day range
+    :param last_day: last day in day range
+    :param analytic_model: see slopematch_estimate_latitude_archive
+    :return: (latitudes from first minutes, latitudes from last minutes, years)
+    """
+    day_features = day_features[(day_features["day"] >= first_day) & (day_features["day"] <= last_day)]
+    day_features = day_features.dropna(subset=["first_minute", "last_minute"])
 
     latitudes1 = []
     latitudes2 = []
     years = []
-    for year_n, year_df in grouped:
-        lat1, lat2 = slopematch_estimate_latitude_single_year(year_df, year_n, first_day, last_day)
+    for year_n, year_features in day_features.groupby("year"):
+        lat1, lat2 = __latitudes_from_first_last_minutes(year_n, first_day, last_day,
+                                                         list(year_features["first_minute"].values),
+                                                         list(year_features["last_minute"].values),
+                                                         list(year_features["day"].values), analytic_model)
         latitudes1.append(round(lat1, 4))
         latitudes2.append(round(lat2, 4))
         years.append(year_n)
@@ -50,6 +187,40 @@ def slopematch_estimate_latitude_multi_year(df_data, first_day, last_day):
     return latitudes1, latitudes2, years
 
 
+def __latitudes_from_first_last_minutes(year_n, first_day, last_day, first_minute_list, last_minute_list, day_n_list,
+                                        analytic_model=False):
+    """
+    Fits lines to measured first and last minutes and maps their slopes to latitudes with simulated slope models.
+    :return: (latitude from first minutes, latitude from last minutes)
+    """
+    # creating slope to latitude models with PVlib or with the analytic sunrise and sunset grid
+    model_first_mins, model_last_mins = __slope_models_for_day_ranges(year_n, first_day, last_day, 55, 70,
+                                                                      analytic_model)
+
+    first_minutes_model = numpy.polynomial.polynomial.polyfit(day_n_list, first_minute_list, 1)
+    last_minutes_model = numpy.polynomial.polynomial.polyfit(day_n_list, last_minute_list, 1)
+
+    ###############################################################
+    ## Using slopes from real measurements to estimate latitudes ##
+    ###############################################################
+
+    # input of 3rd degree poly function is the 3rd degree poly model and slope from line fit
+    latitude_firsts = __3rd_degree_poly_at_x(model_first_mins, first_minutes_model[1])
+    latitude_lasts = __3rd_degree_poly_at_x(model_last_mins, last_minutes_model[1])
+
+    return latitude_firsts, latitude_lasts
+
+
+def __slope_models_for_day_ranges(year, first_day, last_day, latitude_low, latitude_high, analytic_model):
+    """
+    :return: slope to latitude models of __get_analytic_slope_models_for_day_ranges if analytic_model is True,
+    otherwise of __get_poa_slope_models_for_day_ranges
+    """
+    if analytic_model:
+        return __get_analytic_slope_models_for_day_ranges(year, first_day, last_day, latitude_low, latitude_high)
+    return __get_poa_slope_models_for_day_ranges(year, first_day, last_day, latitude_low, latitude_high)
+
+
 def __get_poa_slope_models_for_day_ranges(year, first_day, last_day, latitude_low, latitude_high):
     """
     returns 3rd degree polynomial models, the input of which should be the measured slope,
@@ -67,17 +238,17 @@ def __get_poa_slope_models_for_day_ranges(year, first_day, last_day, latitude_lo
 
     latitudes = []
 
+    model_days = numpy.arange(first_day, last_day + 1, 10)
+
     for latitude in range(latitude_low, latitude_high + 1):
-        fmins = []
-        days = []
-        lmins = []
-        for d in range(first_day, last_day + 1, 10):
-            fmin, lmin = pvlib_poa.get_first_and_last_nonzero_minute(latitude, 0, year, d)
-            if fmin is None or lmin is None:
-                continue
-            fmins.append(fmin)
-            lmins.append(lmin)
-            days.append(d)
+        # all days of one latitude are simulated with a single pvlib call
+        fmins, lmins = pvlib_poa.get_first_and_last_nonzero_minutes_for_days(latitude, 0,
+                                                                               numpy.full(len(model_days), year),
+                                                                               model_days)
+        valid = ~numpy.isnan(fmins) & ~numpy.isnan(lmins)
+        fmins = fmins[valid]
+        lmins = lmins[valid]
+        days = model_days[valid]
 
         if len(days) < 4:
             continue
@@ -93,24 +264,70 @@ def __get_poa_slope_models_for_day_ranges(year, first_day, last_day, latitude_lo
     return first_model, last_model
 
 
+def __get_analytic_slope_models_for_day_ranges(year, first_day, last_day, latitude_low, latitude_high,
+                                               latitude_step=0.1):
+    """
+    Same as __get_poa_slope_models_for_day_ranges, but much faster and for any latitude band.
+    First and last daylight minutes of every latitude and every day in the range come from one analytic grid, see
+    astronomical_calculations.get_sunrise_sunset_minute_grid, which matches simulated POA to a minute.
+
+    :param year: year to generate model for
+    :param first_day: first day in day range, 250 recommended
+    :param last_day: last day in day range, 300 recommended
+    :param latitude_low: lowest latitude of the model, any band between -90 and 90 works
+    :param latitude_high: highest latitude of the model
+    :param latitude_step: latitude resolution of the model in degrees
+    :return:
+    """
+
+    latitudes = numpy.arange(latitude_low, latitude_high + latitude_step / 2, latitude_step)
+    days = numpy.arange(first_day, last_day + 1)
+
+    fmins, lmins = astronomical_calculations.get_sunrise_sunset_minute_grid(latitudes, numpy.full(len(days), year),
+                                                                            days, 0)
+
+    # line fits of all latitudes at once, days of polar day or night are left out of the fit of that latitude
+    slopes_firsts = __masked_row_slopes(days, fmins)
+    slopes_lasts = __masked_row_slopes(days, lmins)
+    enough_days = numpy.count_nonzero(~numpy.isnan(fmins) & ~numpy.isnan(lmins), axis=1) >= 4
+
+    first_model = numpy.polynomial.polynomial.polyfit(slopes_firsts[enough_days], latitudes[enough_days], 3)
+    last_model = numpy.polynomial.polynomial.polyfit(slopes_lasts[enough_days], latitudes[enough_days], 3)
+    return first_model, last_model
+
+
+def __masked_row_slopes(x, rows):
+    """
+    :param x: numpy array of x values, shape (m,)
+    :param rows: numpy array of y values with shape (n, m), nan values are left out
+    :return: least squares line slope of every row, shape (n,)
+    """
+    valid = ~numpy.isnan(rows)
+    counts = numpy.maximum(valid.sum(axis=1), 1)
+    x = numpy.where(valid, x[None, :], 0.0)
+    y = numpy.where(valid, rows, 0.0)
+
+    mean_x = x.sum(axis=1) / counts
+    mean_y = y.sum(axis=1) / counts
+    dx = numpy.where(valid, x - mean_x[:, None], 0.0)
+    dy = numpy.where(valid, y - mean_y[:, None], 0.0)
+
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        return (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+
+
 def __df_get_first_last_minutes_year(df_year):
     """
-    Breaks year into days and gets the per day first non-zero power minute with another function
+    Gets the per day first and last non-zero power minutes of a year with one grouped reduction
     :param df_year: one year of power measurements
     :return: (fist_minute_list, last_minute_list, day_n_list)
     """
 
-    first_minute_list = []
-    last_minute_list = []
-    day_n_list = []
+    first_last = day_features.first_last_productive_minutes(df_year)
 
-    grouped = df_year.groupby('day')
-    for day_n, day_df in grouped:
-        fmin, lmin = __df_get_first_last_minutes_day(day_df)
-        if lmin is not None:
-            first_minute_list.append(fmin)
-            last_minute_list.append(lmin)
-            day_n_list.append(day_n)
+    first_minute_list = list(first_last["first_minute"].values)
+    last_minute_list = list(first_last["last_minute"].values)
+    day_n_list = list(first_last["day"].values)
 
     return first_minute_list, last_minute_list, day_n_list
 
@@ -119,14 +336,11 @@ def __df_get_first_last_minutes_day(df_day):
     # this filtering here is extremely important for longitude prediction accuracy
     df_day = df_day[df_day['output'] > 0.0]
     #print(df_day)
-    try:
-        fmin = df_day["minute"].values[0]
-        #print(fmin)
-        lmin = df_day["minute"].values[len(df_day) - 1]
-        #print(lmin)
-        return fmin, lmin
-    except:
+    if len(df_day) == 0:
         return None, None
+    fmin = df_day["minute"].values[0]
+    lmin = df_day["minute"].values[len(df_day) - 1]
+    return fmin, lmin
 
 
 def __3rd_degree_poly_at_x(poly, x):
@@ -4,6 +4,7 @@ import matplotlib.pyplot
 import pandas as pd
 
 from pv_model import pvlib_poa
+from helpers import day_features
 from helpers import splitters2
 from helpers import config
 
@@ -50,60 +51,96 @@ def estimate_longitude_based_on_year_df(year_df):
     :return: estimated longitude
     """
 
-    # reading year from year_df
-    year = year_df.year.values[0]
-    # reading days from year_df
+    # first and last productive minutes of every day with one grouped reduction
+    first_last = day_features.first_last_productive_minutes(year_df)
 
-    days = year_df.day.unique()
+    return __longitudes_from_first_last_minutes(first_last["year"].values, first_last["day"].values,
+                                                first_last["first_minute"].values, first_last["last_minute"].values)
 
-    # listing simulation parameters
-    simulation_longitude = 25
-    simulation_latitude = 00
 
-    # list for simulated longitude values, needed as one value is simulated for each day
-    longitudes = []
+def estimate_longitude_based_on_day_dfs(day_dfs):
+    """
+    Same as estimate_longitude_based_on_year_df, but reads days from an iterable of single day dataframes such as
+    solar_power_data_loader2.iterate_csv_days. Days may come from multiple years.
+    :param day_dfs: iterable of single day pv dataframes
+    :return: dataframe with columns year, day and longitude
+    """
+    first_lasts = [day_features.first_last_productive_minutes(day_df) for day_df in day_dfs]
+    first_lasts = [first_last for first_last in first_lasts if len(first_last) > 0]
+    if len(first_lasts) == 0:
+        return pd.DataFrame({'year': [], 'day': [], 'longitude': []})
+    first_last = pd.concat(first_lasts, ignore_index=True)
 
-    first_minutes = []
-    last_minutes = []
-    solar_noons = []
-    day_n_list = []
+    return __longitudes_from_first_last_minutes(first_last["year"].values, first_last["day"].values,
+                                                first_last["first_minute"].values, first_last["last_minute"].values)
 
-    # calculating a longitude for each day in year_xa
-    for day_n in days:
-        # spitting needed day from xa
-        day_df = splitters2.split_df_day_range(year_df, day_n, day_n)
 
-        # taking first and last minute values
-        fmin, lmin = __df_get_first_last_minutes(day_df)
-        if fmin is None or lmin is None:
-            # skipping if returned none
-            continue
-        first_minutes.append(fmin)
-        last_minutes.append(lmin)
-        solar_noons.append((fmin + lmin) / 2.0)
-        day_n_list.append(day_n)
+def estimate_longitude_based_on_day_features(day_features_df):
+    """
+    Same as estimate_longitude_based_on_day_dfs, but reads first and last minutes from a day feature table, see
+    helpers.day_features. No minute data is needed.
+    :param day_features_df: day feature table, possibly filtered to selected days
+    :return: dataframe with columns year, day and longitude
+    """
+    day_features_df = day_features_df.dropna(subset=["first_minute", "last_minute"])
+
+    return __longitudes_from_first_last_minutes(day_features_df["year"].values, day_features_df["day"].values,
+                                                day_features_df["first_minute"].values,
+                                                day_features_df["last_minute"].values)
+
+
+def estimate_longitude_archive(df_data, first_day, last_day):
+    """
+    Estimates longitudes of every year in df_data in one pass. First and last minutes of all days come from one grouped
+    reduction and simulated solar noons of all days from one batched simulation.
+    :param df_data: pv dataframe with any number of years
+    :param first_day: first day in day range
+    :param last_day: last day in day range
+    :return: (per year dataframe with columns year, median and mean, pooled median longitude, per day dataframe with
+    columns year, day and longitude)
+    """
+    df_data = splitters2.split_df_day_range(df_data, first_day, last_day)
+    first_last = day_features.first_last_productive_minutes(df_data)
+
+    per_day = __longitudes_from_first_last_minutes(first_last["year"].values, first_last["day"].values,
+                                                   first_last["first_minute"].values,
+                                                   first_last["last_minute"].values)
+    per_year = per_day.groupby("year", sort=True)["longitude"].agg(["median", "mean"]).reset_index()
+
+    return per_year, per_day["longitude"].median(), per_day
+
+
+def __longitudes_from_first_last_minutes(years, days, first_minutes, last_minutes):
+    """
+    :param years: numpy array of years
+    :param days: numpy array of days
+    :param first_minutes: numpy array of first productive minutes of the days
+    :param last_minutes: numpy array of last productive minutes of the days
+    :return: dataframe with columns year, day and longitude
+    """
+    # listing simulation parameters
+    simulation_longitude = 25
+    simulation_latitude = 00
 
-        # estimating solar noon based on them
-        estimated_solar_noon = (fmin + lmin) / 2
+    # estimating solar noons from measurements
+    solar_noons = (first_minutes + last_minutes) / 2.0
 
-        # simulating solar noon minute
-        simulated_solar_noon = pvlib_poa.get_solar_noon(year, day_n, simulation_latitude, simulation_longitude)
+    # simulating solar noon minutes for all days at once
+    simulated_solar_noons = pvlib_poa.get_solar_noons(years, days, simulation_latitude, simulation_longitude)
 
-        # estimating longitude with the help of estimated solar noon, simulated solar noon and simulated solar noon parameters
-        estimated_longitude = longitude_from_solar_noon_solar_noon_poa(simulation_longitude, estimated_solar_noon,
-                                                                       simulated_solar_noon)
-        longitudes.append(estimated_longitude)
+    # estimating longitudes with the help of estimated solar noons, simulated solar noons and simulation parameters
+    longitudes = longitude_from_solar_noon_solar_noon_poa(simulation_longitude, solar_noons, simulated_solar_noons)
 
     '''
-    matplotlib.pyplot.scatter(first_minutes, day_n_list, label="First minute", c=config.PURPLE)
-    matplotlib.pyplot.scatter(last_minutes, day_n_list, label="Last minute", c=config.ORANGE)
-    matplotlib.pyplot.scatter(solar_noons, day_n_list, label="Solar noon", c="black")
+    matplotlib.pyplot.scatter(first_minutes, days, label="First minute", c=config.PURPLE)
+    matplotlib.pyplot.scatter(last_minutes, days, label="Last minute", c=config.ORANGE)
+    matplotlib.pyplot.scatter(solar_noons, days, label="Solar noon", c="black")
     matplotlib.pyplot.xlabel("Minute")
     matplotlib.pyplot.ylabel("Day")
     matplotlib.pyplot.legend()
     matplotlib.pyplot.show()
 
-    matplotlib.pyplot.scatter(longitudes, day_n_list, label="Estimated longitude", c=config.ORANGE)
+    matplotlib.pyplot.scatter(longitudes, days, label="Estimated longitude", c=config.ORANGE)
     matplotlib.pyplot.xlabel("Longitude")
     matplotlib.pyplot.ylabel("Day")
     matplotlib.pyplot.legend()
@@ -111,8 +148,8 @@ def estimate_longitude_based_on_year_df(year_df):
     '''
 
     results_df = pd.DataFrame(
-        {'year': [year] * len(longitudes),
-         'day': day_n_list,
+        {'year': years,
+         'day': days,
          'longitude': longitudes
          })
 
@@ -146,11 +183,8 @@ def __df_get_first_last_minutes(df_day):
     # this filtering here is extremely important for longitude prediction accuracy
     df_day = df_day[df_day['output'] > 0.0]
     #print(df_day)
-    try:
-        fmin = df_day["minute"].values[0]
-        #print(fmin)
-        lmin = df_day["minute"].values[len(df_day) - 1]
-        #print(lmin)
-        return fmin, lmin
-    except:
+    if len(df_day) == 0:
         return None, None
+    fmin = df_day["minute"].values[0]
+    lmin = df_day["minute"].values[len(df_day) - 1]
+    return fmin, lmin
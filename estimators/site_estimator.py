@@ -0,0 +1,113 @@
+"""
+JOINT SITE ESTIMATION
+
+Estimates latitude, longitude, tilt and azimuth of an installation with unknown metadata in one process. Location is
+estimated first and fed straight into the angle search. Stages share:
+- the day feature table of helpers.day_features, which gives first and last minutes for both geoguessers and
+smoothness for clear day selection
+- solar position and clear sky irradiance of the clear days from pvlib_poa.get_shared_day_geometry, used by the clear
+minute mask and by every orientation of the angle search
+
+Example:
+df = solar_power_data_loader2.load_csv(path)
+result = site_estimator.estimate_site(df, day_features.load_day_features(path))
+"""
+
+import time
+
+import pandas
+
+from estimators import angler
+from estimators import geoguesser_latitude
+from estimators import geoguesser_longitude
+from helpers import cloud_free_day_finder
+from helpers import day_features
+from helpers import splitters2
+
+
+def estimate_site(df, features=None, latitude_days=(180, 310), longitude_days=(125, 250), angle_days=(120, 250),
+                  clear_day_threshold=3, points=1000, latitude_low=55, latitude_high=70, use_clear_mask=False,
+                  latitude=None, longitude=None, site=None, analytic_latitude_model=False):
+    """
+    :param df: pv dataframe in solar_power_data_loader2.load_csv format, any number of years
+    :param features: day feature table of df, computed from df if None
+    :param latitude_days: (first day, last day) of latitude estimation
+    :param longitude_days: (first day, last day) of longitude estimation
+    :param angle_days: (first day, last day) of clear days used for angle estimation
+    :param clear_day_threshold: smoothness threshold of clear days, see cloud_free_day_finder.find_smooth_days_df
+    :param points: Fibonacci lattice point count of the angle search
+    :param latitude_low: lowest latitude of the latitude models, sites outside Finland need a wider band
+    :param latitude_high: highest latitude of the latitude models
+    :param use_clear_mask: True fits angles only to clear minutes, see cloud_free_day_finder.clear_minute_mask
+    :param latitude: known latitude, skips latitude estimation
+    :param longitude: known longitude, skips longitude estimation
+    :param site: optional config.Site, its known latitude and longitude skip estimation and its albedo and module
+    elevation are used in the angle search
+    :param analytic_latitude_model: True builds latitude models from the analytic sunrise grid instead of simulated POA,
+    see geoguesser_latitude.slopematch_estimate_latitude_archive
+    :return: dictionary with keys latitude, longitude, tilt, azimuth, fitness, clear_days and seconds, seconds is a
+    dictionary of stage durations
+    """
+    seconds = {}
+
+    if site is not None:
+        latitude = site.latitude if latitude is None else latitude
+        longitude = site.longitude if longitude is None else longitude
+
+    start_time = time.time()
+    if features is None:
+        features = day_features.compute_day_features(df)
+    seconds["day_features"] = time.time() - start_time
+
+    start_time = time.time()
+    if latitude is None:
+        per_year, latitude_first, latitude_last = \
+            geoguesser_latitude.slopematch_estimate_latitude_archive_from_day_features(features, latitude_days[0],
+                                                                                       latitude_days[1], latitude_low,
+                                                                                       latitude_high,
+                                                                                       analytic_latitude_model)
+        latitude = (latitude_first + latitude_last) / 2
+        print("Estimated latitude: " + str(round(latitude, 4)))
+    seconds["latitude"] = time.time() - start_time
+
+    start_time = time.time()
+    if longitude is None:
+        longitude_features = features[(features["day"] >= longitude_days[0]) & (features["day"] <= longitude_days[1])]
+        longitudes = geoguesser_longitude.estimate_longitude_based_on_day_features(longitude_features)
+        longitude = longitudes["longitude"].median()
+        print("Estimated longitude: " + str(round(longitude, 4)))
+    seconds["longitude"] = time.time() - start_time
+
+    start_time = time.time()
+    clear_days = cloud_free_day_finder.find_smooth_days_df(df, angle_days[0], angle_days[1], clear_day_threshold,
+                                                           day_features=features)
+    if use_clear_mask and len(clear_days) > 0:
+        clear_days = __with_clear_minutes(clear_days, latitude, longitude)
+    seconds["clear_days"] = time.time() - start_time
+
+    start_time = time.time()
+    tilt, azimuth, fitness = angler.angle_clear_days_jointly_with_n_point_fibo(clear_days, latitude, longitude, points,
+                                                                               use_clear_mask=use_clear_mask, site=site)
+    seconds["angles"] = time.time() - start_time
+
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "tilt": tilt,
+        "azimuth": azimuth,
+        "fitness": fitness,
+        "clear_days": len(clear_days),
+        "seconds": seconds
+    }
+
+
+def __with_clear_minutes(clear_days, latitude, longitude):
+    """
+    Adds column clear to the clear days, clear sky ghi comes from the shared day geometry which the angle search reuses.
+    :return: list of day dataframes with column clear
+    """
+    days_df = pandas.concat(clear_days, ignore_index=True)
+    days_df["clear"] = cloud_free_day_finder.clear_minute_mask(days_df, latitude, longitude, shared_geometry=True)
+
+    days_df, partition = splitters2.build_day_partition(days_df)
+    return list(splitters2.partitioned_days(days_df, partition))
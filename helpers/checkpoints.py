@@ -0,0 +1,49 @@
+"""
+CHECKPOINTS
+
+Local store of completed work units of long runs, so that an interrupted run continues where it stopped. A checkpoint
+is a plain dictionary of unit key -> unit state, keys are tuples such as ("lattice", year, day, ...) and states are
+small picklable values. Checkpoint is saved through a temporary file, an interruption during a save keeps the previous
+checkpoint.
+
+One checkpoint file should be written by one process at a time.
+
+Example:
+checkpoint = load_checkpoint(path)
+for unit in units:
+    if unit in checkpoint:
+        continue
+    checkpoint[unit] = compute(unit)
+    save_checkpoint(checkpoint, path)
+"""
+
+import os
+
+import pandas
+
+
+def load_checkpoint(path):
+    """
+    :param path: path of checkpoint file
+    :return: saved checkpoint dictionary, empty dictionary if path does not exist yet
+    """
+    if not os.path.exists(path):
+        return {}
+    return pandas.read_pickle(path)
+
+
+def save_checkpoint(checkpoint, path):
+    """
+    Saves checkpoint dictionary to path through a temporary file.
+    """
+    temporary_path = path + ".tmp"
+    pandas.to_pickle(checkpoint, temporary_path)
+    os.replace(temporary_path, path)
+
+
+def remove_checkpoint(path):
+    """
+    Removes checkpoint file, for example when a run has finished and its results are stored elsewhere.
+    """
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,126 @@
+"""
+INCREMENTAL CLEAR DAY CLASSIFIER
+
+Keeps the smoothness classification of already seen days, so that newly appended measurements only cost the work of
+the new days. Same classification as cloud_free_day_finder.find_smooth_days_df, day features are computed with
+helpers.day_features.
+
+State is a plain dictionary:
+threshold_percent: smoothness threshold of clear days, as in find_smooth_days_df
+features: day feature table of every classified day
+clear_days: dict of (year, day) -> minute data of the clear day, output >= 0.001 rows only
+open_day: rows of the last appended day, classified once a later day arrives or the day is closed
+
+Example of a nightly update:
+state = load_clear_day_state(state_path)
+append_measurements(state, solar_power_data_loader2.load_csv(todays_csv))
+save_clear_day_state(state, state_path)
+tilt, azimuth, fitness = angler.angle_clear_days_jointly_with_n_point_fibo(clear_day_dfs(state), latitude, longitude,
+                                                                         1000)
+"""
+
+import os
+
+import pandas
+
+from helpers import day_features
+from helpers import splitters2
+
+
+def new_clear_day_state(threshold_percent=3):
+    """
+    :param threshold_percent: smoothness threshold of clear days
+    :return: empty classifier state
+    """
+    return {
+        "threshold_percent": threshold_percent,
+        "features": None,
+        "clear_days": {},
+        "open_day": None
+    }
+
+
+def append_measurements(state, df, close_last_day=False):
+    """
+    Classifies the days completed by df. The last day of df is kept open as more minutes of it may still arrive, unless
+    close_last_day is True.
+    :param state: classifier state
+    :param df: new measurements in solar_power_data_loader2.load_csv format, in chronological order after earlier data
+    :param close_last_day: True classifies the last day of df as well
+    :return: list of newly found clear day dataframes
+    """
+    if state["open_day"] is not None:
+        df = pandas.concat([state["open_day"], df], ignore_index=True)
+        state["open_day"] = None
+
+    if len(df) == 0:
+        return []
+
+    df, partition = splitters2.build_day_partition(df)
+    keys = list(partition.keys())
+
+    if not close_last_day:
+        state["open_day"] = df.iloc[partition[keys[-1]]]
+        keys = keys[:-1]
+
+    # days which were already classified are not classified again
+    if state["features"] is not None:
+        seen = set(zip(state["features"]["year"].values.tolist(), state["features"]["day"].values.tolist()))
+        late_keys = [key for key in keys if key in seen]
+        if len(late_keys) > 0:
+            print("Ignoring late measurements of already classified days " + str(late_keys))
+        keys = [key for key in keys if key not in seen]
+
+    if len(keys) == 0:
+        return []
+
+    new_df = pandas.concat([df.iloc[partition[key]] for key in keys])
+    new_features = day_features.compute_day_features(new_df)
+
+    if state["features"] is None:
+        state["features"] = new_features
+    else:
+        state["features"] = pandas.concat([state["features"], new_features], ignore_index=True)
+
+    new_df, new_partition = splitters2.build_day_partition(new_df)
+    new_clear_days = []
+    for year_n, day_n, smoothness in zip(new_features["year"].values, new_features["day"].values,
+                                         new_features["smoothness"].values):
+        if smoothness * 100 <= state["threshold_percent"]:
+            day_df = new_df.iloc[new_partition[(int(year_n), int(day_n))]]
+            day_df = day_df[day_df.output >= 0.001]
+            state["clear_days"][(int(year_n), int(day_n))] = day_df
+            new_clear_days.append(day_df)
+
+    return new_clear_days
+
+
+def clear_day_dfs(state, day_start=1, day_end=366):
+    """
+    :param state: classifier state
+    :param day_start: first day of year to include
+    :param day_end: last day of year to include
+    :return: list of clear day dataframes in chronological order, same format as find_smooth_days_df output
+    """
+    keys = sorted(key for key in state["clear_days"] if day_start <= key[1] <= day_end)
+    return [state["clear_days"][key] for key in keys]
+
+
+def save_clear_day_state(state, path):
+    """
+    Saves classifier state to path through a temporary file, so that an interrupted save keeps the previous state.
+    """
+    temporary_path = path + ".tmp"
+    pandas.to_pickle(state, temporary_path)
+    os.replace(temporary_path, path)
+
+
+def load_clear_day_state(path, threshold_percent=3):
+    """
+    :param path: path of saved classifier state
+    :param threshold_percent: threshold of a new state, used if path does not exist yet
+    :return: saved classifier state or a new state
+    """
+    if not os.path.exists(path):
+        return new_clear_day_state(threshold_percent)
+    return pandas.read_pickle(path)
@@ -1,41 +1,271 @@
 import math
+import warnings
 
 import matplotlib.pyplot
 import numpy
 import numpy.fft as fft
+import pandas
 
 
 from helpers import splitters2
+from pv_model import pvlib_poa
 
 matplotlib.rc('font', **{'family': 'serif', 'serif': ['Computer Modern']})
 matplotlib.rc('text', usetex=True)
 
 
-def find_smooth_days_df(year_df, day_start, day_end, threshold_percent):
+def find_smooth_days_df(year_df, day_start, day_end, threshold_percent, day_features=None):
     ######################################################################################################
     ### Returns a list of dataframes each of which is a single day from year_df where smoothness after ###
-    ### low pass filtering is good                                                                     ###
+    ### low pass filtering is good. With a day feature table from helpers.day_features the days are    ###
+    ### selected from the table and no smoothness values are recomputed                                ###
     ######################################################################################################
 
-    df = splitters2.split_df_day_range(year_df, day_start, day_end)
+    df, partition = splitters2.build_day_partition(year_df)
+
+    if day_features is not None:
+        selected = day_features[(day_features["day"] >= day_start) & (day_features["day"] <= day_end) &
+                                (day_features["smoothness"] * 100 <= threshold_percent)]
+        smooth_days = []
+        for year_n, day_n in zip(selected["year"].values, selected["day"].values):
+            rows = partition.get((int(year_n), int(day_n)))
+            if rows is not None:
+                day_df = df.iloc[rows]
+                smooth_days.append(day_df[day_df.output >= 0.001])
+        return smooth_days
+
+    day_dfs = splitters2.partitioned_days(df, partition, day_start, day_end)
+
+    return find_smooth_days_from_day_dfs(day_dfs, day_start, day_end, threshold_percent)
+
+
+def find_smooth_days_from_day_dfs(day_dfs, day_start, day_end, threshold_percent, batch_size=366):
+    ######################################################################################################
+    ### Same as find_smooth_days_df, but reads days from an iterable of single day dataframes such as  ###
+    ### solar_power_data_loader2.iterate_csv_days. Days are scored batch_size days at a time and only  ###
+    ### smooth days are kept in memory                                                                 ###
+    ######################################################################################################
 
     smooth_days = []
+    batch = []
 
-    for day in df['day'].unique():
-        day_df = splitters2.split_df_day_range(df, day, day)
+    for day_df in day_dfs:
+        day_n = day_df["day"].values[0]
+        if day_n < day_start or day_n > day_end:
+            continue
 
-        day_df = day_df.where(day_df.output >= 0.001)
+        day_df = day_df[day_df.output >= 0.001]
         day_df = day_df.dropna()
         day_df = splitters2.__remove_nonint_dates(day_df)
+        batch.append(day_df)
 
-        day_smoothness = __day_df_smoothness_value(day_df)
+        if len(batch) >= batch_size:
+            smooth_days.extend(__smooth_days_of_batch(batch, threshold_percent))
+            batch = []
 
-        if day_smoothness * 100 <= threshold_percent:
-            smooth_days.append(day_df)
+    smooth_days.extend(__smooth_days_of_batch(batch, threshold_percent))
 
     return smooth_days
 
 
+def clear_minute_mask(df, latitude, longitude, window=11, envelope_window=15, max_step=0.03, level_fraction=0.9,
+                      day_level_fraction=0.8, season_days=15, min_ghi=50, shared_geometry=False):
+    ######################################################################################################
+    ### Minute level clear sky detection for all days of df at once. Measured power is divided by      ###
+    ### simulated clear sky ghi, on clear minutes this ratio changes slowly with the sun-panel         ###
+    ### geometry while clouds make it drop and fluctuate. Minute is clear when:                        ###
+    ### - clear sky ghi is above min_ghi                                                               ###
+    ### - ratio is within level_fraction of its rolling maximum over envelope_window minutes           ###
+    ### - largest minute to minute ratio change within window minutes is below max_step of that max    ###
+    ### - 90th percentile ratio of the day is within day_level_fraction of the highest 90th percentile ###
+    ###   ratio of days within season_days days, this rejects evenly overcast days                     ###
+    ### Returns a boolean numpy array with one value per row of df, in the same order as df            ###
+    ### shared_geometry=True takes clear sky ghi from pvlib_poa.get_shared_day_geometry, so that later ###
+    ### angle estimation of the same days reuses the simulation                                        ###
+    ######################################################################################################
+
+    keys = df["year"].values.astype(numpy.int64) * 1000 + df["day"].values
+    unique_keys, day_index = numpy.unique(keys, return_inverse=True)
+    minutes = df["minute"].values.astype(numpy.int64)
+
+    powers = numpy.full((len(unique_keys), 1440), numpy.nan)
+    powers[day_index, minutes] = df["output"].values
+
+    if shared_geometry:
+        clear_sky_ghi = pvlib_poa.get_shared_clear_sky_ghi_grid(unique_keys // 1000, unique_keys % 1000, latitude,
+                                                                longitude)
+    else:
+        clear_sky_ghi = pvlib_poa.get_clear_sky_ghi_grid(unique_keys // 1000, unique_keys % 1000, latitude,
+                                                         longitude)
+    sun_up = clear_sky_ghi > min_ghi
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        ratios = numpy.where(sun_up, powers / clear_sky_ghi, numpy.nan)
+
+    # rolling statistics along minutes, pandas rolls along rows so days are columns here
+    envelope = pandas.DataFrame(ratios.T).rolling(envelope_window, center=True, min_periods=1).max().values.T
+    steps = numpy.full(ratios.shape, numpy.nan)
+    steps[:, 1:-1] = numpy.abs(ratios[:, 2:] - 2 * ratios[:, 1:-1] + ratios[:, :-2])
+    largest_steps = pandas.DataFrame(steps.T).rolling(window, center=True, min_periods=window).max().values.T
+
+    with numpy.errstate(invalid="ignore"):
+        level_ok = ratios >= level_fraction * envelope
+        variability_ok = largest_steps <= max_step * envelope
+
+    # evenly overcast days are smooth too, their level is compared to nearby days instead
+    with warnings.catch_warnings():
+        # days without any sun up measurements give all nan slices, they are handled below
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        day_levels = numpy.nanpercentile(ratios, 90, axis=1)
+    day_levels = numpy.where(numpy.isnan(day_levels), -math.inf, day_levels)
+    day_ordinals = pandas.to_datetime([str(key // 1000) + "-" + str(key % 1000) for key in unique_keys],
+                                      format="%Y-%j").values.astype("datetime64[D]").astype(numpy.int64)
+    nearby = numpy.abs(day_ordinals[:, None] - day_ordinals[None, :]) <= season_days
+    seasonal_levels = numpy.where(nearby, day_levels[None, :], -math.inf).max(axis=1)
+    day_ok = (day_levels > 0) & (day_levels >= day_level_fraction * seasonal_levels)
+
+    clear = sun_up & level_ok & variability_ok & day_ok[:, None]
+
+    return clear[day_index, minutes]
+
+
+def find_partially_clear_days_df(df, latitude, longitude, day_start, day_end, min_clear_minutes=60):
+    ######################################################################################################
+    ### Returns a list of single day dataframes which have at least min_clear_minutes clear minutes.   ###
+    ### Days have a boolean column "clear" from clear_minute_mask, angler fitness functions which      ###
+    ### accept use_clear_mask only compare the clear minutes                                           ###
+    ######################################################################################################
+
+    df = df.assign(clear=clear_minute_mask(df, latitude, longitude))
+    df = df[df.output >= 0.001]
+
+    df, partition = splitters2.build_day_partition(df)
+
+    days = []
+    for day_df in splitters2.partitioned_days(df, partition, day_start, day_end):
+        if numpy.count_nonzero(day_df["clear"].values) >= min_clear_minutes:
+            days.append(day_df)
+
+    return days
+
+
+def select_informative_days(clear_days, day_budget=None, max_error_increase=None, correlation_days=10):
+    ######################################################################################################
+    ### Picks a small subset of clear days which are spread over the year and smooth. Estimates from   ###
+    ### nearby days are nearly the same, so their errors are modeled with correlation                  ###
+    ### exp(-day distance / correlation_days) and information of a set of days with its effective      ###
+    ### sample size n_eff = n^2 / sum of correlations. Days are added greedily, each time the day      ###
+    ### which adds most n_eff weighted by its smoothness.                                              ###
+    ### Subset size is day_budget days, or the smallest size at which the expected standard error is   ###
+    ### at most max_error_increase (0.1 = 10%) higher than with all days, or the smaller of the two.   ###
+    ### Returns (selected days in chronological order, expected relative increase of standard error)   ###
+    ######################################################################################################
+
+    if len(clear_days) == 0:
+        return [], 0.0
+
+    if day_budget is None:
+        day_budget = len(clear_days)
+    day_budget = max(1, min(day_budget, len(clear_days)))
+
+    # year and day are int16 in loaded dataframes, year * 366 would overflow without the conversion
+    day_numbers = numpy.array([int(day_df["year"].values[0]) * 366 + int(day_df["day"].values[0])
+                               for day_df in clear_days], dtype=numpy.float64)
+    correlations = numpy.exp(-numpy.abs(day_numbers[:, None] - day_numbers[None, :]) / correlation_days)
+
+    # perfectly smooth days get weight 1 and days with twice the median smoothness value weight 0.5
+    smoothness_values = smoothness_values_for_days(clear_days)
+    finite = numpy.isfinite(smoothness_values)
+    median_smoothness = numpy.median(smoothness_values[finite]) if numpy.any(finite) else 1.0
+    qualities = 1.0 / (1.0 + numpy.where(finite, smoothness_values, math.inf) / (2.0 * max(median_smoothness, 1e-12)))
+
+    all_effective_size = __effective_sample_size(correlations)
+
+    selected = [int(numpy.argmax(qualities))]
+    effective_size = __effective_sample_size(correlations[numpy.ix_(selected, selected)])
+    error_increase = math.sqrt(all_effective_size / effective_size) - 1
+
+    while len(selected) < day_budget:
+        if max_error_increase is not None and error_increase <= max_error_increase:
+            break
+
+        best_candidate = None
+        best_score = -math.inf
+        for candidate in range(len(clear_days)):
+            if candidate in selected:
+                continue
+            indices = selected + [candidate]
+            score = __effective_sample_size(correlations[numpy.ix_(indices, indices)]) * qualities[candidate]
+            if score > best_score:
+                best_score = score
+                best_candidate = candidate
+
+        selected.append(best_candidate)
+        effective_size = __effective_sample_size(correlations[numpy.ix_(selected, selected)])
+        error_increase = math.sqrt(all_effective_size / effective_size) - 1
+
+    selected = sorted(selected, key=lambda index: day_numbers[index])
+
+    print("Selected " + str(len(selected)) + " of " + str(len(clear_days)) + " clear days, expected standard error " +
+          str(round(100 * error_increase, 1)) + "% higher than with all days")
+
+    return [clear_days[index] for index in selected], error_increase
+
+
+def __effective_sample_size(correlations):
+    """
+    :param correlations: correlation matrix of day estimate errors
+    :return: number of independent days with the same information
+    """
+    return correlations.shape[0] ** 2 / numpy.sum(correlations)
+
+
+def smoothness_values_for_days(day_dfs, saved_frequencies=7):
+    ######################################################################################################
+    ### Batched version of __day_df_smoothness_value. Packs days into a padded 2-D array and scores    ###
+    ### all of them at once, returns a numpy array of smoothness values, one per day. Low is better    ###
+    ######################################################################################################
+
+    return smoothness_values_for_power_arrays([day_df["output"].values for day_df in day_dfs], saved_frequencies)
+
+
+def smoothness_values_for_power_arrays(power_arrays, saved_frequencies=7):
+    ######################################################################################################
+    ### Same as smoothness_values_for_days, but takes a list of per day power arrays                   ###
+    ######################################################################################################
+
+    lengths = numpy.array([len(powers) for powers in power_arrays], dtype=numpy.int64)
+    if len(lengths) == 0:
+        return numpy.zeros(0)
+
+    powers = numpy.zeros((len(lengths), max(lengths.max(), 1)))
+    for i, day_powers in enumerate(power_arrays):
+        powers[i, :lengths[i]] = day_powers
+
+    valid = numpy.arange(powers.shape[1])[None, :] < lengths[:, None]
+
+    powers_from_fourier = __fourier_filter_batch(powers, lengths, saved_frequencies)
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        errors_sum = numpy.where(valid, numpy.abs(powers_from_fourier - powers), 0.0).sum(axis=1)
+        error_normalized = errors_sum / lengths
+        error_normalized = error_normalized / numpy.where(valid, powers_from_fourier, -numpy.inf).max(axis=1)
+
+    # if less than 1 hour of data, inf
+    error_normalized[lengths < 60] = math.inf
+
+    return error_normalized
+
+
+def __smooth_days_of_batch(batch, threshold_percent):
+    """
+    :param batch: list of single day dataframes
+    :return: days of batch which pass threshold_percent
+    """
+    smoothness_values = smoothness_values_for_days(batch)
+    return [day_df for day_df, smoothness in zip(batch, smoothness_values) if smoothness * 100 <= threshold_percent]
+
+
 def __day_df_smoothness_value(day_df):
     ###########################################################################
     ### Calculates a smoothness value for given day_df, low value is better ###
@@ -158,3 +388,30 @@ def __fourier_filter(values, saved_frequencies):
     values_ifft = fft.ifft(values_fft).real
 
     return values_ifft
+
+
+def __fourier_filter_batch(values, lengths, saved_frequencies):
+    """
+    Batched __fourier_filter for rows of different lengths padded with zeros. Padding would change the frequency bins of
+    a full FFT, so only the saved low frequencies are computed with a direct DFT against each row's own length. For real
+    values, keeping bins 0..saved_frequencies and their mirrored negative frequencies is equal to
+    mean + 2/n * Re(sum of kept positive frequency components).
+    :param values: 2-D array, one zero padded row of values per day
+    :param lengths: numpy array of valid value counts per row
+    :param saved_frequencies: how many of the longest frequencies to spare
+    :return: 2-D array of values after shorter frequencies are removed, padding is not meaningful
+    """
+    lengths = numpy.maximum(lengths, 1).astype(numpy.float64)
+    minutes = numpy.arange(values.shape[1], dtype=numpy.float64)
+
+    # e^(i*2*pi*m/n) for each row, powers of this give the dft basis of each saved frequency
+    base = numpy.exp((2j * math.pi) * minutes[None, :] / lengths[:, None])
+    basis = numpy.ones_like(base)
+
+    filtered = values.sum(axis=1)[:, None].repeat(values.shape[1], axis=1)
+    for _ in range(saved_frequencies):
+        basis *= base
+        component = (values * basis.conj()).sum(axis=1)
+        filtered += 2.0 * (component[:, None] * basis).real
+
+    return filtered / lengths[:, None]
@@ -1,3 +1,5 @@
+from dataclasses import dataclass
+
 
 
 timezone = "UTC"
@@ -38,19 +40,56 @@ PURPLE = "#6633ff"
 TEAL = "#33ffff"
 GOLD = "#ffff33"
 
+############################
+#   SITES
+############################
+
+@dataclass(frozen=True)
+class Site:
+    """
+    Immutable and hashable parameters of one installation. Pass a Site explicitly to estimators and pv_model functions
+    instead of assigning module globals, so that several sites can be processed at the same time in threads or
+    processes. Unknown parameters are None.
+    """
+    name: str
+    latitude: float = None
+    longitude: float = None
+    tilt: float = None
+    azimuth: float = None
+    rated_power: float = 1
+    module_elevation: float = module_elevation
+    albedo: float = albedo
+
+
+site_helsinki = Site("Helsinki", latitude_helsinki, longitude_helsinki, tilt_helsinki, azimuth_helsinki,
+                     rated_power_helsinki, elevation_helsinki)
+site_kuopio = Site("Kuopio", latitude_kuopio, longitude_kuopio, tilt_kuopio, azimuth_kuopio, rated_power_kuopio,
+                   elevation_kuopio)
+
+
 def set_params_helsinki():
-    latitude = latitude_helsinki
-    longitude = longitude_helsinki
-    tilt = tilt_helsinki
-    azimuth = azimuth_helsinki
-    rated_power = rated_power_helsinki
-    module_elevation = elevation_helsinki
+    """
+    Sets the module level parameters of older scripts to Helsinki values. New code should pass site_helsinki instead.
+    :return: site_helsinki
+    """
+    return __set_params(site_helsinki)
+
 
 def set_params_kuopio():
-    latitude = latitude_kuopio
-    longitude = longitude_kuopio
-    tilt = tilt_kuopio
-    azimuth = azimuth_kuopio
-    rated_power = rated_power_kuopio
-    module_elevation = elevation_kuopio
+    """
+    Sets the module level parameters of older scripts to Kuopio values. New code should pass site_kuopio instead.
+    :return: site_kuopio
+    """
+    return __set_params(site_kuopio)
+
 
+def __set_params(site):
+    global latitude, longitude, tilt, azimuth, rated_power, module_elevation, installation_name
+    latitude = site.latitude
+    longitude = site.longitude
+    tilt = site.tilt
+    azimuth = site.azimuth
+    rated_power = site.rated_power
+    module_elevation = site.module_elevation
+    installation_name = site.name
+    return site
@@ -0,0 +1,132 @@
+"""
+DAY BLOCK
+
+Compact container for many days of minute data. Days are rows of one contiguous minute x day float32 array, with a
+validity mask for measured minutes and year and day arrays as metadata. Compared to a list of single day dataframes
+there is no per day index or time column, per day access is a numpy view and a whole block is pickled as a few
+buffers when passed to worker processes.
+
+Example:
+block = DayBlock.from_day_dfs(cloud_free_day_finder.find_smooth_days_df(df, 120, 200, 3))
+for year, day, powers, valid in block:
+    ...
+"""
+
+import numpy
+import pandas
+
+
+minutes_per_day = 1440
+
+
+class DayBlock:
+    __slots__ = ("years", "days", "powers", "valid", "clear")
+
+    def __init__(self, years, days, powers, valid, clear=None):
+        """
+        :param years: numpy array of years, one per day
+        :param days: numpy array of days of year
+        :param powers: float32 array with shape (len(days), 1440), powers of unmeasured minutes are 0
+        :param valid: boolean array with the same shape as powers, True for measured minutes
+        :param clear: optional boolean array with the same shape as powers, clear minutes from
+        cloud_free_day_finder.clear_minute_mask
+        """
+        self.years = numpy.asarray(years, dtype=numpy.int16)
+        self.days = numpy.asarray(days, dtype=numpy.int16)
+        self.powers = numpy.ascontiguousarray(powers, dtype=numpy.float32)
+        self.valid = numpy.ascontiguousarray(valid, dtype=bool)
+        self.clear = None if clear is None else numpy.ascontiguousarray(clear, dtype=bool)
+
+    @classmethod
+    def from_day_dfs(cls, day_dfs):
+        """
+        :param day_dfs: iterable of single day dataframes with columns year, day, minute and output, and optionally
+        clear
+        :return: DayBlock with the days in the same order
+        """
+        day_dfs = list(day_dfs)
+        years = numpy.zeros(len(day_dfs), dtype=numpy.int16)
+        days = numpy.zeros(len(day_dfs), dtype=numpy.int16)
+        powers = numpy.zeros((len(day_dfs), minutes_per_day), dtype=numpy.float32)
+        valid = numpy.zeros((len(day_dfs), minutes_per_day), dtype=bool)
+        has_clear = len(day_dfs) > 0 and all("clear" in day_df.columns for day_df in day_dfs)
+        clear = numpy.zeros((len(day_dfs), minutes_per_day), dtype=bool) if has_clear else None
+
+        for i, day_df in enumerate(day_dfs):
+            if len(day_df) == 0:
+                continue
+            years[i] = day_df["year"].values[0]
+            days[i] = day_df["day"].values[0]
+            minutes = day_df["minute"].values.astype(numpy.int64)
+            outputs = day_df["output"].values
+            measured = ~numpy.isnan(outputs)
+            powers[i, minutes[measured]] = outputs[measured]
+            valid[i, minutes[measured]] = True
+            if has_clear:
+                clear[i, minutes[measured]] = day_df["clear"].values[measured]
+
+        return cls(years, days, powers, valid, clear)
+
+    def __len__(self):
+        return len(self.days)
+
+    def __iter__(self):
+        """
+        :return: iterator of (year, day, powers, valid) per day, powers and valid are views to the block
+        """
+        for i in range(len(self.days)):
+            yield int(self.years[i]), int(self.days[i]), self.powers[i], self.valid[i]
+
+    def index_of(self, year, day):
+        """
+        :return: row index of year and day, None if block does not contain the day
+        """
+        indices = numpy.flatnonzero((self.years == year) & (self.days == day))
+        if len(indices) == 0:
+            return None
+        return int(indices[0])
+
+    def select(self, indices):
+        """
+        :param indices: row indices or boolean mask of days to keep
+        :return: new DayBlock with the selected days
+        """
+        clear = None if self.clear is None else self.clear[indices]
+        return DayBlock(self.years[indices], self.days[indices], self.powers[indices], self.valid[indices], clear)
+
+    def day_df(self, index):
+        """
+        Builds a single day dataframe in solar_power_data_loader2.load_csv format, for functions which need one.
+        :param index: row index of the day
+        :return: dataframe with columns time, year, day, minute and output of measured minutes
+        """
+        minutes = numpy.flatnonzero(self.valid[index]).astype(numpy.int16)
+        day_start = pandas.to_datetime(str(self.years[index]) + "-" + str(self.days[index]), format="%Y-%j")
+        times = pandas.DatetimeIndex(day_start + pandas.to_timedelta(minutes, unit="m")).tz_localize("UTC")
+
+        df = pandas.DataFrame({
+            "time": times.as_unit("ns"),
+            "year": numpy.full(len(minutes), self.years[index], dtype=numpy.int16),
+            "day": numpy.full(len(minutes), self.days[index], dtype=numpy.int16),
+            "minute": minutes,
+            "output": self.powers[index, minutes]
+        })
+        if self.clear is not None:
+            df["clear"] = self.clear[index, minutes]
+
+        return df
+
+    def day_dfs(self):
+        """
+        :return: list of single day dataframes, see day_df
+        """
+        return [self.day_df(i) for i in range(len(self.days))]
+
+    def nbytes(self):
+        """
+        :return: memory used by the block arrays in bytes
+        """
+        total = self.years.nbytes + self.days.nbytes + self.powers.nbytes + self.valid.nbytes
+        if self.clear is not None:
+            total += self.clear.nbytes
+        return total
@@ -0,0 +1,175 @@
+"""
+PER DAY FEATURE TABLE
+
+Per day facts which several modules need are computed here once, in one pass over the minute data:
+smoothness: cloud_free_day_finder smoothness value of minutes with output >= 0.001, low is better
+first_minute, last_minute: first and last minute with output > 0, nan if the day has no productive minutes
+energy: sum of output over the day
+peak: maximum output of the day
+sample_count: number of measured minutes
+missing_minutes: minutes without a measurement between the first and last measured minute
+longest_gap: longest run of missing minutes between the first and last measured minute
+
+Feature table of a csv file is cached next to the file as path + ".days.cache.npz" and is recomputed only when the csv
+changes. Selecting days with a different threshold is then a filter on the table, see the day_features parameter of
+cloud_free_day_finder.find_smooth_days_df.
+"""
+
+import os
+import tempfile
+
+import numpy
+import pandas
+
+from helpers import cloud_free_day_finder
+from helpers import solar_power_data_loader2
+from helpers import splitters2
+
+
+feature_columns = ["year", "day", "smoothness", "first_minute", "last_minute", "energy", "peak", "sample_count",
+                   "missing_minutes", "longest_gap"]
+
+
+def load_day_features(path, use_cache=True):
+    """
+    Loads or computes the day feature table of the csv file in path.
+    :param path: path to csv file
+    :param use_cache: False disables reading and writing the feature table cache
+    :return: day feature table dataframe with feature_columns
+    """
+    if use_cache:
+        features = __read_cache(path)
+        if features is not None:
+            return features
+
+    features = compute_day_features(solar_power_data_loader2.load_csv(path, use_cache=use_cache))
+
+    if use_cache:
+        __write_cache(path, features)
+
+    return features
+
+
+def first_last_productive_minutes(df):
+    """
+    First and last minute with output > 0 and their midpoint for every (year, day) of df, in one grouped reduction.
+    Shared by both geoguessers and compute_day_features.
+    :param df: dataframe with columns year, day, minute and output, rows of each day in chronological order
+    :return: dataframe with columns year, day, first_minute, last_minute and midpoint sorted by year and day, days
+    without productive minutes are left out
+    """
+    productive = df[df["output"] > 0.0]
+    grouped = productive.groupby(["year", "day"], sort=True)["minute"].agg(["first", "last"]).reset_index()
+    grouped.columns = ["year", "day", "first_minute", "last_minute"]
+    grouped["midpoint"] = (grouped["first_minute"] + grouped["last_minute"]) / 2.0
+    return grouped
+
+
+def compute_day_features(df):
+    """
+    Computes the day feature table of df in one vectorized pass.
+    :param df: dataframe with columns year, day, minute and output, as returned by solar_power_data_loader2.load_csv
+    :return: day feature table dataframe with feature_columns, one row per (year, day) in chronological order
+    """
+    df, partition = splitters2.build_day_partition(df)
+
+    keys = list(partition.keys())
+    starts = numpy.array([rows.start for rows in partition.values()], dtype=numpy.int64)
+    stops = numpy.array([rows.stop for rows in partition.values()], dtype=numpy.int64)
+
+    minutes = df["minute"].values.astype(numpy.int64)
+    outputs = df["output"].values.astype(numpy.float64)
+
+    features = pandas.DataFrame({
+        "year": numpy.array([key[0] for key in keys], dtype=numpy.int16),
+        "day": numpy.array([key[1] for key in keys], dtype=numpy.int16)
+    })
+
+    if len(keys) == 0:
+        for column in feature_columns[2:]:
+            features[column] = numpy.zeros(0)
+        return features
+
+    # energy, peak and sample count with segmented reductions over day boundaries
+    features["energy"] = numpy.add.reduceat(outputs, starts)
+    features["peak"] = numpy.maximum.reduceat(outputs, starts)
+    features["sample_count"] = stops - starts
+
+    # first and last productive minute, nan for days without productive minutes
+    first_last = first_last_productive_minutes(df)
+    features = features.merge(first_last[["year", "day", "first_minute", "last_minute"]], on=["year", "day"],
+                              how="left")
+    features["first_minute"] = features["first_minute"].astype(numpy.float64)
+    features["last_minute"] = features["last_minute"].astype(numpy.float64)
+
+    # gaps between consecutive measured minutes, the step over a day boundary is not a gap
+    steps = numpy.diff(minutes, append=minutes[-1] + 1) - 1
+    steps[stops - 1] = 0
+    steps = numpy.maximum(steps, 0)
+    features["missing_minutes"] = numpy.add.reduceat(steps, starts)
+    features["longest_gap"] = numpy.maximum.reduceat(steps, starts)
+
+    # smoothness is computed from the same minutes as in cloud_free_day_finder.find_smooth_days_df
+    smoothness = numpy.empty(len(keys))
+    batch_size = 366
+    for batch_start in range(0, len(keys), batch_size):
+        batch_stop = min(batch_start + batch_size, len(keys))
+        power_arrays = []
+        for i in range(batch_start, batch_stop):
+            day_outputs = outputs[starts[i]:stops[i]]
+            power_arrays.append(day_outputs[day_outputs >= 0.001])
+        smoothness[batch_start:batch_stop] = cloud_free_day_finder.smoothness_values_for_power_arrays(power_arrays)
+    features["smoothness"] = smoothness
+
+    return features[feature_columns]
+
+
+def cache_path_for(path):
+    """
+    :param path: path to csv file
+    :return: path of the feature table cache file for path
+    """
+    return path + ".days.cache.npz"
+
+
+def __read_cache(path):
+    """
+    :return: cached feature table or None if cache is missing, unreadable or out of date
+    """
+    cache_path = cache_path_for(path)
+    if not os.path.exists(cache_path):
+        return None
+
+    try:
+        with numpy.load(cache_path) as cache:
+            signature = (int(cache["source_mtime_ns"]), int(cache["source_size"]))
+            if signature != solar_power_data_loader2.source_signature(path):
+                return None
+            features = pandas.DataFrame({column: cache[column] for column in feature_columns})
+    except (OSError, ValueError, KeyError) as error:
+        print("Could not read cache " + cache_path + ", computing day features instead: " + str(error))
+        return None
+
+    return features
+
+
+def __write_cache(path, features):
+    """
+    Writes the feature table of csv file in path through a temporary file with a unique name, see
+    solar_power_data_loader2.__write_cache.
+    """
+    cache_path = cache_path_for(path)
+    source_mtime_ns, source_size = solar_power_data_loader2.source_signature(path)
+    temporary_path = None
+
+    try:
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(cache_path)),
+                                                           suffix=".tmp")
+        with os.fdopen(file_descriptor, "wb") as file:
+            numpy.savez(file, source_mtime_ns=source_mtime_ns, source_size=source_size,
+                        **{column: features[column].values for column in feature_columns})
+        os.replace(temporary_path, cache_path)
+    except OSError as error:
+        print("Could not write cache " + cache_path + ": " + str(error))
+    finally:
+        solar_power_data_loader2.remove_temporary_file(temporary_path)
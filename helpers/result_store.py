@@ -0,0 +1,161 @@
+"""
+RESULT STORE
+
+Local SQLite database of estimation results, so that reruns compute only the days and years which are missing from the
+store and reporting reads finished results instead of recomputing them.
+
+Rows of table day_results hold the result of one day, rows of table year_results hold the summary of one year. Rows
+are keyed by site name, year, day and a hash of the algorithm parameters, so that results of different parameters live
+side by side. Every row also holds a hash of the input data it was computed from, a stored row whose input data has
+changed since is treated as missing and recomputed.
+
+Example:
+connection = open_result_store(path)
+parameters = parameter_hash({"points": 1000, "latitude": 62.89})
+data = data_hash(day_df)
+result = load_day_result(connection, "Kuopio", 2018, 150, parameters, data)
+if result is None:
+    result = compute(day_df)
+    save_day_result(connection, "Kuopio", 2018, 150, parameters, data, result)
+"""
+
+import hashlib
+import sqlite3
+
+import pandas
+
+
+day_result_columns = ["tilt", "azimuth", "fitness", "evaluations", "seconds"]
+year_result_columns = ["latitude", "longitude", "tilt", "azimuth", "fitness", "days", "evaluations", "seconds"]
+
+
+def open_result_store(path):
+    """
+    Opens a result store, the database file and its tables are created if they do not exist yet.
+    :param path: path of SQLite database file
+    :return: sqlite3 connection, close it when done
+    """
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE IF NOT EXISTS day_results (site TEXT, year INTEGER, day INTEGER, "
+                       "parameters TEXT, parameter_values TEXT, data TEXT, tilt REAL, azimuth REAL, fitness REAL, "
+                       "evaluations INTEGER, seconds REAL, PRIMARY KEY (site, year, day, parameters))")
+    connection.execute("CREATE TABLE IF NOT EXISTS year_results (site TEXT, year INTEGER, parameters TEXT, "
+                       "parameter_values TEXT, data TEXT, latitude REAL, longitude REAL, tilt REAL, azimuth REAL, "
+                       "fitness REAL, days INTEGER, evaluations INTEGER, seconds REAL, "
+                       "PRIMARY KEY (site, year, parameters))")
+    connection.commit()
+    return connection
+
+
+def parameter_hash(parameters):
+    """
+    :param parameters: dictionary of algorithm parameter name -> value, values must have a stable repr
+    :return: short hex hash of the parameters, independent of dictionary order
+    """
+    return hashlib.sha1(repr(sorted(parameters.items())).encode()).hexdigest()[:16]
+
+
+def data_hash(df, columns=("year", "day", "minute", "output")):
+    """
+    :param df: pv dataframe or one day of it
+    :param columns: columns which the results depend on
+    :return: hex hash of the column values
+    """
+    values = pandas.util.hash_pandas_object(df[list(columns)], index=False).values
+    return hashlib.sha1(values.tobytes()).hexdigest()
+
+
+def load_day_result(connection, site, year, day, parameters, data):
+    """
+    :param connection: connection from open_result_store
+    :param site: site name
+    :param year: year of the day
+    :param day: day number
+    :param parameters: parameter_hash of the algorithm parameters
+    :param data: data_hash of the day
+    :return: dictionary with day_result_columns keys, None if the day is missing or its data has changed
+    """
+    row = connection.execute("SELECT data, " + ", ".join(day_result_columns) + " FROM day_results WHERE site = ? "
+                             "AND year = ? AND day = ? AND parameters = ?",
+                             (site, int(year), int(day), parameters)).fetchone()
+    if row is None or row[0] != data:
+        return None
+    return dict(zip(day_result_columns, row[1:]))
+
+
+def save_day_result(connection, site, year, day, parameters, data, result, parameter_values=None):
+    """
+    Saves result of one day, replacing an earlier result with the same key.
+    :param result: dictionary with day_result_columns keys
+    :param parameter_values: optional dictionary of the hashed parameters, stored as text for reporting
+    """
+    connection.execute("INSERT OR REPLACE INTO day_results (site, year, day, parameters, parameter_values, data, " +
+                       ", ".join(day_result_columns) + ") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (site, int(year), int(day), parameters, __parameter_text(parameter_values), data) +
+                       tuple(__sql_value(result[column]) for column in day_result_columns))
+    connection.commit()
+
+
+def save_year_result(connection, site, year, parameters, data, result, parameter_values=None):
+    """
+    Saves summary of one year, replacing an earlier summary with the same key.
+    :param result: dictionary with year_result_columns keys
+    :param parameter_values: optional dictionary of the hashed parameters, stored as text for reporting
+    """
+    connection.execute("INSERT OR REPLACE INTO year_results (site, year, parameters, parameter_values, data, " +
+                       ", ".join(year_result_columns) + ") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (site, int(year), parameters, __parameter_text(parameter_values), data) +
+                       tuple(__sql_value(result[column]) for column in year_result_columns))
+    connection.commit()
+
+
+def read_day_results(path, site=None):
+    """
+    :param path: path of SQLite database file
+    :param site: optional site name, all sites if None
+    :return: dataframe of stored day results ordered by site, year and day
+    """
+    return __read_table(path, "day_results", site, "site, year, day")
+
+
+def read_year_results(path, site=None):
+    """
+    :param path: path of SQLite database file
+    :param site: optional site name, all sites if None
+    :return: dataframe of stored year results ordered by site and year
+    """
+    return __read_table(path, "year_results", site, "site, year")
+
+
+def __read_table(path, table, site, order):
+    """
+    :return: rows of table as a dataframe, optionally only rows of one site
+    """
+    connection = open_result_store(path)
+    try:
+        if site is None:
+            return pandas.read_sql_query("SELECT * FROM " + table + " ORDER BY " + order, connection)
+        return pandas.read_sql_query("SELECT * FROM " + table + " WHERE site = ? ORDER BY " + order, connection,
+                                     params=(site,))
+    finally:
+        connection.close()
+
+
+def __parameter_text(parameter_values):
+    """
+    :return: readable text of parameter dictionary, None if not given
+    """
+    if parameter_values is None:
+        return None
+    return ", ".join(str(key) + "=" + str(value) for key, value in sorted(parameter_values.items()))
+
+
+def __sql_value(value):
+    """
+    :return: value converted from numpy scalar to python scalar, SQLite does not accept numpy types
+    """
+    if value is None:
+        return None
+    if hasattr(value, "item"):
+        return value.item()
+    return value
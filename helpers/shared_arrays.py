@@ -0,0 +1,139 @@
+"""
+SHARED MEMORY ARRAYS
+
+Publishes numpy arrays once in multiprocessing.shared_memory segments so that worker processes attach to them by name
+instead of receiving pickled copies with every task. Only a small handle of segment names, shapes and dtypes is sent
+to workers.
+
+Owner process:
+handle, segments = publish_arrays({"powers": powers, "valid": valid})
+try:
+    results = executor.map(work, [handle] * task_count, ...)
+finally:
+    release_arrays(segments)
+
+Worker process:
+arrays, segments = attach_arrays(handle)
+try:
+    ... read arrays["powers"] ...
+finally:
+    close_arrays(segments)
+
+Attached arrays are read only views to the shared segments, workers must not keep references to them after
+close_arrays.
+"""
+
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+
+import numpy
+
+from helpers import day_block
+
+
+def publish_arrays(arrays):
+    """
+    Copies arrays to new shared memory segments.
+    :param arrays: dictionary of name -> numpy array, None values are kept as None
+    :return: (handle, segments), handle is a small picklable dictionary to pass to workers, segments must be given to
+    release_arrays when the job ends
+    """
+    handle = {}
+    segments = []
+    try:
+        for name, array in arrays.items():
+            if array is None:
+                handle[name] = None
+                continue
+            array = numpy.ascontiguousarray(array)
+            segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            segments.append(segment)
+            numpy.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[...] = array
+            handle[name] = (segment.name, array.shape, array.dtype.str)
+    except (OSError, ValueError):
+        release_arrays(segments)
+        raise
+
+    return handle, segments
+
+
+def attach_arrays(handle):
+    """
+    Attaches to arrays published with publish_arrays without copying.
+    :param handle: handle from publish_arrays
+    :return: (arrays, segments), arrays is a dictionary of name -> read only numpy array, segments must be given to
+    close_arrays when the arrays are no longer used
+    """
+    arrays = {}
+    segments = []
+    for name, description in handle.items():
+        if description is None:
+            arrays[name] = None
+            continue
+        segment_name, shape, dtype = description
+        segment = __attach_segment(segment_name)
+        segments.append(segment)
+        array = numpy.ndarray(shape, dtype=numpy.dtype(dtype), buffer=segment.buf)
+        array.flags.writeable = False
+        arrays[name] = array
+
+    return arrays, segments
+
+
+def close_arrays(segments):
+    """
+    Detaches a worker from shared segments, the segments stay available to other processes.
+    """
+    for segment in segments:
+        segment.close()
+
+
+def release_arrays(segments):
+    """
+    Closes and removes shared segments, called once by the owner when the job ends.
+    """
+    for segment in segments:
+        segment.close()
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def __attach_segment(segment_name):
+    """
+    Attaches to a segment without registering it to the resource tracker. The owner unlinks the segment, a tracker
+    of a worker process would otherwise unlink it when the worker exits, and with forked workers the owner's tracker
+    would lose track of it.
+    """
+    try:
+        # Python 3.13 and newer
+        return shared_memory.SharedMemory(name=segment_name, track=False)
+    except TypeError:
+        pass
+
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=segment_name)
+    finally:
+        resource_tracker.register = register
+
+
+def publish_day_block(block):
+    """
+    :param block: day_block.DayBlock
+    :return: (handle, segments), see publish_arrays
+    """
+    return publish_arrays({"years": block.years, "days": block.days, "powers": block.powers, "valid": block.valid,
+                           "clear": block.clear})
+
+
+def attach_day_block(handle):
+    """
+    :param handle: handle from publish_day_block
+    :return: (block, segments), block arrays are views to the shared segments, see attach_arrays
+    """
+    arrays, segments = attach_arrays(handle)
+    block = day_block.DayBlock(arrays["years"], arrays["days"], arrays["powers"], arrays["valid"], arrays["clear"])
+    return block, segments
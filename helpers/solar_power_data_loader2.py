@@ -1,6 +1,12 @@
+import os
+import tempfile
+
 import matplotlib
+import numpy
 import pandas
 
+from helpers import splitters2
+
 
 path_helsinki = "fmi-helsinki-2021.csv"
 path_kuopio = "fmi-kuopio-2021.csv"
@@ -17,17 +23,236 @@ def load_helsinki_csv():
 def load_kuopio_csv():
     return load_csv(path_kuopio)
 
-def load_csv(path):
-    df = pandas.read_csv(path, sep=";", skiprows=15, parse_dates=["prod_time"])
-    df = df[['prod_time','pv_inv_out']]
-    df.columns = ["time", "output"]
-    df = df.dropna()
-    df = __minute_format(df)
-    df['time'] = pandas.to_datetime(df.time).dt.tz_localize("UTC")
-    #df = df.dropna()
+def load_csv(path, use_cache=True, compact=True, keep_time=True):
+    """
+    Loads an FMI solar power csv file. Processed dataframe is cached next to the source file as path + ".cache.npz" and
+    the cache is used on later calls for as long as the source file modification time and size stay the same.
+    :param path: path to csv file
+    :param use_cache: False disables reading and writing the cache
+    :param compact: True converts the dataframe to the compact schema, see compact_schema
+    :param keep_time: False replaces the time column with integer column epoch_minute, see compact_schema
+    :return: dataframe with columns time or epoch_minute, year, day, minute and output
+    """
+    df = None
+    if use_cache:
+        df = __read_cache(path)
+
+    if df is None:
+        df = pandas.read_csv(path, sep=";", skiprows=15, parse_dates=["prod_time"])
+        df = df[['prod_time','pv_inv_out']]
+        df.columns = ["time", "output"]
+        df = df.dropna()
+        df = __minute_format(df)
+        df['time'] = pandas.to_datetime(df.time).dt.tz_localize("UTC")
+        #df = df.dropna()
+
+        if use_cache:
+            __write_cache(path, df)
+
+    if compact or not keep_time:
+        df = compact_schema(df, keep_time=keep_time, narrow_dtypes=compact)
+
+    return df
+
+
+def load_csv_with_day_partition(path, use_cache=True, compact=True, keep_time=True):
+    """
+    Same as load_csv, but also builds the (year, day) partition index of the loaded data.
+    :return: (dataframe, partition) see splitters2.build_day_partition
+    """
+    return splitters2.build_day_partition(load_csv(path, use_cache=use_cache, compact=compact, keep_time=keep_time))
+
+
+def iterate_csv_days(path, chunk_size=100000, compact=True, keep_time=True):
+    """
+    Streaming alternative to load_csv. Reads csv in path chunk_size rows at a time and yields one day of data at a time,
+    so peak memory stays at one chunk and one day regardless of file size. Rows of a day split between two chunks are
+    carried over and yielded once the day is complete. Expects the csv to be in chronological order, as FMI files are.
+    :param path: path to csv file
+    :param chunk_size: csv rows parsed at a time
+    :param compact: see load_csv
+    :param keep_time: see load_csv
+    :return: generator of single day dataframes in the same format as load_csv output
+    """
+    carried = None
+
+    reader = pandas.read_csv(path, sep=";", skiprows=15, usecols=["prod_time", "pv_inv_out"],
+                             parse_dates=["prod_time"], chunksize=chunk_size)
+    for chunk in reader:
+        chunk.columns = ["time", "output"]
+        chunk = chunk.dropna()
+        if len(chunk) == 0:
+            continue
+        chunk = __minute_format(chunk)
+        chunk['time'] = pandas.to_datetime(chunk.time).dt.tz_localize("UTC")
+        if compact or not keep_time:
+            chunk = compact_schema(chunk, keep_time=keep_time, narrow_dtypes=compact)
+
+        if carried is not None:
+            chunk = pandas.concat([carried, chunk], ignore_index=compact)
+
+        # last day of the chunk may continue in the next chunk
+        keys = chunk["year"].values.astype(numpy.int64) * 1000 + chunk["day"].values
+        last_day_start = numpy.searchsorted(keys, keys[-1])
+        carried = chunk.iloc[last_day_start:]
+
+        for _, day_df in chunk.iloc[:last_day_start].groupby(keys[:last_day_start], sort=False):
+            yield day_df
+
+    if carried is not None and len(carried) > 0:
+        yield carried
+
+
+def iterate_csv_years(path, chunk_size=100000, compact=True, keep_time=True):
+    """
+    Streaming alternative to load_csv which yields one year of data at a time. Peak memory is bounded by one year.
+    Parameters are the same as in iterate_csv_days.
+    :return: generator of single year dataframes in the same format as load_csv output
+    """
+    year_days = []
+    for day_df in iterate_csv_days(path, chunk_size=chunk_size, compact=compact, keep_time=keep_time):
+        if len(year_days) > 0 and year_days[0]["year"].values[0] != day_df["year"].values[0]:
+            yield pandas.concat(year_days, ignore_index=compact)
+            year_days = []
+        year_days.append(day_df)
+
+    if len(year_days) > 0:
+        yield pandas.concat(year_days, ignore_index=compact)
+
+
+def compact_schema(df, keep_time=True, narrow_dtypes=True):
+    """
+    Converts a loaded measurement dataframe to the compact schema: int16 year, day and minute, float32 output and a
+    range index in place of the row numbers left over from dropped csv rows.
+    :param df: dataframe with columns time, year, day, minute and output
+    :param keep_time: False replaces the tz-aware time column with epoch_minute, minutes since 1970-01-01 00:00 UTC.
+    time can be restored with add_time_column
+    :param narrow_dtypes: False keeps the original column dtypes
+    :return: dataframe in compact schema
+    """
+    df = df.copy()
+
+    if narrow_dtypes:
+        df["year"] = df["year"].astype(numpy.int16)
+        df["day"] = df["day"].astype(numpy.int16)
+        df["minute"] = df["minute"].astype(numpy.int16)
+        df["output"] = df["output"].astype(numpy.float32)
+        df = df.reset_index(drop=True)
+
+    if not keep_time and "time" in df.columns:
+        epoch_minutes = df["time"].dt.tz_convert("UTC").dt.tz_localize(None).values.astype("datetime64[m]")
+        epoch_minutes = epoch_minutes.astype(numpy.int64)
+        if narrow_dtypes:
+            epoch_minutes = epoch_minutes.astype(numpy.int32)
+        df.insert(0, "epoch_minute", epoch_minutes)
+        df = df.drop(columns=["time"])
+
+    return df
+
+
+def add_time_column(df):
+    """
+    Restores the tz-aware time column of a dataframe loaded with keep_time=False.
+    :param df: dataframe with column epoch_minute
+    :return: dataframe with column time as the first column
+    """
+    df = df.copy()
+    seconds = df["epoch_minute"].values.astype(numpy.int64) * 60
+    df.insert(0, "time", pandas.to_datetime(seconds, unit="s", utc=True).as_unit("ns"))
+    return df
+
+
+def cache_path_for(path):
+    """
+    :param path: path to csv file
+    :return: path of the binary cache file for path
+    """
+    return path + ".cache.npz"
+
+
+def source_signature(path):
+    """
+    Used for invalidating caches derived from the file in path.
+    :return: modification time in nanoseconds and size in bytes of the file in path
+    """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def __read_cache(path):
+    """
+    Reads the binary cache of csv file in path.
+    :return: cached dataframe or None if cache is missing, unreadable or out of date
+    """
+    cache_path = cache_path_for(path)
+    if not os.path.exists(cache_path):
+        return None
+
+    try:
+        with numpy.load(cache_path) as cache:
+            if (int(cache["source_mtime_ns"]), int(cache["source_size"])) != source_signature(path):
+                return None
+
+            df = pandas.DataFrame(
+                {
+                    "time": pandas.DatetimeIndex(cache["time"]).tz_localize("UTC"),
+                    "year": cache["year"],
+                    "day": cache["day"],
+                    "minute": cache["minute"],
+                    "output": cache["output"]
+                },
+                index=cache["index"]
+            )
+    except (OSError, ValueError, KeyError) as error:
+        print("Could not read cache " + cache_path + ", reading csv instead: " + str(error))
+        return None
 
     return df
 
+
+def __write_cache(path, df):
+    """
+    Writes df as a binary cache for csv file in path. Written to a temporary file first so that an interrupted write
+    never leaves a partial cache behind. Temporary file name is unique, processes writing the same cache at the same
+    time do not replace each other's files.
+    """
+    cache_path = cache_path_for(path)
+    source_mtime_ns, source_size = source_signature(path)
+    temporary_path = None
+
+    try:
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(cache_path)),
+                                                           suffix=".tmp")
+        with os.fdopen(file_descriptor, "wb") as file:
+            numpy.savez(file,
+                        time=df["time"].dt.tz_convert("UTC").dt.tz_localize(None).values,
+                        year=df["year"].values,
+                        day=df["day"].values,
+                        minute=df["minute"].values,
+                        output=df["output"].values,
+                        index=df.index.values,
+                        source_mtime_ns=source_mtime_ns,
+                        source_size=source_size)
+        os.replace(temporary_path, cache_path)
+    except OSError as error:
+        print("Could not write cache " + cache_path + ": " + str(error))
+    finally:
+        remove_temporary_file(temporary_path)
+
+
+def remove_temporary_file(temporary_path):
+    """
+    Removes temporary file of a failed cache write. Does nothing if the file was not created or was already moved to
+    its final path.
+    """
+    if temporary_path is None:
+        return
+    try:
+        os.remove(temporary_path)
+    except FileNotFoundError:
+        pass
+
+
 def __minute_format(df):
     df2 = pandas.DataFrame.copy(df, deep=True)
 
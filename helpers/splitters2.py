@@ -1,22 +1,70 @@
+import numpy
+
+
 def split_df_year(df, year):
-    df = df.where(df.year == year)
+    # boolean mask keeps column dtypes, df.where would widen them to float
+    df = df[df.year == year]
     df = df.dropna()
 
-    # removing non int date variables, they seem to be caused by df.where
+    # removing non int date variables in case df was filtered with df.where before
     df = __remove_nonint_dates(df)
 
     return df
 
 def split_df_day_range(df, day_start, day_end):
-    df = df.where(df.day >= day_start)
-    df = df.where(df.day <= day_end)
+    df = df[(df.day >= day_start) & (df.day <= day_end)]
     df = df.dropna()
     df = __remove_nonint_dates(df)
     return df
 
+def build_day_partition(df):
+    """
+    Builds a (year, day) partition index of df. Done once, after which single days can be taken from the returned
+    dataframe with df.iloc[partition[(year, day)]] without scanning or copying the whole dataframe.
+    :param df: dataframe with columns year and day
+    :return: (df sorted by year and day, dict of (year, day) -> slice of rows in sorted df)
+    """
+    keys = df["year"].values.astype(numpy.int64) * 1000 + df["day"].values
+
+    # loaded data is already in chronological order, sorting only if needed
+    if len(keys) > 1 and numpy.any(keys[1:] < keys[:-1]):
+        order = numpy.argsort(keys, kind="stable")
+        df = df.iloc[order]
+        keys = keys[order]
+
+    starts = numpy.concatenate(([0], numpy.flatnonzero(keys[1:] != keys[:-1]) + 1))
+    stops = numpy.append(starts[1:], len(keys))
+
+    partition = {}
+    for start, stop in zip(starts, stops):
+        partition[(int(keys[start] // 1000), int(keys[start] % 1000))] = slice(int(start), int(stop))
+
+    return df, partition
+
+
+def partitioned_days(df, partition, day_start=None, day_end=None, year=None):
+    """
+    :param df: sorted dataframe from build_day_partition
+    :param partition: partition from build_day_partition
+    :param day_start: first day to include, None for no limit
+    :param day_end: last day to include, None for no limit
+    :param year: year to include, None for all years
+    :return: generator of single day dataframes in chronological order
+    """
+    for (year_n, day_n), rows in partition.items():
+        if year is not None and year_n != year:
+            continue
+        if day_start is not None and day_n < day_start:
+            continue
+        if day_end is not None and day_n > day_end:
+            continue
+        yield df.iloc[rows]
+
+
 def __remove_nonint_dates(df):
-    df.year = df.year.astype(int)
-    df.day = df.day.astype(int)
-    df.minute = df.minute.astype(int)
+    # integer columns are left as they are so that the compact int16 schema is not widened
+    for column in ["year", "day", "minute"]:
+        if df[column].dtype.kind == "f":
+            df = df.assign(**{column: df[column].astype(numpy.int16)})
     return df
 
@@ -0,0 +1,82 @@
+"""
+PERSISTENT WORKER POOL
+
+One long lived process pool per session, shared by the parallel entry points such as
+angler.angle_clear_days_jointly_in_processes and fleet_runner.estimate_fleet. Workers import pandas, pvlib and the
+estimators once when they start and run one small simulation, which loads the pvlib data files and fills the code
+paths used later. Worker side caches, for example pvlib_poa.get_shared_day_geometry, stay filled between tasks and
+between successive estimation calls, so many small jobs do not pay the process start up again.
+
+Pool size is chosen when the pool starts, callers which need fewer workers split their work in fewer tasks instead
+of resizing the pool. Pool is shut down at interpreter exit, or earlier with shutdown_worker_pool, after which the
+next call may start a pool of a different size.
+"""
+
+import atexit
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+__pool = None
+
+
+def get_worker_pool(processes=None):
+    """
+    Returns the session worker pool, created on first use. A running pool is returned as it is, also when processes
+    differs from its size, so that its warm workers are kept.
+    :param processes: worker process count of a new pool, os.cpu_count() if None
+    :return: concurrent.futures.ProcessPoolExecutor
+    """
+    global __pool
+
+    if __pool is None:
+        if processes is None:
+            processes = os.cpu_count()
+        __pool = ProcessPoolExecutor(max_workers=processes, initializer=__warm_up_worker)
+
+    return __pool
+
+
+def map_in_workers(function, *iterables, processes=None):
+    """
+    Same as ProcessPoolExecutor.map on the session worker pool. A pool broken by a crashed worker is discarded, so
+    that the next call starts a new one.
+    :param function: module level function
+    :param iterables: argument iterables of function
+    :param processes: worker process count if the pool is not running yet, see get_worker_pool
+    :return: list of results in the order of the arguments
+    """
+    try:
+        return list(get_worker_pool(processes).map(function, *iterables))
+    except BrokenProcessPool:
+        shutdown_worker_pool()
+        raise
+
+
+def shutdown_worker_pool():
+    """
+    Stops the session worker pool, a later get_worker_pool call starts a new one.
+    """
+    global __pool
+
+    if __pool is not None:
+        __pool.shutdown(wait=True, cancel_futures=True)
+    __pool = None
+
+
+def __warm_up_worker():
+    """
+    Runs once in every worker process when it starts.
+    """
+    # imports are here so that importing this module stays cheap in the parent process
+    from estimators import angler
+    from estimators import site_estimator
+    from pv_model import pvlib_poa
+
+    # first solar position and clear sky calls load pvlib data files, one simulated day warms them up
+    day_geometry = pvlib_poa.get_day_geometry(2020, 180, 60, 25)
+    pvlib_poa.pvlib_complex_batch(day_geometry, [30], [180])
+
+
+atexit.register(shutdown_worker_pool)
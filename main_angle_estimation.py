@@ -2,6 +2,7 @@ import math
 import matplotlib
 import numpy
 from helpers import splitters2, config, multiplier_matcher, cloud_free_day_finder, solar_power_data_loader2
+from helpers import result_store
 from estimators import angler
 from pv_model import pvlib_poa
 
@@ -11,36 +12,57 @@ def solve_panel_angles_exhaustively():
     This function shows how to use multiple days from multiple years to estimate pv system angles.
     """
 
-    # choosing site and setting parameters
-    site = "Kuopio"
+    # choosing site, see helpers.config.Site
+    site = config.site_kuopio
 
     first_day = 120
     last_day = 250
     lattice_point_count = 10000
 
-    # loading data and setting system parameters
-    if site == "Kuopio":
+    # finished days and partial lattice searches are saved here, an interrupted run continues from them when restarted
+    checkpoint_path = site.name + "_angles.checkpoint"
+
+    # finished day and year results are stored here, a rerun with the same parameters and data reads them instead
+    result_store_path = "angle_results.sqlite"
+
+    # loading data
+    if site == config.site_kuopio:
         data = solar_power_data_loader2.load_kuopio_csv()
-        config.latitude = config.latitude_kuopio
-        config.longitude = config.longitude_kuopio
-        config.tilt = config.tilt_kuopio
-        config.azimuth = config.azimuth_kuopio
-    elif site == "Helsinki":
+    elif site == config.site_helsinki:
         data = solar_power_data_loader2.load_helsinki_csv()
-        config.latitude = config.latitude_helsinki
-        config.longitude = config.longitude_helsinki
-        config.tilt = config.tilt_helsinki
-        config.azimuth = config.azimuth_helsinki
 
     # estimating installation angles for year range
     for year_n in range(2017, 2022):
         data_y = splitters2.split_df_year(data, year_n)
         data_y = splitters2.split_df_day_range(data_y, first_day, last_day)
-        angler.angle_clear_days_from_df_with_n_point_fibo(data_y, config.latitude, config.longitude, 1, lattice_point_count)
+        angler.angle_clear_days_from_df_with_n_point_fibo(data_y, site.latitude, site.longitude, 1, lattice_point_count,
+                                                          site=site, checkpoint_path=checkpoint_path,
+                                                          result_store_path=result_store_path)
 
 
 #solve_panel_angles_exhaustively()
 
+def report_stored_angle_estimates():
+    """
+    This function prints the results stored by solve_panel_angles_exhaustively without recomputing them.
+    """
+
+    site = config.site_kuopio
+    result_store_path = "angle_results.sqlite"
+
+    year_results = result_store.read_year_results(result_store_path, site.name)
+    print(year_results[["year", "tilt", "azimuth", "fitness", "days", "evaluations", "seconds", "parameter_values"]])
+
+    for row in year_results.itertuples():
+        delta = angler.angular_distance_between_points(row.tilt, row.azimuth, site.tilt, site.azimuth)
+        print("Year " + str(row.year) + " delta angle: " + str(round(delta, 3)))
+
+    day_results = result_store.read_day_results(result_store_path, site.name)
+    print("Stored " + str(len(day_results)) + " day results from " + str(day_results["year"].nunique()) + " years")
+
+
+#report_stored_angle_estimates()
+
 def exhaustive_search_single_day():
     ########################################################################
     ### Sample showing how to solve panel angles using exhaustive search ###
@@ -108,6 +130,73 @@ def exhaustive_search_single_day():
 
 #exhaustive_search_single_day()
 
+def surrogate_search_single_day():
+    #####################################################################
+    ### Sample showing how to solve panel angles using surrogate search ###
+    #####################################################################
+    year_n = 2019
+    # choosing site, see helpers.config.Site
+    site = config.site_kuopio
+
+    first_day = 120
+    last_day = 250
+
+    if site == config.site_kuopio:
+        data = solar_power_data_loader2.load_kuopio_csv()
+    elif site == config.site_helsinki:
+        data = solar_power_data_loader2.load_helsinki_csv()
+
+    data = splitters2.split_df_year(data, year_n)
+    clear_days = cloud_free_day_finder.find_smooth_days_df(data, first_day, last_day, 0.4)
+
+    if len(clear_days) == 0:
+        print("No clear days with chosen dataset and threshold. Quitting.")
+        return
+
+    clear_day = clear_days[0]
+
+    # a few dozen pvlib_complex evaluations instead of the thousands used by exhaustive search
+    tilt, azimuth, fit = angler.solve_panel_angles_single_day_surrogate(clear_day, site.latitude, site.longitude,
+                                                                        site=site)
+
+    print("Best fit at tilt: " + str(round(tilt, 3)) + " azimuth: " + str(round(azimuth, 3)) + " delta: " + str(
+        round(fit, 1)))
+    print("CAD: " + str(round(angler.angular_distance_between_points(tilt, azimuth, site.tilt, site.azimuth), 4)))
+
+
+#surrogate_search_single_day()
+
+def solve_panel_angles_jointly():
+    ##################################################################################
+    ### Sample showing how to solve a single set of panel angles for all clear days ###
+    ##################################################################################
+    year_n = 2019
+    # choosing site, see helpers.config.Site
+    site = config.site_kuopio
+
+    first_day = 120
+    last_day = 200
+    lattice_point_count = 10000
+
+    if site == config.site_kuopio:
+        data = solar_power_data_loader2.load_kuopio_csv()
+    elif site == config.site_helsinki:
+        data = solar_power_data_loader2.load_helsinki_csv()
+
+    data = splitters2.split_df_year(data, year_n)
+    clear_days = cloud_free_day_finder.find_smooth_days_df(data, first_day, last_day, 1.0)
+
+    # one pass over the lattice, every lattice point is scored against every clear day
+    tilt, azimuth, fit = angler.angle_clear_days_jointly_with_n_point_fibo(clear_days, site.latitude, site.longitude,
+                                                                          lattice_point_count, site=site)
+
+    print("Joint fit at tilt: " + str(round(tilt, 3)) + " azimuth: " + str(round(azimuth, 3)) + " delta: " + str(
+        round(fit, 1)))
+    print("CAD: " + str(round(angler.angular_distance_between_points(tilt, azimuth, site.tilt, site.azimuth), 4)))
+
+
+#solve_panel_angles_jointly()
+
 def solve_panel_angles_multi_day_iterative():
     ###############################################################################
     ### Sample showing how to solve panel angles using multiple cloud free days ###
@@ -179,7 +268,7 @@ def solve_panel_angles_multi_day_iterative():
         day_n = clear_day["day"].values[0]
         print("selected day is year:" + str(year_n) + " day: " + str(day_n))
 
-        center_fit = angler.test_single_pair_of_angles_improved(clear_day, config.latitude, config.longitude,
+        center_fit = angler.test_single_pair_of_angles_improved(clear_day, latitude, longitude,
                                                                 center_tilt,
                                                                 center_azimuth)
         # initial distance:
@@ -209,7 +298,7 @@ def solve_panel_angles_multi_day_iterative():
         found_fitnesses.append(center_fit)
         print("Last best" + str(round(center_tilt, 4)) + " " + str(round(center_azimuth, 4)))
         print("CAD: " + str(
-            round(angler.angular_distance_between_points(center_tilt, center_azimuth, config.tilt, config.azimuth), 4)))
+            round(angler.angular_distance_between_points(center_tilt, center_azimuth, known_tilt, known_azimuth), 4)))
         # polar_ax.scatter(numpy.radians(center_azimuth), center_tilt, marker="o", color=config.PURPLE,s=50)
 
         print("Last distance: " + str(distance))
@@ -226,8 +315,7 @@ def solve_panel_angles_multi_day_iterative():
     ### Printing data ###
     #####################
     print("Cluster parameters:")
-    average_tilt = sum(found_tilts) / len(found_tilts)
-    average_azimuth = sum(found_azimuths) / len(found_azimuths)
+    average_tilt, average_azimuth = angler.average_tilt_azimuth(found_tilts, found_azimuths)
     print("Average tilt: " + str(round(average_tilt, 3)) + " azimuth: " + str(round(average_azimuth, 3)))
     print("Fitness: " + str(round(sum(found_fitnesses) / len(found_fitnesses), 4)))
     print("Cluster CAD: " + str(
@@ -299,7 +387,7 @@ def solve_panel_angles_single_day_iterative():
     ###############################
 
 
-    center_fit = angler.test_single_pair_of_angles_improved(clear_day, config.latitude, config.longitude, center_tilt,
+    center_fit = angler.test_single_pair_of_angles_improved(clear_day, latitude, longitude, center_tilt,
                                                             center_azimuth)
     polar_ax.text(numpy.radians(center_azimuth), center_tilt, "Start")
 
@@ -339,7 +427,7 @@ def solve_panel_angles_single_day_iterative():
     ###################################################################
     print("Last best" + str(round(center_tilt, 4)) + " " + str(round(center_azimuth, 4)))
     print("CAD: " + str(
-        round(angler.angular_distance_between_points(center_tilt, center_azimuth, config.tilt, config.azimuth), 4)))
+        round(angler.angular_distance_between_points(center_tilt, center_azimuth, known_tilt, known_azimuth), 4)))
     polar_ax.scatter(numpy.radians(center_azimuth), center_tilt, marker="o", facecolors='none', edgecolors='red',
                      s=500 * distance)
 
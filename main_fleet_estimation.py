@@ -0,0 +1,26 @@
+from estimators import fleet_runner
+
+
+def estimate_fleet_from_manifest():
+    #####################################################################################################
+    ### This function estimates location and panel angles of every installation in a site manifest, ###
+    ### see estimators.fleet_runner for the manifest format. Example manifest:                      ###
+    ###                                                                                             ###
+    ### name,path,latitude,longitude,tilt,azimuth                                                   ###
+    ### Helsinki,fmi-helsinki-2021.csv,60.2044,24.9625,15,135                                       ###
+    ### Kuopio,fmi-kuopio-2021.csv,,,15,217                                                         ###
+    ###                                                                                             ###
+    ### Kuopio row has unknown location, it is estimated before the angles                         ###
+    #####################################################################################################
+
+    manifest_path = "fleet_manifest.csv"
+    summary_path = "fleet_summary.csv"
+
+    summary = fleet_runner.estimate_fleet(manifest_path, summary_path, points=1000, angle_days=(120, 250))
+
+    print(summary[["name", "status", "latitude", "longitude", "tilt", "azimuth", "angle_error"]])
+
+
+# worker processes import this file again, the guard keeps them from starting the estimation themselves
+if __name__ == "__main__":
+    estimate_fleet_from_manifest()
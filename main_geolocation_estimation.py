@@ -5,8 +5,10 @@ import numpy
 from matplotlib import pyplot as plt
 import helpers.config
 from helpers import solar_power_data_loader2
+from helpers import checkpoints
+from helpers import result_store
 from helpers import splitters2
-from estimators import geoguesser_longitude, geoguesser_latitude
+from estimators import geoguesser_longitude, geoguesser_latitude, site_estimator
 
 
 
@@ -23,29 +25,24 @@ def estimate_longitude_v2():  # works, used in thesis
     correct_longitude = helpers.config.longitude_helsinki
 
 
-    statistics_dataframes = []
-
-    # estimating every year
-    for year_n in range(2017, 2022):
-        print("estimating longitude for year " + str(year_n))
-        year_data = splitters2.split_df_year(data, year_n)
-        year_data = splitters2.split_df_day_range(year_data, 125, 250)
-        estimated_longitude = geoguesser_longitude.estimate_longitude_based_on_year_df(year_data)
-        statistics_dataframes.append(estimated_longitude)
-
-        print("Longitude median: " + str(round(estimated_longitude["longitude"].median(),4)))
-        print("Longitude mean: " + str(round(estimated_longitude["longitude"].mean(),4)))
-        print("Median delta: " + str(round(correct_longitude-estimated_longitude["longitude"].median(),4)))
-        print("Mean delta: " + str(round(correct_longitude-estimated_longitude["longitude"].mean(),4)))
-
+    # estimating every year in one pass
+    data = data[(data["year"] >= 2017) & (data["year"] <= 2021)]
+    per_year, pooled_longitude, per_day = geoguesser_longitude.estimate_longitude_archive(data, 125, 250)
 
     years = []  # years
     box_data = []
 
-    for df in statistics_dataframes:
-        year_n = df["year"].values[0]
+    for year_n, year_longitudes in per_day.groupby("year", sort=True):
+        print("estimating longitude for year " + str(year_n))
+        print("Longitude median: " + str(round(year_longitudes["longitude"].median(),4)))
+        print("Longitude mean: " + str(round(year_longitudes["longitude"].mean(),4)))
+        print("Median delta: " + str(round(correct_longitude-year_longitudes["longitude"].median(),4)))
+        print("Mean delta: " + str(round(correct_longitude-year_longitudes["longitude"].mean(),4)))
         years.append(year_n)
-        box_data.append(df["longitude"])
+        box_data.append(year_longitudes["longitude"])
+
+    print("Pooled longitude median: " + str(round(pooled_longitude,4)))
+    print("Pooled median delta: " + str(round(correct_longitude-pooled_longitude,4)))
 
     # adjusting font size
     font = {'size': 16}
@@ -198,6 +195,12 @@ def plot_day_interval_heatmap():
     # helsinki = 180-310 dev: 0.3788
     data = solar_power_data_loader2.load_helsinki_csv()
 
+    # tested intervals are saved to a checkpoint, a restarted run skips intervals which are already done with the
+    # same data
+    checkpoint_path = "day_interval_heatmap.checkpoint"
+    checkpoint = checkpoints.load_checkpoint(checkpoint_path)
+    data_hash = result_store.data_hash(data)
+
     # list of tested intervals
     first_days = []
     last_days = []
@@ -219,27 +222,39 @@ def plot_day_interval_heatmap():
             if last_day > 350:
                 continue
 
-            print("Testing interval: " + str(first_day) +"-" + str(last_day))
+            checkpoint_key = ("interval", data_hash, first_day, last_day)
+            if checkpoint_key in checkpoint:
+                standard_dev = checkpoint[checkpoint_key]
+            else:
+                print("Testing interval: " + str(first_day) +"-" + str(last_day))
+
+                # intervals without enough productive days have too few points for line fits or no latitudes at all
+                try:
+                    lat1, lat2, year_n = geoguesser_latitude.slopematch_estimate_latitude_multi_year(data, first_day,
+                                                                                                     last_day)
+                    all_latitudes = lat1 + lat2
 
-            # using try-catch here because some intervals cause errors
-            try:
-                lat1, lat2, year_n = geoguesser_latitude.slopematch_estimate_latitude_multi_year(data, first_day, last_day)
-                all_latitudes = lat1 + lat2
+                    standard_dev = statistics.pstdev(all_latitudes)
+                except (ValueError, numpy.linalg.LinAlgError) as error:
+                    print("Skipping interval " + str(first_day) + "-" + str(last_day) + ": " + str(error))
+                    standard_dev = None
 
-                standard_dev = statistics.pstdev(all_latitudes)
+                checkpoint[checkpoint_key] = standard_dev
+                checkpoints.save_checkpoint(checkpoint, checkpoint_path)
 
-                first_days.append(first_day)
-                last_days.append(last_day)
-                standard_deviations.append(standard_dev)
+            if standard_dev is None or math.isnan(standard_dev):
+                continue
+
+            first_days.append(first_day)
+            last_days.append(last_day)
+            standard_deviations.append(standard_dev)
 
-                if standard_dev < best_standard_dev:
-                    best_standard_dev = standard_dev
-                    best_first_day = first_day
-                    best_last_day = last_day
-                    print("New lowest standard deviation found")
-                    print(str(best_first_day) +"-" + str(best_last_day) + " dev: " + str(round(best_standard_dev,4)))
-            except:
-                print("Got an error for some reason, skipping this interval")
+            if standard_dev < best_standard_dev:
+                best_standard_dev = standard_dev
+                best_first_day = first_day
+                best_last_day = last_day
+                print("New lowest standard deviation found")
+                print(str(best_first_day) +"-" + str(best_last_day) + " dev: " + str(round(best_standard_dev,4)))
 
     # Convert lists to numpy arrays
     firsts = numpy.array(first_days)
@@ -261,4 +276,25 @@ def plot_day_interval_heatmap():
     plt.show()
 
 
-#plot_day_interval_heatmap()
\ No newline at end of file
+#plot_day_interval_heatmap()
+
+def estimate_site_jointly():
+    ##########################################################################################
+    ### This function estimates latitude, longitude, tilt and azimuth in one joint pass    ###
+    ### for an installation with unknown metadata, see estimators.site_estimator           ###
+    ##########################################################################################
+
+    data = solar_power_data_loader2.load_kuopio_csv()
+
+    result = site_estimator.estimate_site(data)
+
+    print("Latitude: " + str(round(result["latitude"], 4)) + " longitude: " + str(round(result["longitude"], 4)))
+    if result["tilt"] is None:
+        # no clear days were found within the angle estimation days
+        print("Tilt and azimuth not estimated, clear days: " + str(result["clear_days"]))
+    else:
+        print("Tilt: " + str(round(result["tilt"], 2)) + " azimuth: " + str(round(result["azimuth"], 2)))
+    print("Stage durations: " + str(result["seconds"]))
+
+
+#estimate_site_jointly()
@@ -60,11 +60,12 @@ def get_solar_irradiance_poa(year, day, lat, lon, tilt, facing):
     return output_df
 
 
-def __get_irradiance_pvlib(date_start, date_end,latitude, longitude, mod="ineichen"):
+def __get_irradiance_pvlib(date_start, date_end,latitude, longitude, mod="ineichen", minute_step=1):
     """
     PVlib based clear sky irradiance modeling
     :param date: Datetime object containing a date
     :param mod: One of the 3 models suupported by pvlib
+    :param minute_step: simulation resolution in minutes
     :return: Dataframe with ghi, dni, dhi. Or only GHI if using haurwitz
     """
 
@@ -72,7 +73,7 @@ def __get_irradiance_pvlib(date_start, date_end,latitude, longitude, mod="ineich
     site = location.Location(latitude, longitude, tz=config.timezone)
 
     # measurement frequency, for example "15min" or "60min"
-    measurement_frequency = str(1) + "min"
+    measurement_frequency = str(minute_step) + "min"
 
     times = pd.date_range(start=date_start,
                           end=date_end,  # year + day for which the irradiance is calculated
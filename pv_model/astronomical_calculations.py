@@ -1,4 +1,5 @@
 import numpy
+import pandas
 import pvlib.atmosphere
 
 from helpers import config
@@ -17,6 +18,8 @@ More info:https://pvpmc.sandia.gov/modeling-guide/1-weather-design-inputs/plane-
 
 Both angles are useful for reflection and geometric projection functions.
 
+Sunrise and sunset minute grid, analytic first and last daylight minutes for a whole latitude x day grid at once.
+
 Air mass, constant which which describes how many atmosphere equivalents direct sunlight has to pass
 though before reaching solar pv panel surface. 1 if sun is directly above.
 More info: https://pvpmc.sandia.gov/modeling-guide/1-weather-design-inputs/irradiance-insolation/air-mass/
@@ -60,6 +63,23 @@ def get_solar_angle_of_incidence(dt, tilt, azimuth, latitude, longitude):
     return angle_of_incidence
 
 
+def get_solar_angle_of_incidence_arrays(tilts, azimuths, solar_apparent_zenith, solar_azimuth):
+    """
+    Vectorized angle of incidence for many panel orientations at once. Solar angles are computed once per day and
+    shared by all orientations.
+    :param tilts: numpy array of panel tilts in degrees, shape (n,)
+    :param azimuths: numpy array of panel azimuths in degrees, shape (n,)
+    :param solar_apparent_zenith: numpy array of apparent solar zenith angles in degrees, shape (minutes,)
+    :param solar_azimuth: numpy array of solar azimuth angles in degrees, shape (minutes,)
+    :return: Angle of incidence in degrees, shape (n, minutes), limited to 90 degrees like in
+    get_solar_angle_of_incidence
+    """
+    angle_of_incidence = irradiance.aoi(numpy.asarray(tilts)[:, None], numpy.asarray(azimuths)[:, None],
+                                        solar_apparent_zenith[None, :], solar_azimuth[None, :])
+
+    return numpy.minimum(angle_of_incidence, 90)
+
+
 def get_air_mass(time, latitude, longitude):
     """
     Generates air mass at time + solar zenith angle by using the default model
@@ -102,6 +122,107 @@ def get_solar_azimuth_zenith(dt, latitude, longitude):
     return solar_azimuth, solar_apparent_zenith
 
 
+def get_sunrise_sunset_minute_grid(latitudes, years, days, longitude=0, horizon_angle=-0.5667):
+    """
+    Analytic sunrise and sunset minutes for every latitude and day in one array computation. Solar declination and
+    equation of time are the low precision solar coordinates of the NOAA solar calculator, evaluated at the time of
+    sunrise and sunset. Default horizon angle is the refraction at horizon of the pvlib solar position. Simulated POA
+    is sampled at the start of each minute, so its first non-zero minute is the sunrise rounded up and its last
+    non-zero minute the sunset rounded down, the grid minutes are rounded the same way. On latitudes 35-70 this
+    reproduces the minutes of pvlib_poa.get_first_and_last_nonzero_minutes_for_days exactly on about 97% of days and
+    within one minute on the rest. Days within a few minutes of the 1420 minute daylight limit may be nan in only one
+    of the two.
+    :param latitudes: numpy array of latitudes, -90 to 90
+    :param years: numpy array of years, one per day
+    :param days: numpy array of days of year, same length as years
+    :param longitude: -180 to 180, minutes are in UTC
+    :param horizon_angle: sun elevation at sunrise and sunset in degrees
+    :return: (sunrise minutes, sunset minutes) as whole minute float arrays with shape (len(latitudes), len(days)),
+    nan for polar night and for days with more than 1420 daylight minutes like in
+    pvlib_poa.get_first_and_last_nonzero_minute
+    """
+    latitudes = numpy.radians(numpy.asarray(latitudes, dtype=numpy.float64))[:, None]
+    day_starts = pandas.to_datetime([str(year) + "-" + str(day) for year, day in zip(years, days)], format="%Y-%j")
+    julian_days = (day_starts.values.astype("datetime64[s]").astype(numpy.float64) / 86400 + 2440587.5)[None, :]
+
+    # first estimate at noon, then sunrise and sunset are refined with the sun position at their own time of day
+    sunrises, sunsets = __sunrise_sunset_minutes(latitudes, julian_days + 0.5, longitude, horizon_angle)
+    sunrises, _ = __sunrise_sunset_minutes(latitudes, julian_days + numpy.nan_to_num(sunrises, nan=720) / 1440,
+                                           longitude, horizon_angle)
+    _, sunsets = __sunrise_sunset_minutes(latitudes, julian_days + numpy.nan_to_num(sunsets, nan=720) / 1440,
+                                          longitude, horizon_angle)
+
+    # POA covers minutes 0-1439 of the UTC day. If the daylight wraps over midnight POA is split in two and its first
+    # non-zero minute is the sunrise of the next day and its last non-zero minute the sunset of the previous day,
+    # otherwise daylight which started before or ends after the UTC day is cut to the day
+    next_sunrises, _ = __sunrise_sunset_minutes(latitudes, julian_days + 1 + numpy.nan_to_num(sunrises, nan=720) / 1440,
+                                                longitude, horizon_angle)
+    _, previous_sunsets = __sunrise_sunset_minutes(latitudes,
+                                                   julian_days - 1 + numpy.nan_to_num(sunsets, nan=720) / 1440,
+                                                   longitude, horizon_angle)
+    with numpy.errstate(invalid="ignore"):
+        sunrises = numpy.where(sunrises <= 0, numpy.where(next_sunrises < 0, next_sunrises, 0), sunrises)
+        sunsets = numpy.where(sunsets >= 1439, numpy.where(previous_sunsets > 1439, previous_sunsets, 1439), sunsets)
+
+    return numpy.ceil(sunrises), numpy.floor(sunsets)
+
+
+def __sunrise_sunset_minutes(latitudes, julian_days, longitude, horizon_angle):
+    """
+    :param latitudes: latitudes in radians, shape (n, 1)
+    :param julian_days: julian days, shape (1, days) or (n, days)
+    :return: sunrise and sunset minutes with the sun position at julian_days
+    """
+    declinations, equation_of_time = __declination_equation_of_time(julian_days)
+
+    cos_hour_angle = ((numpy.sin(numpy.radians(horizon_angle)) - numpy.sin(latitudes) * numpy.sin(declinations))
+                      / (numpy.cos(latitudes) * numpy.cos(declinations)))
+
+    # half of the daylight in minutes, nan when the sun does not cross the horizon angle
+    with numpy.errstate(invalid="ignore"):
+        half_daylight = numpy.degrees(numpy.arccos(cos_hour_angle)) * 4
+    half_daylight = numpy.where(half_daylight * 2 > 1420, numpy.nan, half_daylight)
+
+    solar_noons = 720 - 4 * longitude - equation_of_time
+
+    return solar_noons - half_daylight, solar_noons + half_daylight
+
+
+def __declination_equation_of_time(julian_days):
+    """
+    Low precision solar coordinates, as in the NOAA solar calculator.
+    :param julian_days: numpy array of julian days
+    :return: (declinations in radians, equation of time in minutes)
+    """
+    centuries = (julian_days - 2451545.0) / 36525.0
+
+    mean_longitude = numpy.radians((280.46646 + centuries * (36000.76983 + centuries * 0.0003032)) % 360)
+    mean_anomaly = numpy.radians(357.52911 + centuries * (35999.05029 - 0.0001537 * centuries))
+    eccentricity = 0.016708634 - centuries * (0.000042037 + 0.0000001267 * centuries)
+
+    center = numpy.radians(numpy.sin(mean_anomaly) * (1.914602 - centuries * (0.004817 + 0.000014 * centuries))
+                           + numpy.sin(2 * mean_anomaly) * (0.019993 - 0.000101 * centuries)
+                           + numpy.sin(3 * mean_anomaly) * 0.000289)
+    omega = numpy.radians(125.04 - 1934.136 * centuries)
+    apparent_longitude = mean_longitude + center - numpy.radians(0.00569 + 0.00478 * numpy.sin(omega))
+
+    obliquity_seconds = 21.448 - centuries * (46.815 + centuries * (0.00059 - centuries * 0.001813))
+    mean_obliquity = 23 + (26 + obliquity_seconds / 60) / 60
+    obliquity = numpy.radians(mean_obliquity + 0.00256 * numpy.cos(omega))
+
+    declinations = numpy.arcsin(numpy.sin(obliquity) * numpy.sin(apparent_longitude))
+
+    y = numpy.tan(obliquity / 2) ** 2
+    equation_of_time = 4 * numpy.degrees(
+        y * numpy.sin(2 * mean_longitude)
+        - 2 * eccentricity * numpy.sin(mean_anomaly)
+        + 4 * eccentricity * y * numpy.sin(mean_anomaly) * numpy.cos(2 * mean_longitude)
+        - 0.5 * y * y * numpy.sin(4 * mean_longitude)
+        - 1.25 * eccentricity * eccentricity * numpy.sin(2 * mean_anomaly))
+
+    return declinations, equation_of_time
+
+
 def __debug_add_solar_angles_to_df(df, panel_tilt, panel_azimuth, latitude, longitude):
     """
     This function is not normally used, but it has proven to be useful for debugging
@@ -31,7 +31,7 @@ import pv_model.astronomical_calculations as astronomical_calculations
 from helpers import config
 
 
-def irradiance_df_to_poa_df(irradiance_df, tilt, azimuth, latitude, longitude):
+def irradiance_df_to_poa_df(irradiance_df, tilt, azimuth, latitude, longitude, albedo=None):
     """
     This function takes an irradiance dataframe as input. This dataframe should contain ghi, dni and dhi irradiance values
     These values are then projected to the panel surfaces either using simple geometry or more complex equations.
@@ -41,6 +41,7 @@ def irradiance_df_to_poa_df(irradiance_df, tilt, azimuth, latitude, longitude):
     :param longitude:
     :param latitude:
     :param irradiance_df: Solar irradiance dataframe with ghi, dni and dhi components.
+    :param albedo: ground albedo, for example config.Site.albedo, config.albedo if None
     :return: Dataframe with dni, ghi and dhi plane of array irradiance projections
     """
 
@@ -68,7 +69,9 @@ def irradiance_df_to_poa_df(irradiance_df, tilt, azimuth, latitude, longitude):
     if "albedo" in irradiance_df.columns:
         irradiance_df["ghi_poa"] = helper_ghi_poa_dynamic_albedo(irradiance_df["ghi"], irradiance_df["albedo"], tilt)
     else:
-        irradiance_df["ghi_poa"] = helper_ghi_poa_dynamic_albedo(irradiance_df["ghi"], config.albedo, tilt)
+        if albedo is None:
+            albedo = config.albedo
+        irradiance_df["ghi_poa"] = helper_ghi_poa_dynamic_albedo(irradiance_df["ghi"], albedo, tilt)
 
 
     # adding dhi poa to df
@@ -84,6 +87,36 @@ def irradiance_df_to_poa_df(irradiance_df, tilt, azimuth, latitude, longitude):
     return irradiance_df
 
 
+def project_irradiance_to_poa_arrays(day_geometry, tilts, azimuths, angle_of_incidence, albedo=None):
+    """
+    Vectorized version of irradiance_df_to_poa_df for many panel orientations at once.
+    :param day_geometry: one day of clear sky irradiance and solar angles, from pvlib_poa.get_day_geometry
+    :param tilts: numpy array of panel tilts in degrees, shape (n,)
+    :param azimuths: numpy array of panel azimuths in degrees, shape (n,)
+    :param angle_of_incidence: angles of incidence in degrees, shape (n, minutes)
+    :param albedo: ground albedo, config.albedo if None
+    :return: dni_poa, dhi_poa, ghi_poa arrays, each with shape (n, minutes)
+    """
+    if albedo is None:
+        albedo = config.albedo
+
+    tilts = numpy.asarray(tilts)[:, None]
+    azimuths = numpy.asarray(azimuths)[:, None]
+
+    dni = day_geometry["dni"].values
+    ghi = day_geometry["ghi"].values
+    # same zero and negative value protection as in irradiance_df_to_poa_df
+    dhi = numpy.maximum(day_geometry["dhi"].values, 0.01)
+
+    dni_poa = dni[None, :] * numpy.cos(numpy.radians(angle_of_incidence))
+    ghi_poa = ghi[None, :] * albedo * ((1.0 - numpy.cos(numpy.radians(tilts))) / 2)
+    dhi_poa = pvlib.irradiance.perez(tilts, azimuths, dhi, dni, day_geometry["dni_extra"].values[0],
+                                     day_geometry["solar_zenith"].values, day_geometry["solar_azimuth"].values,
+                                     day_geometry["airmass"].values, return_components=False)
+
+    return dni_poa, dhi_poa, ghi_poa
+
+
 """
 PROJECTION FUNCTIONS
 4 functions for 3 components, 2 functions for DNI as either date or angle of incidence can be used for computing the 
@@ -1,5 +1,7 @@
 import math
 
+import numpy
+
 
 def add_output_to_df(df, rated_power):
     if "poa_ref_cor" not in df.columns:
@@ -24,6 +26,38 @@ def add_output_to_df(df, rated_power):
     return df
 
 
+def estimate_output_arrays(absorbed_radiation, panel_temp, rated_power):
+    """
+    Vectorized version of the Huld et al. output model used by add_output_to_df. Same zero and nan handling.
+    :param absorbed_radiation: numpy array of reflection corrected poa values
+    :param panel_temp: numpy array of module temperatures, same shape as absorbed_radiation
+    :param rated_power: rated power in kW
+    :return: numpy array of estimated outputs in W
+    """
+    k1 = -0.017162
+    k2 = -0.040289
+    k3 = -0.004681
+    k4 = 0.000148
+    k5 = 0.000169
+    k6 = 0.000005
+
+    nrad = absorbed_radiation / 1000.0
+    productive = nrad > 0
+    # log is only taken from positive values, the rest are set to zero at the end
+    log_nrad = numpy.log(numpy.where(productive, nrad, 1.0))
+
+    Tdiff = panel_temp - 25
+
+    efficiency = (1 + k1 * log_nrad + k2 * (log_nrad ** 2) + Tdiff * (k3 + k4 * log_nrad + k5 * (log_nrad ** 2))
+                  + k6 * (Tdiff ** 2))
+    efficiency = numpy.maximum(efficiency, 0)
+
+    output = rated_power * 1000.0 * nrad * efficiency
+    output = numpy.where(productive & ~numpy.isnan(output), output, 0)
+
+    return output
+
+
 def __estimate_output(absorbed_radiation, panel_temp, rated_power):
     # huld et al 2010 constants
     k1 = -0.017162
@@ -9,16 +9,21 @@ import math
 from helpers import config
 
 
-def add_estimated_panel_temperature(df):
+def add_estimated_panel_temperature(df, module_elevation=None):
     """
     Adds an estimate for panel temperature based on wind speed, air temperature and absorbed radiation.
     If air temperature, wind speed or absorbed radiation columns are missing, aborts.
     If columns exists but temperature function returns nan due to faulty input, uses air temperature which should always
     be present in df.
     :param df:
+    :param module_elevation: module elevation from the ground in meters, for example config.Site.module_elevation,
+    config.module_elevation if None
     :return:
     """
 
+    if module_elevation is None:
+        module_elevation = config.module_elevation
+
     # checking that all required variables exist in df
 
     if "T" not in df.columns:
@@ -37,7 +42,7 @@ def add_estimated_panel_temperature(df):
         return df
 
     def helper_add_panel_temp_fast(poa_ref_cor, wind, T):
-        return temperature_of_module(poa_ref_cor, wind, config.module_elevation, T)
+        return temperature_of_module(poa_ref_cor, wind, module_elevation, T)
 
     # applying helper function to dataset and storing result as a new column
     df["module_temp"] = helper_add_panel_temp_fast(df["poa_ref_cor"], df["wind"], df["T"])
@@ -1,12 +1,17 @@
+import functools
 import time
 from datetime import datetime
 
+import numpy
 import pandas
+import pvlib.atmosphere
 from pvlib import location
 from pvlib import irradiance
 import pandas as pd
 
+from helpers import config
 from pv_model import __solar_irradiance_estimator
+from pv_model import astronomical_calculations
 from pv_model import geometric_projections
 from pv_model import reflection_estimator
 from pv_model import panel_temperature_estimator
@@ -33,10 +38,12 @@ def print_full(x):
     pandas.reset_option('display.float_format')
     pandas.reset_option('display.max_colwidth')
 
-def pvlib_complex(year, day, latitude, longitude, tilt, azimuth, rated_power=1):
+def pvlib_complex(year, day, latitude, longitude, tilt, azimuth, rated_power=1, minute_step=1, site=None):
     """
     This function shows the steps used for generating power output data with pvlib. Also returns the power output.
     PVlib is fully simulated, no restrictions on day range.
+    :param minute_step: simulation resolution in minutes, simulation cost scales linearly with simulated minutes
+    :param site: optional config.Site, its albedo and module elevation are used instead of config values
     :return: Power output dataframe
     """
     # date for simulation:
@@ -45,13 +52,14 @@ def pvlib_complex(year, day, latitude, longitude, tilt, azimuth, rated_power=1):
 
     #start_time = time.time()
     data_pvlib = __solar_irradiance_estimator.__get_irradiance_pvlib(simulation_date_start, simulation_date_end, latitude,
-                                                                   longitude)
+                                                                   longitude, minute_step=minute_step)
     #print("--- %s irradiance simulation seconds ---" % (time.time() - start_time))
 
 
     #start_time = time.time() #Almost instant to compute!
     # step 2. project irradiance components to plane of array:
-    data_pvlib = geometric_projections.irradiance_df_to_poa_df(data_pvlib, tilt, azimuth,  latitude, longitude)
+    data_pvlib = geometric_projections.irradiance_df_to_poa_df(data_pvlib, tilt, azimuth,  latitude, longitude,
+                                                            albedo=None if site is None else site.albedo)
     #print("--- %s geo_projection seconds ---" % (time.time() - start_time))
 
 
@@ -71,7 +79,8 @@ def pvlib_complex(year, day, latitude, longitude, tilt, azimuth, rated_power=1):
 
     # step 5. estimate panel temperature based on wind speed, air temperature and absorbed radiation
 
-    data_pvlib = panel_temperature_estimator.add_estimated_panel_temperature(data_pvlib)
+    data_pvlib = panel_temperature_estimator.add_estimated_panel_temperature(
+        data_pvlib, module_elevation=None if site is None else site.module_elevation)
 
     # step 6. estimate power output
     data_pvlib = output_estimator.add_output_to_df(data_pvlib, rated_power=rated_power)
@@ -80,6 +89,159 @@ def pvlib_complex(year, day, latitude, longitude, tilt, azimuth, rated_power=1):
     return data_pvlib
 
 
+def get_day_geometry(year, day, latitude, longitude, minute_step=1):
+    """
+    Computes the parts of pvlib_complex which do not depend on panel angles. Clear sky irradiance, solar angles, air
+    mass and extraterrestrial radiation are the same for every tested orientation, so they are computed once per day
+    and shared by pvlib_complex_batch calls.
+    :param minute_step: simulation resolution in minutes
+    :return: Dataframe with columns time, ghi, dni, dhi, solar_zenith, solar_azimuth, airmass and dni_extra
+    """
+    simulation_date_start = datetime.strptime(str(year) + "-" + str(day), "%Y-%j").strftime("%m-%d-%Y")
+    simulation_date_end = datetime.strptime(str(year) + "-" + str(day + 1), "%Y-%j").strftime("%m-%d-%Y")
+
+    day_geometry = __solar_irradiance_estimator.__get_irradiance_pvlib(simulation_date_start, simulation_date_end,
+                                                                       latitude, longitude, minute_step=minute_step)
+
+    times = day_geometry.index
+    solar_azimuth, solar_zenith = astronomical_calculations.get_solar_azimuth_zenith(times, latitude, longitude)
+    day_geometry["solar_zenith"] = solar_zenith
+    day_geometry["solar_azimuth"] = solar_azimuth
+    day_geometry["airmass"] = pvlib.atmosphere.get_relative_airmass(solar_zenith)
+    day_geometry["dni_extra"] = irradiance.get_extra_radiation(times[0])
+
+    return day_geometry
+
+
+def get_shared_day_geometry(year, day, latitude, longitude, minute_step=1):
+    """
+    Cached get_day_geometry. Pipelines which estimate several parameters of one site in one process, for example
+    estimators.site_estimator, get the solar position and clear sky irradiance of each day computed once for all
+    stages. Returned dataframe is shared between callers and must not be modified.
+    """
+    return __cached_day_geometry(int(year), int(day), float(latitude), float(longitude), int(minute_step))
+
+
+@functools.lru_cache(maxsize=512)
+def __cached_day_geometry(year, day, latitude, longitude, minute_step):
+    return get_day_geometry(year, day, latitude, longitude, minute_step=minute_step)
+
+
+def get_shared_clear_sky_ghi_grid(years, days, latitude, longitude):
+    """
+    Same as get_clear_sky_ghi_grid, but the clear sky ghi of each day comes from get_shared_day_geometry.
+    :return: numpy array of ghi values with shape (len(days), 1440)
+    """
+    ghi = numpy.zeros((len(days), 1440))
+    for i, (year, day) in enumerate(zip(years, days)):
+        ghi[i] = get_shared_day_geometry(year, day, latitude, longitude)["ghi"].values[:1440]
+    return ghi
+
+
+day_geometry_columns = ["ghi", "dni", "dhi", "solar_zenith", "solar_azimuth", "airmass", "dni_extra"]
+
+
+def get_day_geometry_arrays(years, days, latitude, longitude):
+    """
+    Day geometries of many days as plain arrays, for example for publishing with helpers.shared_arrays.
+    :return: dictionary of day_geometry_columns -> numpy array with shape (len(days), 1441)
+    """
+    geometries = [get_shared_day_geometry(year, day, latitude, longitude) for year, day in zip(years, days)]
+    return {column: numpy.array([geometry[column].values for geometry in geometries]) for column in
+            day_geometry_columns}
+
+
+def day_geometry_from_arrays(arrays, index):
+    """
+    :param arrays: dictionary from get_day_geometry_arrays
+    :param index: row index of the day
+    :return: day geometry dataframe of one day, usable with pvlib_complex_batch and get_irradiance_batch
+    """
+    return pandas.DataFrame({column: arrays[column][index] for column in day_geometry_columns})
+
+
+def clear_shared_day_geometry_cache():
+    """
+    Empties the get_shared_day_geometry cache, for example between sites.
+    """
+    __cached_day_geometry.cache_clear()
+
+
+def pvlib_complex_batch(day_geometry, tilts, azimuths, rated_power=1, site=None):
+    """
+    Vectorized version of pvlib_complex. Simulates the same steps for many panel orientations at once, sharing the
+    solar geometry of a single day.
+    :param day_geometry: Dataframe from get_day_geometry
+    :param tilts: list or numpy array of panel tilts in degrees
+    :param azimuths: list or numpy array of panel azimuths in degrees
+    :param rated_power: rated power in kW
+    :param site: optional config.Site, its albedo and module elevation are used instead of config values
+    :return: numpy array of power outputs with shape (len(tilts), len(day_geometry))
+    """
+
+    tilts = numpy.asarray(tilts, dtype=float)
+    azimuths = numpy.asarray(azimuths, dtype=float)
+
+    # step 2. project irradiance components to plane of array:
+    aoi = astronomical_calculations.get_solar_angle_of_incidence_arrays(tilts, azimuths,
+                                                                        day_geometry["solar_zenith"].values,
+                                                                        day_geometry["solar_azimuth"].values)
+    albedo = config.albedo if site is None else site.albedo
+    module_elevation = config.module_elevation if site is None else site.module_elevation
+
+    dni_poa, dhi_poa, ghi_poa = geometric_projections.project_irradiance_to_poa_arrays(day_geometry, tilts, azimuths,
+                                                                                       aoi, albedo=albedo)
+
+    # step 3. and 4. absorbed share of the irradiance components:
+    poa_ref_cor = reflection_estimator.components_to_corrected_poa_arrays(dni_poa, dhi_poa, ghi_poa, aoi, tilts)
+
+    # step 5. panel temperature with the same dummy wind and air temperature as in pvlib_complex
+    module_temp = panel_temperature_estimator.temperature_of_module(poa_ref_cor, 2, module_elevation, 7)
+
+    # step 6. estimate power output
+    return output_estimator.estimate_output_arrays(poa_ref_cor, module_temp, rated_power)
+
+
+def get_irradiance_batch(day_geometry, tilts, azimuths):
+    """
+    Vectorized version of get_irradiance, plain POA for many panel orientations at once. Much cheaper than
+    pvlib_complex_batch as reflection, temperature and output models are skipped.
+    :param day_geometry: Dataframe from get_day_geometry
+    :param tilts: list or numpy array of panel tilts in degrees
+    :param azimuths: list or numpy array of panel azimuths in degrees
+    :return: numpy array of POA values with shape (len(tilts), len(day_geometry))
+    """
+    POA_irradiance = irradiance.get_total_irradiance(
+        surface_tilt=numpy.asarray(tilts, dtype=float)[:, None],
+        surface_azimuth=numpy.asarray(azimuths, dtype=float)[:, None],
+        dni=day_geometry["dni"].values,
+        ghi=day_geometry["ghi"].values,
+        dhi=day_geometry["dhi"].values,
+        solar_zenith=day_geometry["solar_zenith"].values,
+        solar_azimuth=day_geometry["solar_azimuth"].values)
+
+    return POA_irradiance["poa_global"]
+
+
+def get_clear_sky_ghi_grid(years, days, latitude, longitude):
+    """
+    Clear sky global horizontal irradiance of many days with a single pvlib call.
+    :param years: list or numpy array of years
+    :param days: list or numpy array of days of year, same length as years
+    :param latitude: Geographic latitude
+    :param longitude: Geographic longitude
+    :return: numpy array of ghi values with shape (len(days), 1440), row i is minutes 0..1439 UTC of day i
+    """
+    day_starts = pandas.to_datetime([str(year) + "-" + str(day) for year, day in zip(years, days)], format="%Y-%j")
+    minute_offsets = numpy.arange(1440).astype("timedelta64[m]")
+    times = pandas.DatetimeIndex((day_starts.values[:, None] + minute_offsets[None, :]).ravel()).tz_localize("UTC")
+
+    site = location.Location(latitude, longitude, tz=config.timezone)
+    clearsky = site.get_clearsky(times, model="ineichen")
+
+    return clearsky["ghi"].values.reshape(len(day_starts), 1440)
+
+
 def get_irradiance_with_multiplier(year, lat, lon, day, tilt, facing, multiplier):
     """
     :param year: Year to simulate for, example: 2021
@@ -210,6 +372,82 @@ def get_first_and_last_nonzero_minute(latitude, longitude, year, day):
                     return None, None
 
 
+def get_first_and_last_nonzero_minutes_for_days(latitude, longitude, years, days):
+    """
+    Vectorized version of get_first_and_last_nonzero_minute for many days. POA of all days is simulated with a single
+    pvlib call.
+    :param latitude: -90 to 90
+    :param longitude: -180 to 180
+    :param years: list or numpy array of years
+    :param days: list or numpy array of days of year, same length as years
+    :return: numpy arrays of first and last non-zero POA minutes, nan where get_first_and_last_nonzero_minute would
+    return None
+    """
+    nonzero = get_irradiance_grid(years, days, latitude, longitude, 15, 180) > 0
+    counts = numpy.count_nonzero(nonzero, axis=1)
+
+    first_minutes = numpy.argmax(nonzero, axis=1).astype(float)
+    last_minutes = (1439 - numpy.argmax(nonzero[:, ::-1], axis=1)).astype(float)
+
+    # midnight sun and polar night
+    first_minutes[(counts > 1420) | (counts == 0)] = numpy.nan
+    last_minutes[(counts > 1420) | (counts == 0)] = numpy.nan
+
+    # days which continue over midnight are rare, they are handled with the same gap search as in the single day version
+    wrapping = numpy.flatnonzero((counts > 0) & (counts <= 1420) & nonzero[:, 0] & nonzero[:, -1])
+    for i in wrapping:
+        minutes = numpy.flatnonzero(nonzero[i])
+        gap = int(numpy.argmax(numpy.diff(minutes) > 1))
+        min1 = minutes[gap]
+        min2 = minutes[gap + 1]
+        if (min1 + min2) / 2 > 1440 / 2:
+            first_minutes[i], last_minutes[i] = min2 - 1440, min1
+        else:
+            first_minutes[i], last_minutes[i] = min2, min1 + 1440
+
+    return first_minutes, last_minutes
+
+
+def get_solar_noons(years, days, latitude, longitude):
+    """
+    Vectorized version of get_solar_noon for many days.
+    :return: numpy array of solar noon minutes, nan where get_solar_noon would return None
+    """
+    first_minutes, last_minutes = get_first_and_last_nonzero_minutes_for_days(latitude, longitude, years, days)
+
+    solar_noons = (first_minutes + last_minutes) / 2
+    return numpy.where(solar_noons > 1439, solar_noons - 1440, solar_noons)
+
+
+def get_irradiance_grid(years, days, lat, lon, tilt, facing):
+    """
+    Vectorized version of get_irradiance for many days, simulated with a single pvlib call.
+    :param years: list or numpy array of years
+    :param days: list or numpy array of days of year, same length as years
+    :return: numpy array of POA values with shape (len(days), 1440), row i is minutes 0..1439 of day i
+    """
+    site = location.Location(lat, lon, tz='GMT')
+
+    day_starts = pandas.to_datetime([str(year) + "-" + str(day) for year, day in zip(years, days)], format="%Y-%j")
+    minute_offsets = numpy.arange(1440).astype("timedelta64[m]")
+    times = pandas.DatetimeIndex((day_starts.values[:, None] + minute_offsets[None, :]).ravel()).tz_localize(site.tz)
+
+    # solar position is the slow part, computing it once and sharing it with the clear sky model
+    solar_position = site.get_solarposition(times=times)
+    clearsky = site.get_clearsky(times, solar_position=solar_position)
+
+    POA_irradiance = irradiance.get_total_irradiance(
+        surface_tilt=tilt,
+        surface_azimuth=facing,
+        dni=clearsky['dni'],
+        ghi=clearsky['ghi'],
+        dhi=clearsky['dhi'],
+        solar_zenith=solar_position['apparent_zenith'],
+        solar_azimuth=solar_position['azimuth'])
+
+    return POA_irradiance['poa_global'].values.reshape(len(day_starts), 1440)
+
+
 def get_irradiance(year, day, lat, lon, tilt, facing):
     """
     Returns a basic time to POA table
@@ -45,6 +45,25 @@ def components_to_corrected_poa(DNI_component, DHI_component, GHI_component, dt,
     return POA_reflection_corrected
 
 
+def components_to_corrected_poa_arrays(dni_poa, dhi_poa, ghi_poa, angle_of_incidence, tilts):
+    """
+    Vectorized version of components_to_corrected_poa for many panel orientations at once.
+    :param dni_poa: poa transposed dni values, shape (n, minutes)
+    :param dhi_poa: poa transposed dhi values, shape (n, minutes)
+    :param ghi_poa: poa transposed ghi values, shape (n, minutes)
+    :param angle_of_incidence: angles of incidence in degrees, shape (n, minutes)
+    :param tilts: numpy array of panel tilts in degrees, shape (n,)
+    :return: absorbed radiation in W, shape (n, minutes)
+    """
+    tilts = numpy.asarray(tilts)[:, None]
+
+    dni_reflected = __dni_reflected_from_aoi(angle_of_incidence)
+    dhi_reflected = __dhi_reflected(tilts)
+    ghi_reflected = __ghi_reflected(tilts)
+
+    return (1 - dni_reflected) * dni_poa + (1 - dhi_reflected) * dhi_poa + (1 - ghi_reflected) * ghi_poa
+
+
 def add_reflection_corrected_poa_to_df(df, tilt, azimuth, latitude, longitude):
     """
     Adds reflection corrected POA value to dataframe with name "poa_ref_cor"
@@ -110,10 +129,19 @@ def __dni_reflected(dt, tilt, azimuth, latitude, longitude):
     F_B_(alpha) in "Calculation of the PV modules angular losses under field conditions by means of an analytical model"
     """
 
-    a_r = reflectance_constant  # empirical constant for polycrystalline silicon module reflectance
-
     AOI = astronomical_calculations.get_solar_angle_of_incidence(dt, tilt, azimuth, latitude, longitude)
 
+    return __dni_reflected_from_aoi(AOI)
+
+
+def __dni_reflected_from_aoi(AOI):
+    """
+    :param AOI: angle of incidence in degrees, single value or numpy array
+    :return: reflected share of direct radiation in range [0,1]
+    """
+
+    a_r = reflectance_constant  # empirical constant for polycrystalline silicon module reflectance
+
     """
     # upper section of the fraction equation
     upper_fraction = math.e ** (-math.cos(numpy.radians(AOI)) / a_r) - math.e ** (-1.0 / a_r)
@@ -151,7 +179,7 @@ def __ghi_reflected(tilt):
     pi = math.pi
 
     # equation parts, part 1 is used 2 times
-    part1 = math.sin(panel_tilt) + (panel_tilt - math.sin(panel_tilt)) / (1.0 - math.cos(panel_tilt))
+    part1 = numpy.sin(panel_tilt) + (panel_tilt - numpy.sin(panel_tilt)) / (1.0 - numpy.cos(panel_tilt))
 
     part2 = c1 * part1 + c2 * (part1 ** 2.0)
     part3 = (-1.0 / a_r) * part2
@@ -181,7 +209,7 @@ def __dhi_reflected(tilt):
     pi = math.pi
 
     # equation parts, part 1 is used 2 times
-    part1 = math.sin(panel_tilt) + (pi - panel_tilt - math.sin(panel_tilt)) / (1.0 + math.cos(panel_tilt))
+    part1 = numpy.sin(panel_tilt) + (pi - panel_tilt - numpy.sin(panel_tilt)) / (1.0 + numpy.cos(panel_tilt))
 
     part2 = c1 * part1 + c2 * (part1 ** 2.0)
     part3 = (-1.0 / a_r) * part2
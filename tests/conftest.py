@@ -0,0 +1,62 @@
+"""
+Shared fixtures. Measurement data is simulated with pvlib_complex so that tests do not depend on the FMI data files,
+which are not part of the repository.
+"""
+
+import os
+import sys
+
+import numpy
+import pandas
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pv_model import pvlib_poa  # noqa: E402
+
+
+latitude = 62.8919
+longitude = 27.6349
+tilt = 15
+azimuth = 217
+years = (2018, 2019)
+days = range(150, 156)
+
+
+def simulated_fmi_csv(path):
+    """
+    Writes an FMI format csv of simulated power for days of years. Every other day is clear, the others have random
+    cloud dips so that smoothness filtering has something to reject.
+    """
+    random = numpy.random.default_rng(0)
+    frames = []
+    for year_n in years:
+        for day_n in days:
+            simulated = pvlib_poa.pvlib_complex(year_n, day_n, latitude, longitude, tilt, azimuth)
+            # simulation also includes midnight of the next day
+            output = simulated["output"].values[:1440].astype(numpy.float64)
+            if day_n % 2 == 1:
+                output = output * numpy.clip(1 - random.random(len(output)) * 0.8, 0, 1)
+            frames.append(pandas.DataFrame({
+                "prod_time": pandas.to_datetime(str(year_n) + "-" + str(day_n), format="%Y-%j") +
+                pandas.to_timedelta(numpy.arange(len(output)), unit="min"),
+                "pv_inv_out": numpy.round(output, 4)
+            }))
+
+    with open(path, "w") as file:
+        for i in range(15):
+            file.write("# header line " + str(i) + "\n")
+        pandas.concat(frames).to_csv(file, sep=";", index=False, date_format="%Y-%m-%d %H:%M:%S")
+
+
+@pytest.fixture(scope="session")
+def simulated_csv_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("data") / "simulated.csv")
+    simulated_fmi_csv(path)
+    return path
+
+
+@pytest.fixture(scope="session")
+def simulated_df(simulated_csv_path):
+    from helpers import solar_power_data_loader2
+    return solar_power_data_loader2.load_csv(simulated_csv_path, use_cache=False)
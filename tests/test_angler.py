@@ -0,0 +1,53 @@
+import numpy
+import pandas
+import pytest
+
+from conftest import latitude, longitude
+from estimators import angler
+from helpers import checkpoints
+from helpers import splitters2
+from pv_model import pvlib_poa
+
+in_region_mask = getattr(angler, "__in_region_mask")
+
+
+@pytest.mark.parametrize("tilts, azimuths, expected_tilt, expected_azimuth", [
+    ([20, 20], [350, 10], 19.72, 0.0),
+    ([30, 30], [170, 190], 29.62, 180.0),
+    ([10, 50], [90, 90], 30.0, 90.0),
+])
+def test_average_tilt_azimuth(tilts, azimuths, expected_tilt, expected_azimuth):
+    average_tilt, average_azimuth = angler.average_tilt_azimuth(tilts, azimuths)
+
+    assert 0 <= average_azimuth < 360
+    assert average_tilt == pytest.approx(expected_tilt, abs=0.01)
+    assert average_azimuth == pytest.approx(expected_azimuth, abs=1e-9)
+
+
+def test_lattice_checkpoint_is_not_shared_between_different_day_data(simulated_df, tmp_path):
+    checkpoint_path = str(tmp_path / "lattice.checkpoint")
+    clear_day = splitters2.split_df_day_range(splitters2.split_df_year(simulated_df, 2018), 152, 152)
+    changed_day = clear_day.assign(output=clear_day["output"].values[::-1])
+
+    first = angler.evaluate_1_day_against_n_fibo_points(clear_day, latitude, longitude, 10,
+                                                        checkpoint_path=checkpoint_path)
+    changed = angler.evaluate_1_day_against_n_fibo_points(changed_day, latitude, longitude, 10,
+                                                          checkpoint_path=checkpoint_path)
+    expected = angler.evaluate_1_day_against_n_fibo_points(changed_day, latitude, longitude, 10)
+
+    assert len(checkpoints.load_checkpoint(checkpoint_path)) == 2
+    assert changed == expected
+    assert changed != first
+
+
+@pytest.mark.parametrize("year_n, day_n, site_latitude", [(2018, 152, latitude), (2018, 300, 45.0)])
+def test_feasible_angle_region_contains_true_orientation(year_n, day_n, site_latitude):
+    tilts, azimuths = numpy.meshgrid([3, 20, 37, 60, 80], numpy.arange(0, 360, 15.0))
+    tilts, azimuths = tilts.ravel(), azimuths.ravel()
+    day_geometry = pvlib_poa.get_day_geometry(year_n, day_n, site_latitude, longitude)
+    outputs = pvlib_poa.pvlib_complex_batch(day_geometry, tilts, azimuths)[:, :1440]
+
+    for tilt, azimuth, output in zip(tilts, azimuths, outputs):
+        clear_day = pandas.DataFrame({"year": year_n, "day": day_n, "minute": numpy.arange(1440), "output": output})
+        region = angler.estimate_feasible_angle_region(clear_day, site_latitude, longitude)
+        assert in_region_mask(numpy.array([tilt]), numpy.array([azimuth]), region)[0], (tilt, azimuth, region)
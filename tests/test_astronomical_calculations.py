@@ -0,0 +1,23 @@
+import numpy
+
+from pv_model import astronomical_calculations
+from pv_model import pvlib_poa
+
+
+def test_sunrise_sunset_minute_grid_matches_poa_minutes():
+    latitudes = numpy.arange(35, 71, 5.0)
+    days = numpy.arange(5, 366, 20)
+    years = numpy.full(len(days), 2018)
+
+    # eastern longitude makes the daylight of the northern latitudes wrap over UTC midnight in summer
+    sunrises, sunsets = astronomical_calculations.get_sunrise_sunset_minute_grid(latitudes, years, days, 27.6349)
+    poa_minutes = [pvlib_poa.get_first_and_last_nonzero_minutes_for_days(latitude, 27.6349, years, days)
+                   for latitude in latitudes]
+    poa_sunrises = numpy.array([minutes[0] for minutes in poa_minutes])
+    poa_sunsets = numpy.array([minutes[1] for minutes in poa_minutes])
+
+    numpy.testing.assert_array_equal(numpy.isnan(sunrises), numpy.isnan(poa_sunrises))
+    valid = ~numpy.isnan(poa_sunrises)
+    for grid, poa in ((sunrises, poa_sunrises), (sunsets, poa_sunsets)):
+        assert numpy.abs(grid - poa)[valid].max() <= 1
+        assert numpy.mean(grid[valid] == poa[valid]) > 0.9
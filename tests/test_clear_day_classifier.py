@@ -0,0 +1,24 @@
+import pandas
+
+from helpers import clear_day_classifier
+from helpers import cloud_free_day_finder
+from helpers import splitters2
+
+
+def test_appended_classification_matches_batch_classification(simulated_df, tmp_path):
+    state_path = str(tmp_path / "clear_days.state")
+
+    for start in range(0, len(simulated_df), 1000):
+        state = clear_day_classifier.load_clear_day_state(state_path, threshold_percent=3)
+        chunk = simulated_df.iloc[start:start + 1000]
+        clear_day_classifier.append_measurements(state, chunk, close_last_day=start + 1000 >= len(simulated_df))
+        clear_day_classifier.save_clear_day_state(state, state_path)
+
+    appended = clear_day_classifier.clear_day_dfs(clear_day_classifier.load_clear_day_state(state_path))
+    batch = [day_df for year_n in (2018, 2019) for day_df in
+             cloud_free_day_finder.find_smooth_days_df(splitters2.split_df_year(simulated_df, year_n), 1, 366, 3)]
+
+    assert len(appended) > 0
+    assert len(appended) == len(batch)
+    for appended_day, batch_day in zip(appended, batch):
+        pandas.testing.assert_frame_equal(appended_day.reset_index(drop=True), batch_day.reset_index(drop=True))
@@ -0,0 +1,107 @@
+import math
+
+import numpy
+import pandas
+import pytest
+
+from conftest import latitude, longitude
+from helpers import cloud_free_day_finder
+from helpers import splitters2
+from pv_model import pvlib_poa
+
+day_df_smoothness_value = getattr(cloud_free_day_finder, "__day_df_smoothness_value")
+
+
+def productive_days(df):
+    df, partition = splitters2.build_day_partition(df)
+    return [day_df[day_df.output >= 0.001] for day_df in splitters2.partitioned_days(df, partition)]
+
+
+def clear_minutes_day_by_day(df, window=11, envelope_window=15, max_step=0.03, level_fraction=0.9,
+                             day_level_fraction=0.8, season_days=15, min_ghi=50):
+    """
+    Per day version of clear_minute_mask, one clear sky simulation and one set of rolling windows per day.
+    """
+    df, partition = splitters2.build_day_partition(df)
+    clear = pandas.Series(False, index=df.index)
+    minute_clear = {}
+    day_levels = {}
+    for (year_n, day_n), rows in partition.items():
+        day_df = df.iloc[rows]
+        clear_sky_ghi = pandas.Series(pvlib_poa.get_clear_sky_ghi_grid([year_n], [day_n], latitude, longitude)[0])
+        powers = pandas.Series(numpy.nan, index=range(1440))
+        powers[day_df["minute"].values] = day_df["output"].values
+
+        ratios = (powers / clear_sky_ghi).where(clear_sky_ghi > min_ghi)
+        envelope = ratios.rolling(envelope_window, center=True, min_periods=1).max()
+        steps = (ratios.shift(-1) - 2 * ratios + ratios.shift(1)).abs()
+        largest_steps = steps.rolling(window, center=True, min_periods=window).max()
+
+        minute_clear[(year_n, day_n)] = ((clear_sky_ghi > min_ghi) & (ratios >= level_fraction * envelope) &
+                                         (largest_steps <= max_step * envelope))
+        day_levels[(year_n, day_n)] = ratios.quantile(0.9) if ratios.notna().any() else -math.inf
+
+    for (year_n, day_n), rows in partition.items():
+        date = pandas.to_datetime(str(year_n) + "-" + str(day_n), format="%Y-%j")
+        seasonal_level = max(level for (other_year, other_day), level in day_levels.items()
+                             if abs((pandas.to_datetime(str(other_year) + "-" + str(other_day), format="%Y-%j") -
+                                     date).days) <= season_days)
+        level = day_levels[(year_n, day_n)]
+        if level > 0 and level >= day_level_fraction * seasonal_level:
+            day_df = df.iloc[rows]
+            clear[day_df.index] = minute_clear[(year_n, day_n)][day_df["minute"].values].values
+
+    return clear
+
+
+def test_clear_minute_mask_matches_day_by_day_mask(simulated_df):
+    # evenly overcast day is smooth, only its level compared to nearby days rejects it
+    overcast = (simulated_df["year"] == 2019) & (simulated_df["day"] == 154)
+    df = simulated_df.assign(output=numpy.where(overcast, simulated_df["output"] * 0.5, simulated_df["output"]))
+    # rows in random order, mask has to follow the row order of df
+    shuffled = df.sample(frac=1, random_state=0)
+
+    mask = cloud_free_day_finder.clear_minute_mask(shuffled, latitude, longitude)
+    expected = clear_minutes_day_by_day(shuffled)
+
+    numpy.testing.assert_array_equal(mask, expected[shuffled.index].values)
+
+    # clear days are mostly clear and cloudy days are not
+    clear_fractions = pandas.Series(mask, index=shuffled.index).groupby(
+        [shuffled["year"], shuffled["day"]]).mean()
+    clear_day = (clear_fractions.index.get_level_values("day") % 2 == 0) & (clear_fractions.index != (2019, 154))
+    assert clear_fractions[clear_day].min() > 0.3
+    assert clear_fractions[~clear_day].max() < 0.05
+    assert clear_fractions[(2019, 154)] == 0
+
+
+def test_smoothness_values_for_days_match_single_day_values(simulated_df):
+    day_dfs = productive_days(simulated_df)
+    # too short days are scored inf by both
+    day_dfs.append(day_dfs[0].iloc[:30])
+
+    batched = cloud_free_day_finder.smoothness_values_for_days(day_dfs)
+    single = numpy.array([day_df_smoothness_value(day_df) for day_df in day_dfs])
+
+    assert math.isinf(batched[-1]) and math.isinf(single[-1])
+    numpy.testing.assert_allclose(batched, single, rtol=1e-9)
+
+
+def test_smoothness_values_for_days_separate_clear_and_cloudy_days(simulated_df):
+    day_dfs = productive_days(simulated_df)
+
+    smoothness_values = cloud_free_day_finder.smoothness_values_for_days(day_dfs)
+
+    clear = numpy.array([day_df["day"].values[0] % 2 == 0 for day_df in day_dfs])
+    assert smoothness_values[clear].max() < smoothness_values[~clear].min()
+
+
+@pytest.mark.parametrize("threshold_percent", [0.5, 3, 50])
+def test_find_smooth_days_df_matches_single_day_selection(simulated_df, threshold_percent):
+    year_df = splitters2.split_df_year(simulated_df, 2018)
+
+    smooth_days = cloud_free_day_finder.find_smooth_days_df(year_df, 150, 155, threshold_percent)
+    expected_days = [day_df["day"].values[0] for day_df in productive_days(year_df)
+                     if day_df_smoothness_value(day_df) * 100 <= threshold_percent]
+
+    assert [day_df["day"].values[0] for day_df in smooth_days] == expected_days
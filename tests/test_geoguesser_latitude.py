@@ -0,0 +1,41 @@
+import numpy
+
+from estimators import geoguesser_latitude
+from pv_model import pvlib_poa
+
+get_poa_slope_models_for_day_ranges = getattr(geoguesser_latitude, "__get_poa_slope_models_for_day_ranges")
+
+
+def poa_slope_models_day_by_day(year, first_day, last_day, latitude_low, latitude_high):
+    """
+    Original slope to latitude models, one POA simulation per latitude and day.
+    """
+    slopes_firsts = []
+    slopes_lasts = []
+    latitudes = []
+    for latitude in range(latitude_low, latitude_high + 1):
+        fmins, lmins, days = [], [], []
+        for d in range(first_day, last_day + 1, 10):
+            fmin, lmin = pvlib_poa.get_first_and_last_nonzero_minute(latitude, 0, year, d)
+            if fmin is None or lmin is None:
+                continue
+            fmins.append(fmin)
+            lmins.append(lmin)
+            days.append(d)
+        if len(days) < 4:
+            continue
+        slopes_firsts.append(numpy.polynomial.polynomial.polyfit(days, fmins, 1)[1])
+        slopes_lasts.append(numpy.polynomial.polynomial.polyfit(days, lmins, 1)[1])
+        latitudes.append(latitude)
+
+    return (numpy.polynomial.polynomial.polyfit(slopes_firsts, latitudes, 3),
+            numpy.polynomial.polynomial.polyfit(slopes_lasts, latitudes, 3))
+
+
+def test_poa_slope_models_match_day_by_day_models():
+    # 66 has midnight sun on some of the days and 67-69 on too many days to be used, both skip them the same way
+    first_model, last_model = get_poa_slope_models_for_day_ranges(2019, 150, 200, 62, 69)
+    expected_first, expected_last = poa_slope_models_day_by_day(2019, 150, 200, 62, 69)
+
+    numpy.testing.assert_allclose(first_model, expected_first, rtol=1e-9)
+    numpy.testing.assert_allclose(last_model, expected_last, rtol=1e-9)
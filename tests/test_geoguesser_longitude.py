@@ -0,0 +1,64 @@
+import numpy
+import pandas
+
+from estimators import geoguesser_longitude
+from helpers import day_features
+from helpers import splitters2
+from pv_model import pvlib_poa
+
+df_get_first_last_minutes = getattr(geoguesser_longitude, "__df_get_first_last_minutes")
+
+
+def longitudes_day_by_day(year_df):
+    """
+    Original per day longitude path, one day filter and one solar noon simulation per day.
+    """
+    year_n = year_df["year"].values[0]
+    days = []
+    longitudes = []
+    for day_n in year_df["day"].unique():
+        day_df = splitters2.split_df_day_range(year_df, day_n, day_n)
+        first_minute, last_minute = df_get_first_last_minutes(day_df)
+        if first_minute is None or last_minute is None:
+            continue
+        simulated_solar_noon = pvlib_poa.get_solar_noon(year_n, day_n, 0, 25)
+        longitudes.append(geoguesser_longitude.longitude_from_solar_noon_solar_noon_poa(
+            25, (first_minute + last_minute) / 2.0, simulated_solar_noon))
+        days.append(day_n)
+
+    return pandas.DataFrame({"year": [year_n] * len(days), "day": days, "longitude": longitudes})
+
+
+def test_year_df_longitudes_match_day_by_day_longitudes(simulated_df):
+    year_df = splitters2.split_df_year(simulated_df, 2019)
+
+    longitudes = geoguesser_longitude.estimate_longitude_based_on_year_df(year_df)
+    expected = longitudes_day_by_day(year_df)
+
+    numpy.testing.assert_array_equal(longitudes["day"].values, expected["day"].values)
+    numpy.testing.assert_allclose(longitudes["longitude"].values, expected["longitude"].values, atol=1e-9)
+
+
+def test_day_feature_longitudes_match_day_by_day_longitudes(simulated_df):
+    features = day_features.compute_day_features(simulated_df)
+
+    longitudes = geoguesser_longitude.estimate_longitude_based_on_day_features(features)
+    expected = pandas.concat([longitudes_day_by_day(splitters2.split_df_year(simulated_df, year_n))
+                              for year_n in (2018, 2019)], ignore_index=True)
+
+    numpy.testing.assert_array_equal(longitudes["year"].values, expected["year"].values)
+    numpy.testing.assert_array_equal(longitudes["day"].values, expected["day"].values)
+    numpy.testing.assert_allclose(longitudes["longitude"].values, expected["longitude"].values, atol=1e-9)
+
+
+def test_archive_longitudes_match_day_by_day_longitudes(simulated_df):
+    per_year, pooled_median, per_day = geoguesser_longitude.estimate_longitude_archive(simulated_df, 150, 155)
+
+    for year_n in (2018, 2019):
+        expected = longitudes_day_by_day(splitters2.split_df_year(simulated_df, year_n))
+        expected = expected[expected["day"] <= 155]
+        year_row = per_year[per_year["year"] == year_n]
+        assert abs(year_row["median"].values[0] - expected["longitude"].median()) < 1e-9
+        assert abs(year_row["mean"].values[0] - expected["longitude"].mean()) < 1e-9
+
+    assert abs(pooled_median - per_day["longitude"].median()) < 1e-9
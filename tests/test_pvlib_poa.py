@@ -0,0 +1,44 @@
+import numpy
+import pytest
+
+from helpers import config
+from pv_model import pvlib_poa
+
+
+orientations = [(0, 180), (15, 217), (45, 90), (60, 270), (89, 0)]
+site = config.Site("Test", albedo=0.5, module_elevation=150)
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+@pytest.mark.parametrize("year, day", [(2018, 150), (2019, 20), (2020, 300)])
+@pytest.mark.parametrize("batch_site", [None, site])
+def test_pvlib_complex_batch_matches_pvlib_complex(year, day, batch_site):
+    day_geometry = pvlib_poa.get_day_geometry(year, day, 62.8919, 27.6349)
+    tilts = [orientation[0] for orientation in orientations]
+    azimuths = [orientation[1] for orientation in orientations]
+
+    outputs = pvlib_poa.pvlib_complex_batch(day_geometry, tilts, azimuths, site=batch_site)
+
+    assert outputs.shape == (len(orientations), len(day_geometry))
+    for i, (tilt, azimuth) in enumerate(orientations):
+        reference = pvlib_poa.pvlib_complex(year, day, 62.8919, 27.6349, tilt, azimuth, site=batch_site)
+        numpy.testing.assert_allclose(outputs[i], reference["output"].values, rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_pvlib_complex_batch_matches_pvlib_complex_with_minute_step():
+    day_geometry = pvlib_poa.get_day_geometry(2018, 150, 62.8919, 27.6349, minute_step=5)
+
+    outputs = pvlib_poa.pvlib_complex_batch(day_geometry, [15], [217], rated_power=3)
+    reference = pvlib_poa.pvlib_complex(2018, 150, 62.8919, 27.6349, 15, 217, rated_power=3, minute_step=5)
+
+    numpy.testing.assert_allclose(outputs[0], reference["output"].values, rtol=1e-9, atol=1e-9)
+
+
+def test_pvlib_complex_batch_uses_site():
+    day_geometry = pvlib_poa.get_day_geometry(2018, 150, 62.8919, 27.6349)
+
+    default_outputs = pvlib_poa.pvlib_complex_batch(day_geometry, [60], [180])
+    site_outputs = pvlib_poa.pvlib_complex_batch(day_geometry, [60], [180], site=site)
+
+    assert not numpy.allclose(default_outputs, site_outputs)
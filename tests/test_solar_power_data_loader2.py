@@ -0,0 +1,50 @@
+import os
+import shutil
+
+import pandas
+import pytest
+
+from helpers import solar_power_data_loader2
+
+
+@pytest.fixture
+def csv_path(simulated_csv_path, tmp_path):
+    # own copy so that cache files of one test do not affect others
+    path = str(tmp_path / "site.csv")
+    shutil.copy(simulated_csv_path, path)
+    return path
+
+
+@pytest.mark.parametrize("compact, keep_time", [(True, True), (False, True), (True, False)])
+def test_load_csv_cache_round_trip_matches_uncached_load(csv_path, compact, keep_time):
+    uncached = solar_power_data_loader2.load_csv(csv_path, use_cache=False, compact=compact, keep_time=keep_time)
+    assert not os.path.exists(solar_power_data_loader2.cache_path_for(csv_path))
+
+    written = solar_power_data_loader2.load_csv(csv_path, compact=compact, keep_time=keep_time)
+    assert os.path.exists(solar_power_data_loader2.cache_path_for(csv_path))
+    read = solar_power_data_loader2.load_csv(csv_path, compact=compact, keep_time=keep_time)
+
+    pandas.testing.assert_frame_equal(written, uncached)
+    pandas.testing.assert_frame_equal(read, uncached)
+    assert [name for name in os.listdir(os.path.dirname(csv_path)) if name.endswith(".tmp")] == []
+
+
+def test_load_csv_cache_is_invalidated_when_source_changes(csv_path):
+    solar_power_data_loader2.load_csv(csv_path)
+
+    with open(csv_path) as file:
+        lines = file.readlines()
+    with open(csv_path, "w") as file:
+        file.writelines(lines[:-100])
+
+    reloaded = solar_power_data_loader2.load_csv(csv_path)
+    uncached = solar_power_data_loader2.load_csv(csv_path, use_cache=False)
+
+    pandas.testing.assert_frame_equal(reloaded, uncached)
+
+
+def test_load_csv_matches_streaming_days(csv_path):
+    loaded = solar_power_data_loader2.load_csv(csv_path)
+    streamed = pandas.concat(solar_power_data_loader2.iterate_csv_days(csv_path, chunk_size=1000), ignore_index=True)
+
+    pandas.testing.assert_frame_equal(streamed, loaded)
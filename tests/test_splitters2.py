@@ -0,0 +1,50 @@
+import numpy
+import pandas
+import pytest
+
+from helpers import splitters2
+
+
+def days_by_year_filtering(df, day_start=None, day_end=None, year=None):
+    """
+    Original way of taking single days, one year filter and one day range filter per day.
+    """
+    days = []
+    for year_n in sorted(df["year"].unique()):
+        if year is not None and year_n != year:
+            continue
+        year_df = splitters2.split_df_year(df, year_n)
+        for day_n in sorted(year_df["day"].unique()):
+            if day_start is not None and day_n < day_start:
+                continue
+            if day_end is not None and day_n > day_end:
+                continue
+            days.append(splitters2.split_df_day_range(year_df, day_n, day_n))
+    return days
+
+
+@pytest.mark.parametrize("day_start, day_end, year", [(None, None, None), (151, 153, None), (None, None, 2019),
+                                                      (152, 152, 2018), (200, 210, None)])
+def test_partitioned_days_match_year_and_day_filtering(simulated_df, day_start, day_end, year):
+    df, partition = splitters2.build_day_partition(simulated_df)
+
+    partitioned = list(splitters2.partitioned_days(df, partition, day_start, day_end, year))
+    filtered = days_by_year_filtering(simulated_df, day_start, day_end, year)
+
+    assert len(partitioned) == len(filtered)
+    for partitioned_day, filtered_day in zip(partitioned, filtered):
+        pandas.testing.assert_frame_equal(partitioned_day, filtered_day)
+
+
+def test_build_day_partition_sorts_unordered_frames(simulated_df):
+    shuffled = simulated_df.sample(frac=1, random_state=0)
+
+    df, partition = splitters2.build_day_partition(shuffled)
+
+    assert list(partition.keys()) == sorted(partition.keys())
+    for (year_n, day_n), rows in partition.items():
+        day_df = df.iloc[rows]
+        assert numpy.all(day_df["year"].values == year_n)
+        assert numpy.all(day_df["day"].values == day_n)
+        expected = simulated_df[(simulated_df["year"] == year_n) & (simulated_df["day"] == day_n)]
+        pandas.testing.assert_frame_equal(day_df.sort_index(), expected)